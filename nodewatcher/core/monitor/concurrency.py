@@ -0,0 +1,82 @@
+import math
+
+# Database latency above this multiple of the baseline latency signals saturation
+SATURATION_FACTOR = 3.0
+# Database latency below this number of seconds never signals saturation
+SATURATION_MIN_LATENCY = 0.05
+# Maximum factor by which concurrency is increased between two cycles
+MAX_INCREASE = 2.0
+# Factor by which concurrency is decreased when the database is saturated
+SATURATION_DECREASE = 0.75
+# Rate at which the baseline latency follows higher measured latencies
+BASELINE_ADAPTATION = 0.05
+
+
+class ConcurrencyController(object):
+    """
+    Chooses the number of workers of a monitoring run between cycles, so that
+    each cycle takes a target fraction of the run's period.
+
+    Concurrency is increased in proportion to the overrun of the target while the
+    database keeps up. When database latency measured by workers rises well above
+    its baseline, concurrency is decreased, as more workers would only queue on
+    the database. When cycles finish in less than half of the target, workers
+    are removed one at a time.
+    """
+
+    def __init__(self, minimum, maximum, target, workers):
+        """
+        Class constructor.
+
+        :param minimum: Minimum number of workers
+        :param maximum: Maximum number of workers
+        :param target: Target fraction of the period that a cycle should take
+        :param workers: Initial number of workers
+        """
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.workers = self.clamp(workers)
+        self.baseline_latency = None
+
+    def clamp(self, workers):
+        return int(max(self.minimum, min(self.maximum, workers)))
+
+    def is_saturated(self, latency):
+        """
+        Returns True when the given database latency indicates that the database
+        is saturated. Also updates the baseline latency.
+
+        :param latency: Database latency in seconds
+        """
+
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+            return False
+
+        saturated = latency > max(SATURATION_MIN_LATENCY, self.baseline_latency * SATURATION_FACTOR)
+        self.baseline_latency += (latency - self.baseline_latency) * BASELINE_ADAPTATION
+        return saturated
+
+    def update(self, utilization, latency=None):
+        """
+        Chooses the number of workers for the next cycle.
+
+        :param utilization: Fraction of the period that the last cycle took
+        :param latency: Database latency measured during the last cycle in
+          seconds or None if it is not known
+        :return: Number of workers
+        """
+
+        if latency is not None and self.is_saturated(latency):
+            workers = math.floor(self.workers * SATURATION_DECREASE)
+        elif utilization > self.target:
+            workers = math.ceil(self.workers * min(utilization / self.target, MAX_INCREASE))
+        elif utilization < self.target / 2:
+            workers = self.workers - 1
+        else:
+            workers = self.workers
+
+        self.workers = self.clamp(workers)
+        return self.workers
@@ -63,10 +63,34 @@ class MonitorConfig(object):
                 'name': run,
                 'interval': config.get('interval', None),
                 'workers': config.get('workers', None),
+                'min_workers': config.get('min_workers', 1),
+                'max_workers': config.get('max_workers', None),
+                'target_utilization': config.get('target_utilization', 0.7),
                 'max_tasks_per_child': config.get('max_tasks_per_child', 100),
+                'worker_pool': config.get('worker_pool', 'cycle'),
+                'max_worker_memory': config.get('max_worker_memory', None),
+                'max_run_memory': config.get('max_run_memory', None),
+                'node_timeout': config.get('node_timeout', None),
+                'chunk_size': config.get('chunk_size', 1),
+                'threads': config.get('threads', 1),
+                'registry_cache': config.get('registry_cache', False),
+                'instrumentation': config.get('instrumentation', False),
+                'spread': config.get('spread', None),
+                'backoff_after': config.get('backoff_after', 1800),
+                'max_interval': config.get('max_interval', None),
+                'shard_lease': config.get('shard_lease', None),
                 'processors': processors,
             }
 
+            if run_info['worker_pool'] not in ('cycle', 'persistent'):
+                raise exceptions.ImproperlyConfigured("Unknown worker pool mode '%s' for run '%s'!" % (run_info['worker_pool'], run))
+
+            if run_info['max_workers'] is not None and not 1 <= run_info['min_workers'] <= run_info['max_workers']:
+                raise exceptions.ImproperlyConfigured("Invalid worker bounds for run '%s'!" % run)
+
+            if run_info['spread'] is not None and (run_info['interval'] is None or run_info['spread'] < 1):
+                raise exceptions.ImproperlyConfigured("Invalid 'spread' for run '%s'!" % run)
+
             # If no interval is configured, mark the run as on-demand.
             run_info['on_demand'] = run_info['interval'] is None
 
@@ -10,3 +10,13 @@ class NodeProcessorAbort(Exception):
     """
 
     pass
+
+
+class NodeProcessorTimeout(Exception):
+    """
+    This exception is raised inside node processors when processing of the current
+    node has exceeded the configured deadline. Any further processors for this node
+    are skipped and the transaction of the current processor is rolled back.
+    """
+
+    pass
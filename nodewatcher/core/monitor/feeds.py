@@ -0,0 +1,175 @@
+import importlib
+import logging
+import multiprocessing
+import time
+
+from django import db
+from django.conf import settings
+from django.core import cache as django_cache, exceptions
+
+# Logger instance
+logger = logging.getLogger('monitor.feeds')
+
+# Prefix used for keys stored in the shared cache
+KEY_PREFIX = 'nodewatcher.monitor.feed'
+# Number of seconds to wait before restarting a collector that has failed
+RESTART_DELAY = 5
+
+
+class FeedCollector(object):
+    """
+    Base class for long-lived collectors that keep a connection to a data
+    source (eg. a routing daemon) and publish snapshots of its feed into the
+    shared cache, so that all monitoring runs read the same, up-to-date data
+    instead of each fetching and parsing the feed on its own.
+    """
+
+    def __init__(self):
+        """
+        Class constructor.
+        """
+
+        self.logger = logging.getLogger('monitor.feeds.%s' % self.__class__.__name__)
+
+    def collect(self):
+        """
+        Collects the feed and publishes snapshots via `publish` until the
+        process is stopped. May raise an exception in case of failure, in
+        which case the collector is restarted.
+        """
+
+        raise NotImplementedError
+
+    def publish(self, source, key, snapshot):
+        """
+        Publishes a snapshot of a feed.
+
+        :param source: Source name (eg. 'olsr')
+        :param key: Identifier of the feed within the source
+        :param snapshot: Picklable snapshot of the feed
+        """
+
+        publish_snapshot(source, key, snapshot)
+
+
+def get_cache():
+    """
+    Returns the cache that is used to share feed snapshots or None if feeds
+    are not shared.
+    """
+
+    alias = getattr(settings, 'MONITOR_FEED_CACHE', None)
+    if not alias:
+        return None
+
+    return django_cache.caches[alias]
+
+
+def get_max_age():
+    """
+    Returns the number of seconds after which a snapshot is considered stale.
+    """
+
+    return getattr(settings, 'MONITOR_FEED_MAX_AGE', 60)
+
+
+def get_shared_key(source, key):
+    return '%s.%s.%s' % (KEY_PREFIX, source, key)
+
+
+def publish_snapshot(source, key, snapshot):
+    """
+    Stores a snapshot of a feed into the shared cache.
+
+    :param source: Source name (eg. 'olsr')
+    :param key: Identifier of the feed within the source
+    :param snapshot: Picklable snapshot of the feed
+    """
+
+    cache = get_cache()
+    if cache is None:
+        return
+
+    cache.set(get_shared_key(source, key), (time.time(), snapshot), get_max_age())
+
+
+def get_snapshot(source, key):
+    """
+    Returns the most recent snapshot of a feed or None when there is no
+    snapshot or when the snapshot is stale. In this case, the caller should
+    obtain the data directly from the source.
+
+    :param source: Source name (eg. 'olsr')
+    :param key: Identifier of the feed within the source
+    """
+
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    entry = cache.get(get_shared_key(source, key))
+    if entry is None:
+        return None
+
+    timestamp, snapshot = entry
+    if time.time() - timestamp > get_max_age():
+        return None
+
+    return snapshot
+
+
+def get_collectors():
+    """
+    Returns import paths of all collectors configured in `MONITOR_FEED_COLLECTORS`.
+    Collectors are only used when a cache for sharing snapshots is configured.
+    """
+
+    if get_cache() is None:
+        return []
+
+    return list(getattr(settings, 'MONITOR_FEED_COLLECTORS', ()))
+
+
+def collector_worker(collector_path):
+    """
+    Process entry point that runs a single collector until interrupted.
+
+    :param collector_path: Import path of the collector class
+    """
+
+    i = collector_path.rfind('.')
+    module, attr = collector_path[:i], collector_path[i + 1:]
+    try:
+        collector = getattr(importlib.import_module(module), attr)()
+    except (ImportError, AttributeError):
+        raise exceptions.ImproperlyConfigured("Error importing feed collector %s!" % collector_path)
+
+    # Collectors must not share database connections with the parent process.
+    db.connections.close_all()
+
+    try:
+        while True:
+            try:
+                collector.collect()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                logger.exception("Feed collector '%s' has failed, restarting." % collector_path)
+
+            time.sleep(RESTART_DELAY)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_collector(collector_path):
+    """
+    Starts a collector in a separate process.
+
+    :param collector_path: Import path of the collector class
+    :return: Collector process
+    """
+
+    p = multiprocessing.Process(target=collector_worker, args=(collector_path,))
+    p.daemon = True
+    p.start()
+    return p
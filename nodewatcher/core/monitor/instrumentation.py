@@ -0,0 +1,328 @@
+import collections
+import contextlib
+import importlib
+import logging
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core import exceptions
+from django.db import connection
+
+from . import stats as monitor_stats
+
+# Logger instance
+logger = logging.getLogger('monitor.instrumentation')
+
+# Percentiles reported for each measured quantity
+PERCENTILES = (50, 95)
+# Maximum size of a single statsd packet
+STATSD_MAX_PACKET_SIZE = 512
+
+# Measurement that is currently in progress in each thread
+_local = threading.local()
+
+
+class Sample(collections.namedtuple('Sample', ['processor', 'phase', 'duration', 'queries', 'query_time', 'datapoints'])):
+    """
+    Measurements of a single processor invocation.
+    """
+
+    __slots__ = ()
+
+
+class Recorder(object):
+    """
+    Records measurements of processor invocations.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Class constructor.
+
+        :param enabled: When False, nothing is recorded
+        """
+
+        self.enabled = enabled
+        self.samples = []
+
+    @contextlib.contextmanager
+    def measure(self, processor, phase):
+        """
+        Measures wall time, database queries and datapoints emitted while the
+        block is being executed.
+
+        :param processor: Processor class
+        :param phase: Name of the invoked method (eg. 'process' or 'cleanup')
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        # Queries are only logged by Django when debug cursors are forced.
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        connection.queries_log.clear()
+        _local.current = {'datapoints': 0}
+        start = time.time()
+
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            queries = list(connection.queries_log)
+            connection.queries_log.clear()
+            connection.force_debug_cursor = force_debug_cursor
+
+            self.samples.append(Sample(
+                processor.__name__,
+                phase,
+                duration,
+                len(queries),
+                sum(float(query['time']) for query in queries),
+                _local.current['datapoints'],
+            ))
+            _local.current = None
+
+
+def record_datapoints(count):
+    """
+    Records the number of datapoints emitted by the processor that is currently
+    being measured.
+
+    :param count: Number of datapoints
+    """
+
+    current = getattr(_local, 'current', None)
+    if current is not None:
+        current['datapoints'] += count
+
+
+class CycleStatistics(object):
+    """
+    Aggregates measurements of all processor invocations in a monitoring cycle.
+    """
+
+    def __init__(self, run):
+        """
+        Class constructor.
+
+        :param run: Monitoring run name
+        """
+
+        self.run = run
+        self._samples = collections.OrderedDict()
+
+    def add(self, samples):
+        """
+        Adds samples to the statistics.
+
+        :param samples: A list of `Sample` instances
+        """
+
+        for sample in samples:
+            self._samples.setdefault((sample.processor, sample.phase), []).append(sample)
+
+    def summarize(self):
+        """
+        Returns a list of per-processor summaries. Each summary is a dictionary with
+        keys 'processor', 'phase', 'count', 'datapoints' and the summaries of 'duration',
+        'queries' and 'query_time' values (see `stats.summarize`).
+        """
+
+        summaries = []
+        for (processor, phase), samples in self._samples.iteritems():
+            summary = {
+                'processor': processor,
+                'phase': phase,
+                'count': len(samples),
+                'datapoints': sum(sample.datapoints for sample in samples),
+            }
+            for quantity in ('duration', 'queries', 'query_time'):
+                summary[quantity] = monitor_stats.summarize(
+                    [getattr(sample, quantity) for sample in samples],
+                    percentiles=PERCENTILES,
+                )
+
+            summaries.append(summary)
+
+        return summaries
+
+    def export(self):
+        """
+        Exports the statistics to all configured sinks.
+        """
+
+        summaries = self.summarize()
+        if not summaries:
+            return
+
+        for sink in get_sinks():
+            try:
+                sink.emit(self.run, summaries)
+            except Exception:
+                logger.exception("Instrumentation sink '%s' has failed:" % sink.__class__.__name__)
+
+
+def export_gauges(run, gauges):
+    """
+    Exports run-level gauges (eg. the chosen concurrency) to all configured sinks
+    that support them.
+
+    :param run: Monitoring run name
+    :param gauges: A dictionary mapping gauge names to values
+    """
+
+    for sink in get_sinks():
+        emit_gauges = getattr(sink, 'emit_gauges', None)
+        if emit_gauges is None:
+            continue
+
+        try:
+            emit_gauges(run, gauges)
+        except Exception:
+            logger.exception("Instrumentation sink '%s' has failed:" % sink.__class__.__name__)
+
+
+class LogSink(object):
+    """
+    Logs per-processor statistics of every cycle.
+    """
+
+    def emit(self, run, summaries):
+        """
+        Exports statistics of a monitoring cycle.
+
+        :param run: Monitoring run name
+        :param summaries: A list of per-processor summaries
+        """
+
+        logger.info("Processor statistics for run '%s':" % run)
+        for summary in summaries:
+            logger.info(
+                "  - %s.%s: calls=%d time p50=%.3fs p95=%.3fs max=%.3fs queries p50=%d p95=%d max=%d "
+                "query time p95=%.3fs datapoints=%d" % (
+                    summary['processor'],
+                    summary['phase'],
+                    summary['count'],
+                    summary['duration']['p50'],
+                    summary['duration']['p95'],
+                    summary['duration']['max'],
+                    summary['queries']['p50'],
+                    summary['queries']['p95'],
+                    summary['queries']['max'],
+                    summary['query_time']['p95'],
+                    summary['datapoints'],
+                )
+            )
+
+    def emit_gauges(self, run, gauges):
+        """
+        Exports run-level gauges.
+
+        :param run: Monitoring run name
+        :param gauges: A dictionary mapping gauge names to values
+        """
+
+        logger.info("Gauges for run '%s': %s" % (
+            run,
+            ' '.join(['%s=%s' % (name, value) for name, value in sorted(gauges.items())]),
+        ))
+
+
+class StatsdSink(object):
+    """
+    Sends per-processor statistics as gauges to a statsd-compatible server over UDP.
+    """
+
+    def __init__(self):
+        """
+        Class constructor.
+        """
+
+        self.address = (
+            getattr(settings, 'MONITOR_INSTRUMENTATION_STATSD_HOST', '127.0.0.1'),
+            getattr(settings, 'MONITOR_INSTRUMENTATION_STATSD_PORT', 8125),
+        )
+        self.prefix = getattr(settings, 'MONITOR_INSTRUMENTATION_STATSD_PREFIX', 'nodewatcher.monitor')
+
+    def get_metrics(self, run, summaries):
+        """
+        Returns a list of statsd metric lines.
+
+        :param run: Monitoring run name
+        :param summaries: A list of per-processor summaries
+        """
+
+        metrics = []
+        for summary in summaries:
+            prefix = '%s.%s.%s.%s' % (self.prefix, run, summary['processor'], summary['phase'])
+            metrics.append('%s.calls:%d|g' % (prefix, summary['count']))
+            metrics.append('%s.datapoints:%d|g' % (prefix, summary['datapoints']))
+            for quantity, scale in (('duration', 1000), ('queries', 1), ('query_time', 1000)):
+                for key in ['p%d' % percent for percent in PERCENTILES] + ['max']:
+                    metrics.append('%s.%s_%s:%d|g' % (prefix, quantity, key, round(summary[quantity][key] * scale)))
+
+        return metrics
+
+    def emit(self, run, summaries):
+        """
+        Exports statistics of a monitoring cycle.
+
+        :param run: Monitoring run name
+        :param summaries: A list of per-processor summaries
+        """
+
+        self.send(self.get_metrics(run, summaries))
+
+    def emit_gauges(self, run, gauges):
+        """
+        Exports run-level gauges.
+
+        :param run: Monitoring run name
+        :param gauges: A dictionary mapping gauge names to values
+        """
+
+        self.send(['%s.%s.%s:%g|g' % (self.prefix, run, name, value) for name, value in sorted(gauges.items())])
+
+    def send(self, metrics):
+        """
+        Sends metric lines, packing as many lines as possible into each packet.
+
+        :param metrics: A list of statsd metric lines
+        """
+
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            packet = []
+            for metric in metrics:
+                if packet and sum(len(line) + 1 for line in packet) + len(metric) > STATSD_MAX_PACKET_SIZE:
+                    udp_socket.sendto('\n'.join(packet), self.address)
+                    packet = []
+                packet.append(metric)
+
+            if packet:
+                udp_socket.sendto('\n'.join(packet), self.address)
+        finally:
+            udp_socket.close()
+
+
+def get_sinks():
+    """
+    Returns instances of all sinks configured in `MONITOR_INSTRUMENTATION_SINKS`.
+    """
+
+    sinks = []
+    for sink_path in getattr(settings, 'MONITOR_INSTRUMENTATION_SINKS', ('nodewatcher.core.monitor.instrumentation.LogSink',)):
+        i = sink_path.rfind('.')
+        module, attr = sink_path[:i], sink_path[i + 1:]
+        try:
+            sink = getattr(importlib.import_module(module), attr)
+        except (ImportError, AttributeError):
+            raise exceptions.ImproperlyConfigured("Error importing instrumentation sink %s!" % sink_path)
+
+        sinks.append(sink())
+
+    return sinks
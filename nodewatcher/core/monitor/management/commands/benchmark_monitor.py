@@ -0,0 +1,150 @@
+import time
+import uuid
+
+from django.apps import apps
+from django.core.management import base
+from django.db import transaction
+
+from nodewatcher.core import models as core_models
+from nodewatcher.core.monitor import replay, worker
+from nodewatcher.core.monitor.config import config as monitor_config
+from nodewatcher.utils import trimming
+
+# Namespace of UUIDs of synthetic nodes
+SYNTHETIC_UUID_NAMESPACE = uuid.UUID('5c6b9cbb-4b2e-4b0e-9a57-1d5f1c0c6f7e')
+
+
+def create_synthetic_nodes(count):
+    """
+    Ensures that the given number of synthetic nodes, which poll telemetry
+    from unique router IDs, exist in the database.
+
+    :param count: Number of nodes
+    :return: Number of nodes that have been created
+    """
+
+    try:
+        HttpTelemetrySourceConfig = apps.get_model('monitor_sources_http', 'HttpTelemetrySourceConfig')
+    except LookupError:
+        raise base.CommandError("Synthetic nodes require the HTTP telemetry source module.")
+
+    created_count = 0
+    for index in xrange(count):
+        with transaction.atomic():
+            node, created = core_models.Node.objects.get_or_create(
+                uuid=str(uuid.uuid5(SYNTHETIC_UUID_NAMESPACE, str(index)))
+            )
+            if not created:
+                continue
+
+            general_cfg = node.config.core.general(create=core_models.GeneralConfig)
+            general_cfg.name = 'synthetic-%d' % index
+            general_cfg.save()
+
+            node.config.core.routerid(
+                create=core_models.StaticIpRouterIdConfig,
+                address='10.%d.%d.%d/32' % (128 + index / 65536, index / 256 % 256, index % 256),
+            ).save()
+
+            node.config.core.telemetry.http(create=HttpTelemetrySourceConfig, source='poll').save()
+
+        created_count += 1
+
+    return created_count
+
+
+class Command(base.BaseCommand):
+    help = trimming.trim("""
+        Replays data recorded by monitord --record through a monitoring run and
+        reports throughput, per-processor time and query counts. The run uses the
+        local database, optionally populated with synthetic nodes that recorded
+        telemetry feeds are assigned to.
+    """)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive',
+            help="Archive recorded by monitord --record.",
+        )
+
+        parser.add_argument(
+            '--run',
+            type=str,
+            action='store',
+            dest='run',
+            default='telemetry',
+            help="Name of the monitoring run to benchmark.",
+        )
+
+        parser.add_argument(
+            '--nodes',
+            type=int,
+            action='store',
+            dest='nodes',
+            default=0,
+            help="Number of synthetic nodes to create before running the benchmark.",
+        )
+
+        parser.add_argument(
+            '--cycles',
+            type=int,
+            action='store',
+            dest='cycles',
+            default=1,
+            help="Number of cycles to perform.",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Runs the benchmark.
+        """
+
+        try:
+            run_info = monitor_config.get_run(options['run']).copy()
+        except KeyError:
+            raise base.CommandError("Monitoring run '%s' does not exist." % options['run'])
+
+        if options['nodes']:
+            created = create_synthetic_nodes(options['nodes'])
+            self.stdout.write("Created %d synthetic nodes." % created)
+
+        replay.start_replay(options['archive'])
+
+        # Cycles are performed in this process with all processors instrumented.
+        run_info.update({
+            'worker_pool': 'persistent',
+            'instrumentation': True,
+            'cycles': options['cycles'],
+            'process_only_node': None,
+            'shard_instance': None,
+            'record': None,
+        })
+        if not run_info['workers']:
+            run_info['workers'] = 1
+
+        run = worker.MonitorRun(run_info)
+        try:
+            for cycle in xrange(options['cycles']):
+                start = time.time()
+                report = run.cycle()
+                duration = time.time() - start
+
+                self.stdout.write("Cycle %d: %d nodes in %.2f s (%.1f nodes/s)." % (
+                    cycle,
+                    report['nodes'],
+                    duration,
+                    report['nodes'] / duration,
+                ))
+
+                for summary in sorted(report['processors'], key=lambda summary: -summary['duration']['p50'] * summary['count']):
+                    self.stdout.write("  %-40s %-8s calls=%-6d time p50=%.2f ms p95=%.2f ms queries p50=%d p95=%d" % (
+                        summary['processor'],
+                        summary['phase'],
+                        summary['count'],
+                        summary['duration']['p50'] * 1000,
+                        summary['duration']['p95'] * 1000,
+                        summary['queries']['p50'],
+                        summary['queries']['p95'],
+                    ))
+        finally:
+            run.stop_workers()
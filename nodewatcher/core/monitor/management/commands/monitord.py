@@ -1,4 +1,4 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from ... import worker
 
@@ -12,11 +12,28 @@ class Command(BaseCommand):
         parser.add_argument('--run', type=str, help="Only execute a specific run")
         parser.add_argument('--cycles', type=int, help="Only perform a limited number of monitoring cycles")
         parser.add_argument('--process-only-node', type=str, help="Only process a specific node")
+        parser.add_argument('--shard', action='store_true', help="Share nodes with other instances of the daemon")
+        parser.add_argument('--instance', type=str, help="Identifier of this instance when sharding")
+        parser.add_argument('--record', type=str, help="Record data obtained from external sources into an archive")
+        parser.add_argument('--replay', type=str, help="Replay data recorded into an archive")
 
     def handle(self, *args, **options):
+        cycles = options.get('cycles', None)
+        if options.get('record', None) or options.get('replay', None):
+            if not options.get('run', None):
+                raise CommandError("Recording and replaying require a specific run.")
+
+            # Only perform a single cycle unless requested otherwise.
+            if cycles is None:
+                cycles = 1
+
         w = worker.Worker()
         w.run(
-            cycles=options.get('cycles', None),
+            cycles=cycles,
             process_only_node=options.get('process_only_node', None),
-            filter_run=options.get('run', None)
+            filter_run=options.get('run', None),
+            shard=options.get('shard', False),
+            instance=options.get('instance', None),
+            record=options.get('record', None),
+            replay_archive=options.get('replay', None),
         )
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_json_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonitorLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.CharField(max_length=100)),
+                ('instance', models.CharField(max_length=255)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='monitorlease',
+            unique_together=set([('run', 'instance')]),
+        ),
+    ]
@@ -268,3 +268,17 @@ class AdjancencyHistory(models.Model):
 
     class Meta:
         unique_together = ('node_a', 'node_b', 'protocol')
+
+
+class MonitorLease(models.Model):
+    """
+    Membership lease of a monitoring daemon instance that takes part in a
+    sharded monitoring run.
+    """
+
+    run = models.CharField(max_length=100)
+    instance = models.CharField(max_length=255)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('run', 'instance')
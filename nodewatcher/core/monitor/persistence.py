@@ -0,0 +1,255 @@
+import collections
+import copy
+
+from django.db import router, transaction
+from django.db.models import deletion, signals, Case, When, Value
+from django.db.models.functions import Cast
+
+
+class UnitOfWork(object):
+    """
+    Collects model instances that should be saved or deleted and persists them
+    in bulk when flushed. New instances are inserted using `bulk_create`, changed
+    instances are updated with one query per batch and set of changed fields and
+    deleted instances are removed using one query per table.
+
+    Signals `post_save` and `post_delete` are still sent for every instance
+    after the changes have been persisted, so processors that track saved
+    registry items keep working. For updated instances, `update_fields` of the
+    `post_save` signal contains the changed fields. Instances without changes
+    are not written, but the signal is still sent with `update_fields` set to
+    None, as it would be by `Model.save`.
+
+    Can be used as a context manager, in which case changes are flushed when
+    the block exits without an exception.
+    """
+
+    # Maximum number of instances updated by a single query.
+    batch_size = 100
+
+    def __init__(self):
+        """
+        Class constructor.
+        """
+
+        self._saves = collections.OrderedDict()
+        self._deletes = collections.OrderedDict()
+        self._snapshots = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def track(self, instance):
+        """
+        Records the current field values of an existing instance, so that only
+        changed fields will be written when the instance is saved.
+
+        :param instance: Model instance
+        :return: The same model instance
+        """
+
+        self._snapshots[id(instance)] = (instance, self._get_values(instance))
+        return instance
+
+    def save(self, instance):
+        """
+        Queues a model instance to be saved.
+
+        :param instance: Model instance
+        """
+
+        self._deletes.pop(id(instance), None)
+        self._saves[id(instance)] = instance
+
+    def delete(self, instance):
+        """
+        Queues a model instance to be deleted.
+
+        :param instance: Model instance
+        """
+
+        self._saves.pop(id(instance), None)
+        if instance.pk is not None:
+            self._deletes[id(instance)] = instance
+
+    def flush(self):
+        """
+        Persists all queued changes.
+        """
+
+        if not self._saves and not self._deletes:
+            return
+
+        deletes = self._deletes.values()
+        saves = self._saves.values()
+        self._deletes.clear()
+        self._saves.clear()
+
+        with transaction.atomic():
+            self._flush_deletes(deletes)
+            self._flush_saves(saves)
+
+        self._snapshots.clear()
+
+    def _get_values(self, instance):
+        """
+        Returns a dictionary of concrete field values of an instance.
+        """
+
+        values = {}
+        for field in instance._meta.concrete_fields:
+            value = field.value_from_object(instance)
+            if isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            values[field.name] = value
+
+        return values
+
+    def _get_changed_fields(self, instance):
+        """
+        Returns a tuple of names of fields that have changed since the instance
+        has been tracked. When the instance is not tracked, all fields are
+        considered changed.
+        """
+
+        fields = [field for field in instance._meta.concrete_fields if not field.primary_key]
+        try:
+            tracked, snapshot = self._snapshots[id(instance)]
+            if tracked is not instance:
+                raise KeyError
+        except KeyError:
+            return tuple(field.name for field in fields)
+
+        return tuple(field.name for field in fields if field.value_from_object(instance) != snapshot[field.name])
+
+    def _can_bulk_save(self, model):
+        """
+        Returns true if instances of a model may be saved in bulk.
+        """
+
+        # Registry items that only support a single instance have custom save logic.
+        options = getattr(model, '_registry', None)
+        if options is not None and not options.multiple:
+            return False
+
+        return True
+
+    def _is_multi_table(self, model):
+        """
+        Returns true if a model uses multi-table inheritance.
+        """
+
+        for parent in model._meta.get_parent_list():
+            if parent._meta.concrete_model is not model._meta.concrete_model:
+                return True
+
+        return False
+
+    def _pre_save(self, instance, add):
+        """
+        Prepares an instance for being saved in bulk, performing the same steps
+        as a regular save would.
+        """
+
+        if hasattr(instance, 'pre_save_polymorphic'):
+            instance.pre_save_polymorphic()
+
+        for field in instance._meta.concrete_fields:
+            if field.primary_key:
+                continue
+
+            setattr(instance, field.attname, field.pre_save(instance, add))
+
+    def _flush_deletes(self, instances):
+        """
+        Deletes instances using one query per table.
+        """
+
+        if not instances:
+            return
+
+        models = collections.OrderedDict()
+        for instance in instances:
+            models.setdefault(instance.__class__, []).append(instance)
+
+        collector = deletion.Collector(using=router.db_for_write(instances[0].__class__, instance=instances[0]))
+        for model, instances in models.items():
+            collector.collect(instances)
+        collector.delete()
+
+    def _flush_saves(self, instances):
+        """
+        Inserts and updates instances in bulk.
+        """
+
+        creates = collections.OrderedDict()
+        updates = collections.OrderedDict()
+        for instance in instances:
+            model = instance.__class__
+            if not self._can_bulk_save(model):
+                instance.save()
+            elif instance.pk is None:
+                if self._is_multi_table(model):
+                    # Instances of multi-table models can only be inserted one at a time.
+                    instance.save()
+                else:
+                    creates.setdefault(model, []).append(instance)
+            else:
+                updates.setdefault(model, []).append(instance)
+
+        for model, instances in creates.items():
+            using = router.db_for_write(model, instance=instances[0])
+            for instance in instances:
+                self._pre_save(instance, add=True)
+
+            model._base_manager.using(using).bulk_create(instances, batch_size=self.batch_size)
+
+            for instance in instances:
+                signals.post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+
+        for model, instances in updates.items():
+            using = router.db_for_write(model, instance=instances[0])
+            changes = collections.OrderedDict()
+            for instance in instances:
+                self._pre_save(instance, add=False)
+                changes.setdefault(self._get_changed_fields(instance), []).append(instance)
+
+            for fields, instances in changes.items():
+                if fields:
+                    self._bulk_update(model, instances, fields, using)
+
+                # An empty set of update fields would be interpreted as nothing being saved.
+                update_fields = frozenset(fields) if fields else None
+                for instance in instances:
+                    signals.post_save.send(sender=model, instance=instance, created=False, update_fields=update_fields, raw=False, using=using)
+
+    def _bulk_update(self, model, instances, fields, using):
+        """
+        Updates the given fields of instances, using one query per batch.
+        """
+
+        # Fields of multi-table models are stored in different tables, which are updated separately.
+        # As primary keys of parent and child tables are the same, the same primary keys may be used.
+        tables = collections.OrderedDict()
+        for name in fields:
+            field = model._meta.get_field(name)
+            tables.setdefault(field.model._meta.concrete_model, []).append(field)
+
+        for start in xrange(0, len(instances), self.batch_size):
+            batch = instances[start:start + self.batch_size]
+            for table_model, table_fields in tables.items():
+                values = {}
+                for field in table_fields:
+                    values[field.name] = Case(
+                        *[
+                            When(pk=instance.pk, then=Cast(Value(field.value_from_object(instance), output_field=field), field))
+                            for instance in batch
+                        ],
+                        output_field=field
+                    )
+
+                table_model._base_manager.using(using).filter(pk__in=[instance.pk for instance in batch]).update(**values)
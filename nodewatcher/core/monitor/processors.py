@@ -8,6 +8,28 @@ from nodewatcher.core import models as core_models
 from . import models
 
 
+def _copy_value(value):
+    """
+    Copies a context value for an isolated copy of a context. Contexts and plain
+    containers are copied recursively, while other objects are shared.
+
+    :param value: Context value
+    """
+
+    if isinstance(value, ProcessorContext):
+        return value.isolated_copy()
+
+    value_type = type(value)
+    if value_type is list:
+        return [_copy_value(item) for item in value]
+    elif value_type is dict:
+        return dict([(key, _copy_value(item)) for key, item in value.iteritems()])
+    elif value_type is set:
+        return set(value)
+
+    return value
+
+
 class ProcessorContext(dict):
     """
     A simple dictionary wrapper to support attribute access.
@@ -58,6 +80,20 @@ class ProcessorContext(dict):
             return super(ProcessorContext, self).__setattr__(name, value)
         self[name] = value
 
+    def isolated_copy(self):
+        """
+        Returns a copy of this context that may be modified without affecting
+        this context. Nested contexts, lists, dictionaries and sets are copied,
+        while other values (eg. model instances) are shared and must not be
+        modified in place.
+        """
+
+        context = self.__class__()
+        for key, value in self.iteritems():
+            super(ProcessorContext, context).__setitem__(key, _copy_value(value))
+
+        return context
+
     def merge_with(self, other):
         """
         Merge this dictionary with another (recursively).
@@ -130,6 +166,9 @@ class NetworkProcessor(MonitoringProcessor):
     """
 
     requires_transaction = True
+    # Processors that must only run once per cycle, even when the run is sharded
+    # across multiple monitoring daemon instances. They only run on the leader.
+    run_once = False
 
     def __init__(self, worker_pool=None, **kwargs):
         """
@@ -167,6 +206,11 @@ class NodeProcessor(MonitoringProcessor):
     all NodeProcessors for a specific node are run.
     """
 
+    # Processors that may process multiple nodes concurrently in threads of the same
+    # worker process. Runs with multiple threads only use them for stages where all
+    # processors are thread-safe.
+    thread_safe = False
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -217,6 +261,8 @@ class GeneralInfo(NodeProcessor):
     Stores "first seen" and "last seen" general node info monitor data into the database.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -0,0 +1,193 @@
+import cPickle
+import gzip
+import logging
+
+# Logger instance
+logger = logging.getLogger('monitor.replay')
+
+# Archive that is currently being recorded or replayed by this process
+_archive = None
+# Either 'record' or 'replay' when an archive is active
+_mode = None
+
+
+class FeedNotRecorded(Exception):
+    """
+    Raised when replaying and the requested data is not in the archive.
+    """
+
+    pass
+
+
+class FeedArchive(object):
+    """
+    Raw data obtained from external sources (telemetry feeds, routing daemons,
+    measurement tools) during a monitoring cycle. Archives are stored as
+    compressed pickles.
+    """
+
+    def __init__(self, feeds=None):
+        """
+        Class constructor.
+
+        :param feeds: Optional dictionary mapping (source, key) tuples to data
+        """
+
+        self.feeds = feeds or {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an archive from a file.
+
+        :param path: Archive filename
+        """
+
+        with gzip.open(path, 'rb') as archive_file:
+            return cls(cPickle.load(archive_file))
+
+    def save(self, path):
+        """
+        Stores the archive into a file.
+
+        :param path: Archive filename
+        """
+
+        with gzip.open(path, 'wb') as archive_file:
+            cPickle.dump(self.feeds, archive_file, cPickle.HIGHEST_PROTOCOL)
+
+
+def start_recording():
+    """
+    Starts recording data obtained from external sources by this process.
+    """
+
+    global _archive, _mode
+
+    _archive = FeedArchive()
+    _mode = 'record'
+
+
+def stop_recording(path):
+    """
+    Stops recording and stores the recorded data.
+
+    :param path: Archive filename
+    """
+
+    global _archive, _mode
+
+    if _mode != 'record':
+        return
+
+    _archive.save(path)
+    logger.info("Recorded %d feeds into '%s'." % (len(_archive.feeds), path))
+    _archive = None
+    _mode = None
+
+
+def start_replay(path):
+    """
+    Starts replaying recorded data instead of obtaining it from external sources.
+    Processes forked afterwards also replay the data.
+
+    :param path: Archive filename
+    """
+
+    global _archive, _mode
+
+    _archive = FeedArchive.load(path)
+    _mode = 'replay'
+
+
+def is_replaying():
+    """
+    Returns True when recorded data is being replayed.
+    """
+
+    return _mode == 'replay'
+
+
+def capture(source, key, fetch):
+    """
+    Obtains data from an external source. When recording, the data is stored into
+    the archive and when replaying, the data is returned from the archive instead.
+
+    :param source: Source name (eg. 'olsr')
+    :param key: Identifier of the data within the source
+    :param fetch: Callable that obtains the data from the source
+    :return: Obtained data
+    """
+
+    if _mode == 'replay':
+        try:
+            return _archive.feeds[(source, key)]
+        except KeyError:
+            raise FeedNotRecorded
+
+    data = fetch()
+    if _mode == 'record':
+        _archive.feeds[(source, key)] = data
+
+    return data
+
+
+def capture_many(source, keys, fetch):
+    """
+    Obtains data for many items from an external source. When replaying, recorded
+    data is assigned to the requested items in a round-robin manner, so that data
+    recorded for some nodes can be replayed for any number of (synthetic) nodes.
+
+    :param source: Source name (eg. 'http')
+    :param keys: A list of item identifiers
+    :param fetch: Callable that obtains a dictionary mapping item identifiers to data
+    :return: A dictionary mapping item identifiers to data
+    """
+
+    if _mode == 'replay':
+        recorded = _archive.feeds.get((source, None), [])
+        if not recorded:
+            return {}
+
+        return dict([(key, recorded[index % len(recorded)]) for index, key in enumerate(sorted(keys))])
+
+    data = fetch()
+    if _mode == 'record':
+        _archive.feeds[(source, None)] = [data[key] for key in sorted(data.keys())]
+
+    return data
+
+
+def _record_stream(source, key, items):
+    """
+    Records items of a stream as they are consumed.
+    """
+
+    recorded = _archive.feeds[(source, key)] = []
+    for item in items:
+        recorded.append(item)
+        yield item
+
+
+def capture_stream(source, key, fetch):
+    """
+    Obtains data that is consumed as a stream of items (eg. lines of output)
+    from an external source. Items are recorded as they are consumed.
+
+    :param source: Source name (eg. 'fping')
+    :param key: Identifier of the data within the source
+    :param fetch: Callable that returns an iterable of items
+    :return: An iterator over items
+    """
+
+    if _mode == 'replay':
+        try:
+            return iter(_archive.feeds[(source, key)])
+        except KeyError:
+            raise FeedNotRecorded
+
+    items = fetch()
+    if _mode == 'record':
+        return _record_stream(source, key, items)
+
+    return iter(items)
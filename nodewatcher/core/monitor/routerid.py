@@ -0,0 +1,90 @@
+import collections
+
+from .. import models as core_models
+
+
+class RouterIdIndex(object):
+    """
+    Maps router identifiers of all families to nodes and back. The index is
+    loaded with a single query, so network processors do not need to resolve
+    router identifiers one node at a time.
+    """
+
+    def __init__(self):
+        """
+        Class constructor.
+        """
+
+        self._nodes = {}
+        self._router_ids = collections.OrderedDict()
+
+    @classmethod
+    def load(cls):
+        """
+        Loads router identifiers of all nodes.
+        """
+
+        index = cls()
+        for node_pk, family, router_id in core_models.RouterIdConfig.objects.order_by('pk').values_list(
+            'root_id', 'rid_family', 'router_id'
+        ):
+            index.add(node_pk, family, router_id)
+
+        return index
+
+    def add(self, node_pk, family, router_id):
+        """
+        Adds a router identifier to the index.
+
+        :param node_pk: Node primary key
+        :param family: Router identifier family (eg. 'ipv4')
+        :param router_id: Router identifier
+        """
+
+        self._nodes[str(router_id)] = node_pk
+        self._router_ids.setdefault(node_pk, []).append((family, str(router_id)))
+
+    def get_node(self, router_id):
+        """
+        Returns the primary key of the node with the given router identifier
+        or None if there is no such node.
+
+        :param router_id: Router identifier
+        """
+
+        return self._nodes.get(str(router_id), None)
+
+    def get_router_ids(self, node_pk, families=None):
+        """
+        Returns a list of router identifiers of a node.
+
+        :param node_pk: Node primary key
+        :param families: Optional list of router identifier families
+        """
+
+        return [
+            router_id for family, router_id in self._router_ids.get(node_pk, [])
+            if families is None or family in families
+        ]
+
+    def get_nodes(self):
+        """
+        Returns primary keys of all nodes that have router identifiers.
+        """
+
+        return self._router_ids.keys()
+
+
+def get_index(context):
+    """
+    Returns the router identifier index of the current cycle. The index is
+    loaded on first use and then shared by all processors of the cycle.
+
+    :param context: Current context
+    """
+
+    index = context.get('router_id_index', None)
+    if index is None:
+        index = context.router_id_index = RouterIdIndex.load()
+
+    return index
@@ -0,0 +1,57 @@
+import hashlib
+import math
+
+
+def get_phase(key):
+    """
+    Returns a stable fraction in [0, 1) for the given key, which determines when
+    within its polling interval an item is due. Phases of many keys are spread
+    evenly, so that items are not all due at the same time.
+
+    :param key: Item identifier
+    """
+
+    return int(hashlib.md5(str(key)).hexdigest()[:8], 16) / float(0x100000000)
+
+
+def is_due(key, interval, start, end):
+    """
+    Returns True when an item with the given polling interval is due in the
+    time window [start, end).
+
+    :param key: Item identifier
+    :param interval: Polling interval of the item in seconds
+    :param start: Start of the window as a UNIX timestamp
+    :param end: End of the window as a UNIX timestamp
+    """
+
+    offset = get_phase(key) * interval
+    return math.floor((end - offset) / interval) > math.floor((start - offset) / interval)
+
+
+def get_backoff_interval(interval, down_for, backoff_after, max_interval=None):
+    """
+    Returns the polling interval for an item that has been unavailable for some
+    time. Once the item has been unavailable for `backoff_after` seconds, the interval
+    is doubled each time the duration of unavailability doubles.
+
+    :param interval: Base polling interval in seconds
+    :param down_for: Number of seconds the item has been unavailable or None if
+      it has never been available
+    :param backoff_after: Number of seconds of unavailability after which back-off starts
+    :param max_interval: Optional maximum polling interval in seconds
+    """
+
+    if down_for is None:
+        steps = 1
+    elif down_for < backoff_after:
+        return interval
+    else:
+        steps = int(math.log(down_for / float(backoff_after), 2)) + 1
+
+    # Limit the exponent, the interval is capped anyway.
+    backoff_interval = interval * (2 ** min(steps, 16))
+    if max_interval is not None:
+        backoff_interval = min(backoff_interval, max(interval, max_interval))
+
+    return backoff_interval
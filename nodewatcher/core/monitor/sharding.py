@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import os
+import socket
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import models as monitor_models
+
+
+def get_instance_id():
+    """
+    Returns the default identifier of this monitoring daemon instance.
+    """
+
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def get_owner(key, members):
+    """
+    Returns the member that owns the given key. Rendezvous hashing is used, so
+    when a member joins or leaves, only the keys owned by that member move.
+
+    :param key: Item identifier
+    :param members: A list of member identifiers
+    """
+
+    return max(members, key=lambda member: hashlib.md5('%s/%s' % (member, key)).digest())
+
+
+def is_leader(context):
+    """
+    Returns True when processing that must only be performed once per cycle should
+    be performed by this instance. Instances that are not sharded are always leaders.
+
+    :param context: Current context
+    """
+
+    shard = context.get('shard', None)
+    if not shard:
+        return True
+
+    return shard.leader
+
+
+class Shard(object):
+    """
+    Tracks instances of the monitoring daemon that take part in a sharded run.
+    Each instance holds a lease in the database, which it renews on every cycle.
+    Nodes are partitioned between instances with valid leases, so when an instance
+    stops renewing its lease, its nodes are taken over by the remaining instances.
+    """
+
+    def __init__(self, run, instance, lease_duration):
+        """
+        Class constructor.
+
+        :param run: Monitoring run name
+        :param instance: Identifier of this instance
+        :param lease_duration: Number of seconds a lease is valid for
+        """
+
+        self.run = run
+        self.instance = instance
+        self.lease_duration = lease_duration
+        self.members = [instance]
+
+    @property
+    def leader(self):
+        """
+        True when this instance is the elected leader of the run.
+        """
+
+        return self.members[0] == self.instance
+
+    def renew(self):
+        """
+        Renews the lease of this instance, expires leases of instances that have
+        stopped renewing them and updates the list of members.
+        """
+
+        now = timezone.now()
+        leases = monitor_models.MonitorLease.objects.filter(run=self.run)
+        with transaction.atomic():
+            leases.filter(expires__lt=now).delete()
+            monitor_models.MonitorLease.objects.update_or_create(
+                run=self.run,
+                instance=self.instance,
+                defaults={'expires': now + datetime.timedelta(seconds=self.lease_duration)},
+            )
+            self.members = sorted(leases.values_list('instance', flat=True))
+
+    def release(self):
+        """
+        Releases the lease of this instance, so that its nodes are taken over by
+        other instances without waiting for the lease to expire.
+        """
+
+        monitor_models.MonitorLease.objects.filter(run=self.run, instance=self.instance).delete()
+
+    def owns(self, key):
+        """
+        Returns True when the given node is processed by this instance.
+
+        :param key: Node identifier
+        """
+
+        return get_owner(key, self.members) == self.instance
+
+    def filter_nodes(self, nodes):
+        """
+        Returns a set of nodes that are processed by this instance.
+
+        :param nodes: A set of nodes
+        """
+
+        if len(self.members) == 1:
+            return nodes
+
+        return set([node for node in nodes if self.owns(node.pk)])
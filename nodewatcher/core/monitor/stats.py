@@ -0,0 +1,38 @@
+import math
+
+
+def percentile(values, percent):
+    """
+    Computes a percentile of the given values using the nearest-rank method.
+
+    :param values: A sorted list of values
+    :param percent: Percentile (between 0 and 100)
+    :return: Value at the given percentile or None if there are no values
+    """
+
+    if not values:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def summarize(values, percentiles=(50, 90, 99)):
+    """
+    Summarizes a list of values.
+
+    :param values: A list of values
+    :param percentiles: Percentiles that should be computed
+    :return: A dictionary with the count, maximum and requested percentiles (as
+      keys 'p50', 'p90', ...) of the values
+    """
+
+    values = sorted(values)
+    summary = {
+        'count': len(values),
+        'max': values[-1] if values else None,
+    }
+    for percent in percentiles:
+        summary['p%d' % percent] = percentile(values, percent)
+
+    return summary
@@ -2,19 +2,107 @@ from django.db import transaction
 
 from celery.task import task as celery_task
 
+from nodewatcher.core import models as core_models
+
 from . import processors as monitor_processors, worker as monitor_worker
 from .config import config as monitor_config
 
 
+def execute_pipeline(run_info, context, nodes=None, start=0, fan_out=None):
+    """
+    Executes processors of an on-demand monitoring run in the current process.
+
+    :param run_info: Monitoring run descriptor
+    :param context: Processor context
+    :param nodes: Optional set of nodes selected by preceding processors
+    :param start: Index of the first processor group to execute
+    :param fan_out: Optional number of nodes; when a node processor stage has
+      more nodes, the rest of the pipeline is executed in parallel by separate
+      tasks, each processing at most this many nodes
+    """
+
+    if nodes is None:
+        nodes = set()
+
+    processors = run_info['processors']
+    for index in xrange(start, len(processors)):
+        processor_list = processors[index]
+        lead_proc = processor_list[0]
+        if issubclass(lead_proc, monitor_processors.NetworkProcessor):
+            if lead_proc.requires_transaction:
+                with transaction.atomic():
+                    context, nodes = lead_proc().process(context, nodes)
+            else:
+                context, nodes = lead_proc().process(context, nodes)
+        elif issubclass(lead_proc, monitor_processors.NodeProcessor):
+            if not nodes:
+                continue
+
+            if fan_out and len(nodes) > fan_out:
+                dispatch_pipeline(run_info, context, nodes, index, fan_out)
+                return
+
+            # Store the per-node context, so we can limit its scope only to specific nodes in
+            # order to avoid excessive context copying.
+            node_local_context = context.for_node
+            del context['for_node']
+
+            for node in nodes:
+                monitor_worker.stage_worker((
+                    context,
+                    node_local_context.get(node.pk, monitor_processors.ProcessorContext()),
+                    node.pk,
+                    processor_list
+                ), registry_cache=run_info['registry_cache'])
+
+            # Restore per-node context for further network processors.
+            context.for_node = node_local_context
+
+
+def dispatch_pipeline(run_info, context, nodes, start, chunk_size):
+    """
+    Splits nodes into chunks and executes the rest of the pipeline for each
+    chunk in a separate task.
+
+    :param run_info: Monitoring run descriptor
+    :param context: Processor context
+    :param nodes: A set of nodes selected by preceding processors
+    :param start: Index of the first processor group to execute
+    :param chunk_size: Maximum number of nodes in a single task
+    """
+
+    node_local_context = context.for_node
+    base_context = dict([(key, value) for key, value in context.iteritems() if key != 'for_node'])
+
+    node_pks = sorted([node.pk for node in nodes])
+    for offset in xrange(0, len(node_pks), chunk_size):
+        chunk = node_pks[offset:offset + chunk_size]
+
+        # Only include per-node contexts of nodes in this chunk.
+        chunk_context = monitor_processors.ProcessorContext(base_context)
+        for node_pk in chunk:
+            if node_pk in node_local_context:
+                chunk_context.for_node[node_pk] = node_local_context[node_pk]
+
+        continue_pipeline.delay(
+            run_id=run_info['name'],
+            context=chunk_context,
+            node_pks=chunk,
+            start=start,
+        )
+
+
 @celery_task(bind=True)
-def run_pipeline(self, run_id, base_context=None):
+def run_pipeline(self, run_id, base_context=None, fan_out=None):
     """
     Runs an on-demand monitoring run pipeline. Compared to a scheduled run, this
     is a much more simplified version as it is designed to be used to process
-    push updates for a single node.
+    push updates.
 
     :param run_id: Monitoring run identifier
     :param base_context: Optional base context dictionary
+    :param fan_out: Optional maximum number of nodes processed by a single task,
+      see `execute_pipeline`
     """
 
     run_info = monitor_config.get_run(run_id)
@@ -22,40 +110,29 @@ def run_pipeline(self, run_id, base_context=None):
         return
 
     # Prepare the on-demand monitoring run. The execution is a bit different than the
-    # scheduled runs as here we don't spawn any additional workers or perform any
-    # parallelization.
-    nodes = set()
+    # scheduled runs as here we don't spawn any additional workers, but larger sets of
+    # nodes may be processed in parallel by multiple tasks.
     context = monitor_processors.ProcessorContext()
 
     if base_context is not None:
         context.merge_with(base_context)
 
-    for processor_list in run_info['processors']:
-        lead_proc = processor_list[0]
-        if issubclass(lead_proc, monitor_processors.NetworkProcessor):
-            if lead_proc.requires_transaction:
-                with transaction.atomic():
-                    context, nodes = lead_proc().process(context, nodes)
-            else:
-                context, nodes = lead_proc().process(context, nodes)
-        elif issubclass(lead_proc, monitor_processors.NodeProcessor):
-            # Node processor also behaves differently, as we only process a single node. This is
-            # to prevent runs from consuming too many resources as on-demand runs are meant for
-            # push updates from a single node.
-            if nodes:
-                node = nodes.pop()
+    execute_pipeline(run_info, context, fan_out=fan_out)
 
-                # Store the per-node context, so we can limit its scope only to specific nodes in
-                # order to avoid excessive context copying.
-                node_local_context = context.for_node
-                del context['for_node']
 
-                monitor_worker.stage_worker((
-                    context,
-                    node_local_context.get(node.pk, monitor_processors.ProcessorContext()),
-                    node.pk,
-                    processor_list
-                ))
+@celery_task(bind=True)
+def continue_pipeline(self, run_id, context, node_pks, start):
+    """
+    Continues execution of an on-demand monitoring run pipeline for a subset
+    of nodes.
+
+    :param run_id: Monitoring run identifier
+    :param context: Processor context
+    :param node_pks: Primary keys of nodes to process
+    :param start: Index of the first processor group to execute
+    """
+
+    run_info = monitor_config.get_run(run_id)
+    nodes = set(core_models.Node.objects.filter(pk__in=node_pks))
 
-                # Restore per-node context for further network processors.
-                context.for_node = node_local_context
+    execute_pipeline(run_info, context, nodes, start=start)
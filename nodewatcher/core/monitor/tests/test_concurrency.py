@@ -0,0 +1,71 @@
+import unittest
+
+from nodewatcher.core.monitor import concurrency
+
+
+class ConcurrencyControllerTestCase(unittest.TestCase):
+    def test_overrun(self):
+        controller = concurrency.ConcurrencyController(1, 100, 0.5, 10)
+
+        # Concurrency grows in proportion to the overrun.
+        self.assertEqual(controller.update(0.6), 12)
+        # Growth is capped at twice the current number of workers.
+        self.assertEqual(controller.update(5.0), 24)
+        # Utilization between half of the target and the target is kept.
+        self.assertEqual(controller.update(0.5), 24)
+        self.assertEqual(controller.update(0.25), 24)
+
+    def test_shrink(self):
+        controller = concurrency.ConcurrencyController(1, 100, 0.5, 10)
+
+        # Workers are removed one at a time, however short the cycle.
+        self.assertEqual(controller.update(0.2), 9)
+        self.assertEqual(controller.update(0.01), 8)
+        self.assertEqual(controller.update(0.0), 7)
+
+    def test_saturation(self):
+        controller = concurrency.ConcurrencyController(1, 100, 0.5, 20)
+
+        self.assertEqual(controller.update(0.6, 0.01), 24)
+        # Latency well above the baseline cuts concurrency, even when overrunning.
+        self.assertEqual(controller.update(1.0, 0.1), 18)
+        self.assertEqual(controller.update(0.2, 0.2), 13)
+
+    def test_saturation_min_latency(self):
+        controller = concurrency.ConcurrencyController(1, 100, 0.5, 20)
+
+        # Latencies below the minimum never signal saturation.
+        controller.update(0.5, 0.001)
+        self.assertEqual(controller.update(0.6, 0.04), 24)
+
+    def test_clamp(self):
+        self.assertEqual(concurrency.ConcurrencyController(2, 8, 0.5, 20).workers, 8)
+        self.assertEqual(concurrency.ConcurrencyController(2, 8, 0.5, 0).workers, 2)
+
+        controller = concurrency.ConcurrencyController(2, 8, 0.5, 6)
+        self.assertEqual(controller.update(1.0), 8)
+        self.assertEqual(controller.update(1.0), 8)
+
+        controller = concurrency.ConcurrencyController(2, 8, 0.5, 2)
+        self.assertEqual(controller.update(0.0), 2)
+        self.assertEqual(controller.update(0.5, 0.01), 2)
+        self.assertEqual(controller.update(0.5, 1.0), 2)
+
+    def test_baseline(self):
+        controller = concurrency.ConcurrencyController(1, 100, 0.5, 10)
+
+        self.assertFalse(controller.is_saturated(0.1))
+        self.assertEqual(controller.baseline_latency, 0.1)
+        # Lower latencies replace the baseline.
+        self.assertFalse(controller.is_saturated(0.02))
+        self.assertEqual(controller.baseline_latency, 0.02)
+
+        # Higher latencies are followed slowly.
+        self.assertFalse(controller.is_saturated(0.04))
+        self.assertAlmostEqual(controller.baseline_latency, 0.021)
+
+        # Sustained higher latency becomes the new baseline and stops signalling saturation.
+        saturated = [controller.is_saturated(0.2) for cycle in xrange(100)]
+        self.assertTrue(saturated[0])
+        self.assertFalse(saturated[-1])
+        self.assertGreater(controller.baseline_latency, 0.15)
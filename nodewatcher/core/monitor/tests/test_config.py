@@ -0,0 +1,81 @@
+import unittest
+
+from django.core import exceptions
+from django.test import utils
+
+from nodewatcher.core.monitor import config, processors
+
+
+class NetworkStep(processors.NetworkProcessor):
+    pass
+
+
+class FirstNodeStep(processors.NodeProcessor):
+    pass
+
+
+class SecondNodeStep(processors.NodeProcessor):
+    pass
+
+
+PREFIX = 'nodewatcher.core.monitor.tests.test_config.'
+
+
+def discover(**run):
+    run.setdefault('processors', (PREFIX + 'NetworkStep',))
+    with utils.override_settings(MONITOR_RUNS={'telemetry': run}):
+        monitor_config = config.MonitorConfig()
+        return monitor_config.get_run('telemetry')
+
+
+class MonitorConfigTestCase(unittest.TestCase):
+    def test_defaults(self):
+        run = discover(interval=300, workers=10)
+
+        self.assertEqual(run['name'], 'telemetry')
+        self.assertEqual(run['worker_pool'], 'cycle')
+        self.assertIsNone(run['max_worker_memory'])
+        self.assertIsNone(run['max_run_memory'])
+        self.assertIsNone(run['node_timeout'])
+        self.assertEqual(run['threads'], 1)
+        self.assertFalse(run['on_demand'])
+        self.assertTrue(discover()['on_demand'])
+
+    def test_processors(self):
+        run = discover(processors=(
+            PREFIX + 'NetworkStep',
+            (PREFIX + 'FirstNodeStep', PREFIX + 'SecondNodeStep'),
+            PREFIX + 'NetworkStep',
+            PREFIX + 'FirstNodeStep',
+        ))
+
+        # Consecutive node processors are grouped into stages.
+        self.assertEqual(run['processors'], [
+            [NetworkStep],
+            [FirstNodeStep, SecondNodeStep],
+            [NetworkStep],
+            [FirstNodeStep],
+        ])
+
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, processors=(PREFIX + 'MissingStep',))
+
+    def test_worker_pool(self):
+        run = discover(interval=300, worker_pool='persistent', max_worker_memory=256, max_run_memory=512)
+        self.assertEqual(run['worker_pool'], 'persistent')
+        self.assertEqual(run['max_worker_memory'], 256)
+        self.assertEqual(run['max_run_memory'], 512)
+
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, interval=300, worker_pool='forever')
+
+    def test_worker_bounds(self):
+        run = discover(interval=300, workers=4, min_workers=2, max_workers=8)
+        self.assertEqual((run['min_workers'], run['max_workers']), (2, 8))
+
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, interval=300, min_workers=8, max_workers=2)
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, interval=300, min_workers=0, max_workers=2)
+
+    def test_spread(self):
+        self.assertEqual(discover(interval=300, spread=5)['spread'], 5)
+
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, spread=5)
+        self.assertRaises(exceptions.ImproperlyConfigured, discover, interval=300, spread=0)
@@ -0,0 +1,186 @@
+import cPickle
+import json
+import os
+import unittest
+
+from nodewatcher.core.monitor import processors, worker
+
+
+class Peer(object):
+    pass
+
+
+class SubContext(processors.ProcessorContext):
+    pass
+
+
+def create_context():
+    return processors.ProcessorContext({
+        'run': 'telemetry',
+        'routing': {
+            'olsr': {
+                'aliases': ['10.0.0.1'],
+                'router_id_map': {'10.0.0.2': 2},
+            },
+        },
+        'announces': set(['10.10.0.0/24']),
+    })
+
+
+class IsolatedCopyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = create_context()
+        self.expected = create_context()
+        self.context = self.base.isolated_copy()
+
+    def tearDown(self):
+        # The base context is never modified.
+        self.assertEqual(self.base, self.expected)
+
+    def test_read(self):
+        self.assertEqual(self.context, self.base)
+        self.assertEqual(self.context.run, 'telemetry')
+        self.assertEqual(self.context.routing.olsr.aliases, ['10.0.0.1'])
+        self.assertEqual(self.context.get('missing', 1), 1)
+        self.assertNotIn('missing', self.context)
+
+        # Code that reads dictionaries directly sees all keys, including those of nested contexts.
+        self.assertEqual(dict(self.context), dict(self.base))
+        self.assertEqual(len(self.context), 3)
+        self.assertEqual(
+            json.loads(json.dumps({'context': self.context}, default=sorted)),
+            json.loads(json.dumps({'context': self.base}, default=sorted)),
+        )
+
+    def test_nested(self):
+        olsr = self.context.routing.olsr
+        self.assertIsInstance(olsr, processors.ProcessorContext)
+        self.assertIsNot(olsr, self.base.routing.olsr)
+        self.assertIsNot(self.context['routing'], self.base['routing'])
+
+        # Context classes are preserved.
+        base = processors.ProcessorContext()
+        base.create('http', SubContext).version = 3
+        self.assertIsInstance(base.isolated_copy().http, SubContext)
+
+    def test_write(self):
+        self.context.run = 'other'
+        self.context.routing.olsr.router_id = '10.0.0.1'
+        self.context.node_available = True
+        self.context.for_node['node'].routing.olsr.router_id = '10.0.0.1'
+
+        self.assertEqual(self.context.run, 'other')
+        self.assertEqual(self.context.routing.olsr.router_id, '10.0.0.1')
+        self.assertTrue(self.context.node_available)
+
+    def test_mutate_containers(self):
+        # Plain containers are copied, so modifying them in place does not affect the base.
+        self.context.routing.olsr.aliases.append('10.0.0.2')
+        self.context.routing.olsr.router_id_map['10.0.0.3'] = 3
+        self.context.announces.add('10.20.0.0/24')
+
+        self.assertEqual(self.context.routing.olsr.aliases, ['10.0.0.1', '10.0.0.2'])
+
+    def test_shared_objects(self):
+        # Other objects are shared.
+        peer = Peer()
+        base = processors.ProcessorContext({'peers': [peer]})
+        self.assertIs(base.isolated_copy().peers[0], peer)
+
+    def test_delete(self):
+        del self.context['run']
+        self.assertNotIn('run', self.context)
+        self.assertEqual(self.context.routing.olsr.pop('aliases'), ['10.0.0.1'])
+        self.assertNotIn('aliases', self.context.routing.olsr)
+        self.assertEqual(self.context.routing.pop('missing', None), None)
+
+    def test_setdefault(self):
+        self.assertEqual(self.context.setdefault('run', 'other'), 'telemetry')
+        self.assertEqual(self.context.setdefault('cycle', 1), 1)
+        self.assertEqual(self.context.cycle, 1)
+
+    def test_clear(self):
+        self.context.routing.clear()
+        self.assertEqual(self.context.routing, {})
+        self.assertIsNone(self.context.routing.get('olsr'))
+
+        self.context.clear()
+        self.assertEqual(dict(self.context), {})
+        self.assertIsNone(self.context.get('run'))
+
+    def test_update(self):
+        self.context.update({'run': 'other', 'cycle': 1})
+        self.context.routing.olsr.update(router_id='10.0.0.1')
+
+        self.assertEqual(self.context.run, 'other')
+        self.assertEqual(self.context.cycle, 1)
+        self.assertEqual(self.context.routing.olsr.router_id, '10.0.0.1')
+        self.assertEqual(self.context.routing.olsr.aliases, ['10.0.0.1'])
+
+    def test_merge_with(self):
+        self.context.merge_with({'routing': {'olsr': {'router_id': '10.0.0.1'}}})
+        self.assertEqual(self.context.routing.olsr.router_id, '10.0.0.1')
+        self.assertEqual(self.context.routing.olsr.aliases, ['10.0.0.1'])
+
+    def test_equality(self):
+        self.assertEqual(self.context, self.base)
+        self.assertFalse(self.context != self.base)
+        self.context.routing.olsr.router_id = '10.0.0.1'
+        self.assertNotEqual(self.context, self.base)
+
+    def test_pickle(self):
+        self.context.node_available = True
+        restored = cPickle.loads(cPickle.dumps(self.context, cPickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(restored, self.context)
+        self.assertIsInstance(restored, processors.ProcessorContext)
+        self.assertIsInstance(restored.routing.olsr, processors.ProcessorContext)
+        self.assertTrue(restored.node_available)
+
+
+class SharedContextTestCase(unittest.TestCase):
+    def setUp(self):
+        worker._shared_context = None
+        self.shared = worker.SharedContext(create_context())
+
+    def tearDown(self):
+        worker._shared_context = None
+        self.shared.release()
+
+    def test_pickle(self):
+        data = cPickle.dumps(self.shared, cPickle.HIGHEST_PROTOCOL)
+        # The context itself is not included in the pickle.
+        self.assertNotIn('router_id_map', data)
+
+        restored = cPickle.loads(data)
+        self.assertEqual((restored.id, restored.path), (self.shared.id, self.shared.path))
+        self.assertEqual(restored.get(), create_context())
+
+        # The original instance does not need to load the context.
+        self.assertIs(self.shared.get(), self.shared.context)
+
+    def test_load_once(self):
+        first = cPickle.loads(cPickle.dumps(self.shared))
+        second = cPickle.loads(cPickle.dumps(self.shared))
+
+        context = first.get()
+        # Other tasks of the same stage reuse the loaded context.
+        os.unlink(self.shared.path)
+        self.assertIs(second.get(), context)
+        self.assertIs(first.get(), context)
+
+    def test_next_stage(self):
+        cPickle.loads(cPickle.dumps(self.shared)).get()
+
+        other = worker.SharedContext(processors.ProcessorContext({'run': 'other'}))
+        try:
+            self.assertEqual(cPickle.loads(cPickle.dumps(other)).get(), {'run': 'other'})
+        finally:
+            other.release()
+
+    def test_release(self):
+        self.assertTrue(os.path.exists(self.shared.path))
+        self.shared.release()
+        self.assertFalse(os.path.exists(self.shared.path))
+        # Releasing twice is harmless.
+        self.shared.release()
@@ -0,0 +1,172 @@
+import socket
+import unittest
+
+from django.db import connection
+from django.test import utils
+
+from nodewatcher.core.monitor import instrumentation
+
+
+class FirstProcessor(object):
+    pass
+
+
+class SecondProcessor(object):
+    pass
+
+
+def summary(processor, durations):
+    return {
+        'processor': processor,
+        'phase': 'process',
+        'count': len(durations),
+        'datapoints': 10,
+        'duration': {'p50': durations[0], 'p95': durations[-1], 'max': durations[-1]},
+        'queries': {'p50': 2, 'p95': 3, 'max': 4},
+        'query_time': {'p50': 0.001, 'p95': 0.0126, 'max': 0.02},
+    }
+
+
+class RecorderTestCase(unittest.TestCase):
+    def test_disabled(self):
+        recorder = instrumentation.Recorder(enabled=False)
+        with recorder.measure(FirstProcessor, 'process'):
+            instrumentation.record_datapoints(5)
+
+        self.assertEqual(recorder.samples, [])
+
+    def test_measure(self):
+        recorder = instrumentation.Recorder()
+        force_debug_cursor = connection.force_debug_cursor
+
+        with recorder.measure(FirstProcessor, 'process'):
+            self.assertTrue(connection.force_debug_cursor)
+            # Queries are logged by the debug cursor.
+            connection.queries_log.append({'sql': 'SELECT 1', 'time': '0.250'})
+            connection.queries_log.append({'sql': 'SELECT 2', 'time': '0.125'})
+            instrumentation.record_datapoints(5)
+            instrumentation.record_datapoints(2)
+
+        # Datapoints are not recorded outside of measurements.
+        instrumentation.record_datapoints(100)
+
+        with self.assertRaises(ValueError):
+            with recorder.measure(SecondProcessor, 'cleanup'):
+                raise ValueError
+
+        self.assertEqual(connection.force_debug_cursor, force_debug_cursor)
+        self.assertEqual(len(recorder.samples), 2)
+
+        sample = recorder.samples[0]
+        self.assertEqual((sample.processor, sample.phase), ('FirstProcessor', 'process'))
+        self.assertEqual(sample.queries, 2)
+        self.assertAlmostEqual(sample.query_time, 0.375)
+        self.assertEqual(sample.datapoints, 7)
+        self.assertGreaterEqual(sample.duration, 0)
+
+        # Failed invocations are measured as well.
+        sample = recorder.samples[1]
+        self.assertEqual((sample.processor, sample.phase, sample.queries, sample.datapoints), ('SecondProcessor', 'cleanup', 0, 0))
+
+
+class CycleStatisticsTestCase(unittest.TestCase):
+    def test_summarize(self):
+        statistics = instrumentation.CycleStatistics('telemetry')
+        self.assertEqual(statistics.summarize(), [])
+
+        statistics.add([
+            instrumentation.Sample('FirstProcessor', 'process', duration, duration, 0.1, 1)
+            for duration in xrange(1, 21)
+        ])
+        statistics.add([
+            instrumentation.Sample('SecondProcessor', 'process', 0.5, 1, 0.01, 0),
+            instrumentation.Sample('FirstProcessor', 'cleanup', 0.1, 0, 0.0, 0),
+        ])
+
+        summaries = statistics.summarize()
+        # Summaries are ordered by the first appearance of each processor and phase.
+        self.assertEqual(
+            [(summary['processor'], summary['phase']) for summary in summaries],
+            [('FirstProcessor', 'process'), ('SecondProcessor', 'process'), ('FirstProcessor', 'cleanup')]
+        )
+
+        summary = summaries[0]
+        self.assertEqual(summary['count'], 20)
+        self.assertEqual(summary['datapoints'], 20)
+        self.assertEqual(summary['duration']['p50'], 10)
+        self.assertEqual(summary['duration']['p95'], 19)
+        self.assertEqual(summary['duration']['max'], 20)
+        self.assertEqual(summary['queries']['p95'], 19)
+        self.assertEqual(summary['query_time']['max'], 0.1)
+
+        summary = summaries[1]
+        self.assertEqual(summary['count'], 1)
+        self.assertEqual(summary['duration'], {'count': 1, 'max': 0.5, 'p50': 0.5, 'p95': 0.5})
+
+
+class StatsdSinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(5)
+
+    def tearDown(self):
+        self.server.close()
+
+    def get_sink(self):
+        with utils.override_settings(
+            MONITOR_INSTRUMENTATION_STATSD_HOST='127.0.0.1',
+            MONITOR_INSTRUMENTATION_STATSD_PORT=self.server.getsockname()[1],
+            MONITOR_INSTRUMENTATION_STATSD_PREFIX='nw',
+        ):
+            return instrumentation.StatsdSink()
+
+    def receive(self):
+        packets = []
+        try:
+            while True:
+                self.server.settimeout(0.5 if packets else 5)
+                packets.append(self.server.recv(65536))
+        except socket.timeout:
+            pass
+
+        return packets
+
+    def test_metrics(self):
+        sink = self.get_sink()
+        sink.emit('telemetry', [summary('FirstProcessor', [0.1, 0.25])])
+
+        lines = [line for packet in self.receive() for line in packet.split('\n')]
+        self.assertEqual(lines, [
+            'nw.telemetry.FirstProcessor.process.calls:2|g',
+            'nw.telemetry.FirstProcessor.process.datapoints:10|g',
+            'nw.telemetry.FirstProcessor.process.duration_p50:100|g',
+            'nw.telemetry.FirstProcessor.process.duration_p95:250|g',
+            'nw.telemetry.FirstProcessor.process.duration_max:250|g',
+            'nw.telemetry.FirstProcessor.process.queries_p50:2|g',
+            'nw.telemetry.FirstProcessor.process.queries_p95:3|g',
+            'nw.telemetry.FirstProcessor.process.queries_max:4|g',
+            'nw.telemetry.FirstProcessor.process.query_time_p50:1|g',
+            'nw.telemetry.FirstProcessor.process.query_time_p95:13|g',
+            'nw.telemetry.FirstProcessor.process.query_time_max:20|g',
+        ])
+
+    def test_gauges(self):
+        sink = self.get_sink()
+        sink.emit_gauges('telemetry', {'workers': 12, 'utilization': 0.625})
+
+        self.assertEqual(self.receive(), ['nw.telemetry.utilization:0.625|g\nnw.telemetry.workers:12|g'])
+
+    def test_packet_size(self):
+        sink = self.get_sink()
+        summaries = [summary('Processor%d' % index, [0.1]) for index in xrange(20)]
+        sink.emit('telemetry', summaries)
+
+        packets = self.receive()
+        self.assertGreater(len(packets), 1)
+        for packet in packets:
+            self.assertLessEqual(len(packet), instrumentation.STATSD_MAX_PACKET_SIZE)
+
+        # Metrics are never split between packets.
+        lines = [line for packet in packets for line in packet.split('\n')]
+        self.assertEqual(lines, sink.get_metrics('telemetry', summaries))
@@ -0,0 +1,174 @@
+from django import test
+from django.db.models import signals
+
+from nodewatcher.core import models as core_models
+from nodewatcher.core.monitor import models as monitor_models, persistence
+
+
+class UnitOfWorkTestCase(test.TestCase):
+    def setUp(self):
+        self.node = core_models.Node()
+        self.node.save()
+
+        self.saved = []
+        self.deleted = []
+        signals.post_save.connect(self._on_save, dispatch_uid='test_unit_of_work')
+        signals.post_delete.connect(self._on_delete, dispatch_uid='test_unit_of_work')
+
+    def tearDown(self):
+        signals.post_save.disconnect(dispatch_uid='test_unit_of_work')
+        signals.post_delete.disconnect(dispatch_uid='test_unit_of_work')
+
+    def _on_save(self, sender, instance, created, update_fields, **kwargs):
+        if isinstance(instance, monitor_models.InterfaceMonitor):
+            self.saved.append((sender, instance.pk, created, update_fields))
+
+    def _on_delete(self, sender, instance, **kwargs):
+        if isinstance(instance, monitor_models.InterfaceMonitor):
+            self.deleted.append((sender, instance.pk))
+
+    def create_interface(self, model=monitor_models.InterfaceMonitor, **fields):
+        interface = model(root=self.node, **fields)
+        interface.save()
+        self.saved = []
+
+        # Use a fresh instance, as processors work with instances loaded from the database.
+        return model.objects.get(pk=interface.pk)
+
+    def test_create(self):
+        uow = persistence.UnitOfWork()
+        eth0 = monitor_models.InterfaceMonitor(root=self.node, name='eth0', mtu=1500)
+        eth1 = monitor_models.InterfaceMonitor(root=self.node, name='eth1', mtu=1400)
+        wlan0 = monitor_models.WifiInterfaceMonitor(root=self.node, name='wlan0', channel=6)
+        for interface in (eth0, eth1, wlan0):
+            uow.save(interface)
+
+        # Nothing is written before the changes are flushed.
+        self.assertFalse(monitor_models.InterfaceMonitor.objects.filter(root=self.node).exists())
+        uow.flush()
+
+        interfaces = dict([(interface.name, interface) for interface in monitor_models.InterfaceMonitor.objects.filter(root=self.node)])
+        self.assertItemsEqual(interfaces.keys(), ['eth0', 'eth1', 'wlan0'])
+        self.assertEqual(interfaces['eth0'].mtu, 1500)
+        self.assertEqual(interfaces['eth1'].mtu, 1400)
+        self.assertIsInstance(interfaces['wlan0'], monitor_models.WifiInterfaceMonitor)
+        self.assertEqual(interfaces['wlan0'].channel, 6)
+
+        self.assertEqual(
+            sorted([(sender, created) for sender, pk, created, update_fields in self.saved]),
+            sorted([
+                (monitor_models.InterfaceMonitor, True),
+                (monitor_models.InterfaceMonitor, True),
+                (monitor_models.WifiInterfaceMonitor, True),
+            ])
+        )
+        self.assertNotIn(None, [pk for sender, pk, created, update_fields in self.saved])
+
+    def test_update(self):
+        eth0 = self.create_interface(name='eth0', rx_bytes=1)
+        eth1 = self.create_interface(name='eth1', rx_bytes=1)
+
+        uow = persistence.UnitOfWork()
+        uow.track(eth0)
+        uow.track(eth1)
+        eth0.rx_bytes = 100
+        eth1.rx_bytes = 200
+        eth1.up = True
+        uow.save(eth0)
+        uow.save(eth1)
+        uow.flush()
+
+        eth0 = monitor_models.InterfaceMonitor.objects.get(pk=eth0.pk)
+        eth1 = monitor_models.InterfaceMonitor.objects.get(pk=eth1.pk)
+        self.assertEqual(eth0.rx_bytes, 100)
+        self.assertFalse(eth0.up)
+        self.assertEqual(eth1.rx_bytes, 200)
+        self.assertTrue(eth1.up)
+
+        # Only changed fields are reported as updated.
+        self.assertItemsEqual(self.saved, [
+            (monitor_models.InterfaceMonitor, eth0.pk, False, frozenset(['rx_bytes'])),
+            (monitor_models.InterfaceMonitor, eth1.pk, False, frozenset(['rx_bytes', 'up'])),
+        ])
+
+    def test_update_multi_table(self):
+        wlan0 = self.create_interface(monitor_models.WifiInterfaceMonitor, name='wlan0', channel=1)
+
+        uow = persistence.UnitOfWork()
+        uow.track(wlan0)
+        # Name is stored in the parent table and channel in the child table.
+        wlan0.name = 'wlan1'
+        wlan0.channel = 11
+        uow.save(wlan0)
+        uow.flush()
+
+        wlan0 = monitor_models.WifiInterfaceMonitor.objects.get(pk=wlan0.pk)
+        self.assertEqual(wlan0.name, 'wlan1')
+        self.assertEqual(wlan0.channel, 11)
+        self.assertEqual(monitor_models.InterfaceMonitor.objects.get(pk=wlan0.pk).name, 'wlan1')
+        self.assertEqual(self.saved, [
+            (monitor_models.WifiInterfaceMonitor, wlan0.pk, False, frozenset(['name', 'channel'])),
+        ])
+
+    def test_json_field(self):
+        eth0 = self.create_interface(name='eth0')
+
+        uow = persistence.UnitOfWork()
+        uow.track(eth0)
+        # Changes of mutable values must be detected as well.
+        eth0.annotations['foo'] = {'bar': [1, 2]}
+        uow.save(eth0)
+        uow.flush()
+
+        self.assertEqual(monitor_models.InterfaceMonitor.objects.get(pk=eth0.pk).annotations, {'foo': {'bar': [1, 2]}})
+        self.assertEqual(self.saved, [
+            (monitor_models.InterfaceMonitor, eth0.pk, False, frozenset(['annotations'])),
+        ])
+
+    def test_unchanged(self):
+        eth0 = self.create_interface(name='eth0')
+        # Change the stored instance behind the back of the unit of work.
+        monitor_models.InterfaceMonitor.objects.filter(pk=eth0.pk).update(name='eth1')
+
+        uow = persistence.UnitOfWork()
+        uow.track(eth0)
+        uow.save(eth0)
+        uow.flush()
+
+        # Nothing has been written, but the signal has still been sent as by a regular save.
+        self.assertEqual(monitor_models.InterfaceMonitor.objects.get(pk=eth0.pk).name, 'eth1')
+        self.assertEqual(self.saved, [
+            (monitor_models.InterfaceMonitor, eth0.pk, False, None),
+        ])
+
+    def test_delete(self):
+        eth0 = self.create_interface(name='eth0')
+        wlan0 = self.create_interface(monitor_models.WifiInterfaceMonitor, name='wlan0')
+        eth0_pk = eth0.pk
+        wlan0_pk = wlan0.pk
+
+        with persistence.UnitOfWork() as uow:
+            uow.delete(eth0)
+            uow.delete(wlan0)
+            # Instances that have never been saved are ignored.
+            uow.delete(monitor_models.InterfaceMonitor(root=self.node, name='eth1'))
+
+        self.assertFalse(monitor_models.InterfaceMonitor.objects.filter(root=self.node).exists())
+        self.assertFalse(monitor_models.WifiInterfaceMonitor.objects.filter(pk=wlan0_pk).exists())
+        self.assertIn((monitor_models.InterfaceMonitor, eth0_pk), self.deleted)
+        self.assertIn((monitor_models.WifiInterfaceMonitor, wlan0_pk), self.deleted)
+        self.assertEqual(self.saved, [])
+
+    def test_save_after_delete(self):
+        eth0 = self.create_interface(name='eth0')
+
+        uow = persistence.UnitOfWork()
+        uow.track(eth0)
+        uow.delete(eth0)
+        # Saving a queued instance cancels its deletion.
+        eth0.mtu = 1500
+        uow.save(eth0)
+        uow.flush()
+
+        self.assertEqual(monitor_models.InterfaceMonitor.objects.get(pk=eth0.pk).mtu, 1500)
+        self.assertEqual(self.deleted, [])
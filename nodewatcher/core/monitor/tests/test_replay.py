@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nodewatcher.core.monitor import replay
+
+
+class ReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'feeds.pickle.gz')
+
+    def tearDown(self):
+        replay._archive = None
+        replay._mode = None
+        shutil.rmtree(self.directory)
+
+    def fail_fetch(self):
+        self.fail("Data must not be fetched while replaying.")
+
+    def test_passthrough(self):
+        self.assertFalse(replay.is_replaying())
+        self.assertEqual(replay.capture('olsr', 'routes', lambda: [1, 2]), [1, 2])
+        self.assertEqual(replay.capture_many('http', ['a'], lambda: {'a': 1}), {'a': 1})
+        self.assertEqual(list(replay.capture_stream('fping', None, lambda: ['x', 'y'])), ['x', 'y'])
+
+    def test_record_replay(self):
+        replay.start_recording()
+        self.assertEqual(replay.capture('olsr', 'routes', lambda: {'10.0.0.1': 1}), {'10.0.0.1': 1})
+        self.assertEqual(replay.capture('olsr', 'links', lambda: []), [])
+        replay.stop_recording(self.path)
+        self.assertFalse(replay.is_replaying())
+
+        replay.start_replay(self.path)
+        self.assertTrue(replay.is_replaying())
+        self.assertEqual(replay.capture('olsr', 'routes', self.fail_fetch), {'10.0.0.1': 1})
+        self.assertEqual(replay.capture('olsr', 'links', self.fail_fetch), [])
+        self.assertRaises(replay.FeedNotRecorded, replay.capture, 'olsr', 'hna', self.fail_fetch)
+
+    def test_stop_without_recording(self):
+        replay.stop_recording(self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_capture_many(self):
+        replay.start_recording()
+        data = {'b': 'second', 'a': 'first', 'c': 'third'}
+        self.assertEqual(replay.capture_many('http', data.keys(), lambda: data), data)
+        replay.stop_recording(self.path)
+
+        replay.start_replay(self.path)
+        # Recorded data is assigned to sorted keys in a round-robin manner.
+        self.assertEqual(replay.capture_many('http', ['n4', 'n1', 'n3', 'n2', 'n5'], self.fail_fetch), {
+            'n1': 'first',
+            'n2': 'second',
+            'n3': 'third',
+            'n4': 'first',
+            'n5': 'second',
+        })
+        self.assertEqual(replay.capture_many('babel', ['n1'], self.fail_fetch), {})
+
+    def test_capture_stream(self):
+        replay.start_recording()
+        stream = replay.capture_stream('fping', 'hosts', lambda: iter(['a', 'b', 'c']))
+        # Items are recorded as they are consumed.
+        self.assertEqual(next(stream), 'a')
+        self.assertEqual(list(stream), ['b', 'c'])
+        replay.stop_recording(self.path)
+
+        replay.start_replay(self.path)
+        self.assertEqual(list(replay.capture_stream('fping', 'hosts', self.fail_fetch)), ['a', 'b', 'c'])
+        # Recorded streams may be replayed many times.
+        self.assertEqual(list(replay.capture_stream('fping', 'hosts', self.fail_fetch)), ['a', 'b', 'c'])
+        self.assertRaises(replay.FeedNotRecorded, replay.capture_stream, 'fping', 'other', self.fail_fetch)
@@ -0,0 +1,67 @@
+import unittest
+
+from nodewatcher.core.monitor import scheduling
+
+
+class SchedulingTestCase(unittest.TestCase):
+    def test_phase(self):
+        phases = [scheduling.get_phase('node-%d' % index) for index in xrange(1000)]
+        for phase in phases:
+            self.assertTrue(0 <= phase < 1)
+
+        # Phases are stable and spread evenly.
+        self.assertEqual(scheduling.get_phase('node-0'), phases[0])
+        for bucket in xrange(10):
+            count = len([phase for phase in phases if bucket / 10. <= phase < (bucket + 1) / 10.])
+            self.assertTrue(50 <= count <= 150)
+
+    def assertDueOncePerInterval(self, interval, windows):
+        start = 1451606400
+        for index in xrange(100):
+            key = 'node-%d' % index
+            due = []
+            end = start
+            for window in windows:
+                if scheduling.is_due(key, interval, end, end + window):
+                    due.append(end)
+                end += window
+
+            # Every interval covered by the windows contains exactly one due window.
+            self.assertEqual(len(due), (end - start) // interval)
+            for previous, current in zip(due, due[1:]):
+                self.assertTrue(interval - max(windows) < current - previous < interval + max(windows))
+
+    def test_due_once_per_interval(self):
+        self.assertDueOncePerInterval(300, [60] * 50)
+        self.assertDueOncePerInterval(300, [300] * 10)
+        # Windows of irregular length, such as cycles that overrun.
+        self.assertDueOncePerInterval(300, [60, 90, 30, 150, 45, 75, 60, 90] * 5)
+
+    def test_due_long_window(self):
+        # A window longer than the interval still only polls the item once.
+        self.assertTrue(scheduling.is_due('node-0', 60, 0, 600))
+        self.assertFalse(scheduling.is_due('node-0', 60, 100, 100))
+
+    def test_backoff(self):
+        # Items that are available, or only recently became unavailable, use the base interval.
+        self.assertEqual(scheduling.get_backoff_interval(300, 0, 3600), 300)
+        self.assertEqual(scheduling.get_backoff_interval(300, 3599, 3600), 300)
+
+        # The interval doubles each time the duration of unavailability doubles.
+        self.assertEqual(scheduling.get_backoff_interval(300, 3600, 3600), 600)
+        self.assertEqual(scheduling.get_backoff_interval(300, 7199, 3600), 600)
+        self.assertEqual(scheduling.get_backoff_interval(300, 7200, 3600), 1200)
+        self.assertEqual(scheduling.get_backoff_interval(300, 14400, 3600), 2400)
+
+        # Items that have never been available start at the first step.
+        self.assertEqual(scheduling.get_backoff_interval(300, None, 3600), 600)
+
+    def test_backoff_cap(self):
+        self.assertEqual(scheduling.get_backoff_interval(300, 14400, 3600, 1800), 1800)
+        self.assertEqual(scheduling.get_backoff_interval(300, 10 ** 12, 3600, 1800), 1800)
+        self.assertEqual(scheduling.get_backoff_interval(300, None, 3600, 1800), 600)
+        # The cap never shortens the base interval.
+        self.assertEqual(scheduling.get_backoff_interval(300, 14400, 3600, 60), 300)
+        self.assertEqual(scheduling.get_backoff_interval(300, 0, 3600, 60), 300)
+        # Without a cap the exponent is still limited.
+        self.assertEqual(scheduling.get_backoff_interval(1, 10 ** 12, 1), 2 ** 16)
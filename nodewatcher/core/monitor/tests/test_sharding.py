@@ -0,0 +1,89 @@
+import datetime
+import unittest
+
+from django import test
+from django.utils import timezone
+
+from nodewatcher.core.monitor import models as monitor_models, sharding
+
+
+class Node(object):
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class OwnershipTestCase(unittest.TestCase):
+    def test_owner_leaves(self):
+        members = ['a', 'b', 'c', 'd']
+        keys = ['node-%d' % index for index in xrange(1000)]
+        owners = dict([(key, sharding.get_owner(key, members)) for key in keys])
+
+        # Keys are spread between all members.
+        self.assertEqual(set(owners.values()), set(members))
+
+        # Only keys of the leaving member move to other members.
+        remaining = ['a', 'b', 'd']
+        for key in keys:
+            owner = sharding.get_owner(key, remaining)
+            if owners[key] == 'c':
+                self.assertIn(owner, remaining)
+            else:
+                self.assertEqual(owner, owners[key])
+
+        # Member order does not matter.
+        for key in keys[:100]:
+            self.assertEqual(sharding.get_owner(key, list(reversed(members))), owners[key])
+
+    def test_filter_nodes(self):
+        nodes = set([Node('node-%d' % index) for index in xrange(1000)])
+        members = ['a', 'b', 'c']
+        partitions = []
+        for instance in members:
+            shard = sharding.Shard('telemetry', instance, 60)
+            shard.members = members
+            partitions.append(shard.filter_nodes(nodes))
+
+        # Every node is processed by exactly one member.
+        self.assertEqual(set.union(*partitions), nodes)
+        self.assertEqual(sum([len(partition) for partition in partitions]), len(nodes))
+        for partition in partitions:
+            self.assertTrue(partition)
+
+    def test_single_member(self):
+        nodes = set([Node('node-%d' % index) for index in xrange(10)])
+        shard = sharding.Shard('telemetry', 'a', 60)
+        self.assertIs(shard.filter_nodes(nodes), nodes)
+        self.assertTrue(shard.leader)
+
+
+class ShardTestCase(test.TestCase):
+    def test_renew(self):
+        now = timezone.now()
+        monitor_models.MonitorLease.objects.create(run='telemetry', instance='a', expires=now - datetime.timedelta(seconds=1))
+        monitor_models.MonitorLease.objects.create(run='telemetry', instance='c', expires=now + datetime.timedelta(seconds=60))
+        # Leases of other runs are not considered.
+        monitor_models.MonitorLease.objects.create(run='topology', instance='0', expires=now + datetime.timedelta(seconds=60))
+
+        shard = sharding.Shard('telemetry', 'd', 60)
+        shard.renew()
+
+        # The stale lease is expired and the lowest remaining instance is elected.
+        self.assertEqual(shard.members, ['c', 'd'])
+        self.assertFalse(shard.leader)
+        self.assertFalse(monitor_models.MonitorLease.objects.filter(run='telemetry', instance='a').exists())
+        lease = monitor_models.MonitorLease.objects.get(run='telemetry', instance='d')
+        self.assertGreater(lease.expires, now + datetime.timedelta(seconds=59))
+
+        other = sharding.Shard('telemetry', 'b', 60)
+        other.renew()
+        self.assertEqual(other.members, ['b', 'c', 'd'])
+        self.assertTrue(other.leader)
+
+        # Once the leader releases its lease, the next lowest instance takes over.
+        other.release()
+        shard.renew()
+        self.assertEqual(shard.members, ['c', 'd'])
+        sharding.Shard('telemetry', 'c', 60).release()
+        shard.renew()
+        self.assertEqual(shard.members, ['d'])
+        self.assertTrue(shard.leader)
@@ -0,0 +1,504 @@
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import unittest
+
+from django import test
+
+from nodewatcher.core import models as core_models
+from nodewatcher.core.monitor import processors, worker
+from nodewatcher.core.registry import access as registry_access, registration
+
+
+class RecordingProcessor(processors.NodeProcessor):
+    """
+    Records invocations of node processors.
+    """
+
+    calls = []
+
+    def process(self, context, node):
+        self.calls.append((self.__class__.__name__, 'process', node.pk))
+        return context
+
+    def cleanup(self, context, node):
+        self.calls.append((self.__class__.__name__, 'cleanup', node.pk))
+
+
+class SlowProcessor(RecordingProcessor):
+    def process(self, context, node):
+        context = super(SlowProcessor, self).process(context, node)
+        time.sleep(5)
+        return context
+
+
+class CacheCheckingProcessor(RecordingProcessor):
+    """
+    Records whether registry items of processed nodes are cached.
+    """
+
+    cached = []
+
+    def process(self, context, node):
+        self.cached.append([
+            registry_access.get_cache(registration.point(regpoint), node) is not None
+            for regpoint in ('node.config', 'node.monitoring')
+        ])
+        return super(CacheCheckingProcessor, self).process(context, node)
+
+
+def run_config(**config):
+    run_info = {
+        'name': 'telemetry',
+        'interval': 300,
+        'workers': 2,
+        'min_workers': 1,
+        'max_workers': None,
+        'target_utilization': 0.7,
+        'max_tasks_per_child': 100,
+        'worker_pool': 'persistent',
+        'max_worker_memory': None,
+        'max_run_memory': None,
+        'node_timeout': None,
+        'chunk_size': 1,
+        'threads': 1,
+        'registry_cache': False,
+        'instrumentation': False,
+        'spread': None,
+        'backoff_after': 1800,
+        'max_interval': None,
+        'shard_lease': None,
+        'processors': [],
+        'cycles': None,
+        'process_only_node': None,
+        'shard_instance': None,
+        'record': None,
+    }
+    run_info.update(config)
+    return run_info
+
+
+class TestProcess(object):
+    def __init__(self, pid):
+        self.pid = pid
+
+
+class TestPool(object):
+    """
+    A stand-in for a pool of worker processes.
+    """
+
+    def __init__(self, processes, pids):
+        self._processes = processes
+        self._pool = [TestProcess(pid) for pid in pids]
+        self.terminated = False
+
+    def imap_unordered(self, func, iterable, chunksize=1):
+        return TestResults(func, iterable)
+
+    def terminate(self):
+        self.terminated = True
+
+    def join(self):
+        pass
+
+
+class TestResults(object):
+    """
+    Results of a stand-in pool, which are computed when they are requested.
+    """
+
+    def __init__(self, func, iterable):
+        self.func = func
+        self.iterable = iter(iterable)
+
+    def next(self, timeout=None):
+        return self.func(next(self.iterable))
+
+
+class TestRun(worker.MonitorRun):
+    """
+    A monitoring run that uses stand-ins for worker pools.
+    """
+
+    def __init__(self, config):
+        super(TestRun, self).__init__(config)
+        self.pools = []
+
+    def prepare_workers(self):
+        self.workers = TestPool(self.concurrency, [len(self.pools) * 100 + index for index in xrange(self.concurrency)])
+        self.pools.append(self.workers)
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rss = {}
+        self._get_process_rss = worker.get_process_rss
+        worker.get_process_rss = lambda pid: self.rss.get(pid, None)
+
+    def tearDown(self):
+        worker.get_process_rss = self._get_process_rss
+
+    def test_persistent(self):
+        run = TestRun(run_config(max_worker_memory=256))
+        self.rss = {0: 100 * 1024 * 1024, 1: 200 * 1024 * 1024}
+
+        # The pool survives across cycles.
+        for cycle in xrange(3):
+            run.cycle()
+        self.assertEqual(len(run.pools), 1)
+        self.assertFalse(run.pools[0].terminated)
+
+        run.stop_workers()
+        self.assertTrue(run.pools[0].terminated)
+        self.assertIsNone(run.workers)
+
+    def test_cycle(self):
+        run = TestRun(run_config(worker_pool='cycle'))
+
+        # A new pool is used for every cycle.
+        for cycle in xrange(3):
+            run.cycle()
+            self.assertIsNone(run.workers)
+        self.assertEqual(len(run.pools), 3)
+        self.assertTrue(all([pool.terminated for pool in run.pools]))
+
+    def test_recycle_memory(self):
+        run = TestRun(run_config(max_worker_memory=256))
+        run.recycle_workers()
+
+        # Workers with unknown memory usage are not recycled.
+        self.rss = {0: 100 * 1024 * 1024}
+        run.recycle_workers()
+        self.assertEqual(len(run.pools), 1)
+
+        # The pool is recycled once any of its workers crosses the ceiling.
+        self.rss = {0: 100 * 1024 * 1024, 1: 257 * 1024 * 1024}
+        run.recycle_workers()
+        self.assertEqual(len(run.pools), 2)
+        self.assertTrue(run.pools[0].terminated)
+        self.assertIs(run.workers, run.pools[1])
+        self.assertEqual([process.pid for process in run.workers._pool], [100, 101])
+
+        # Without a ceiling, memory usage is not checked.
+        run = TestRun(run_config())
+        run.recycle_workers()
+        self.rss = {0: 10 * 1024 * 1024 * 1024}
+        run.recycle_workers()
+        self.assertEqual(len(run.pools), 1)
+
+    def test_recycle_resize(self):
+        run = TestRun(run_config())
+        run.recycle_workers()
+
+        run.concurrency = 4
+        run.recycle_workers()
+        self.assertEqual(len(run.pools), 2)
+        self.assertTrue(run.pools[0].terminated)
+        self.assertEqual(run.workers._processes, 4)
+
+
+class DispatchStageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dispatched = []
+        self._stage_worker = worker.stage_worker
+        worker.stage_worker = self.stage_worker
+
+    def tearDown(self):
+        worker.stage_worker = self._stage_worker
+
+    def stage_worker(self, args, timeout=None, registry_cache=False, instrument=False):
+        self.dispatched.append((args, timeout))
+        if args == 'failing':
+            raise ValueError
+
+        return args, 1.0, args == 'slow', [], 0.01
+
+    def test_chunked(self):
+        self.assertEqual(list(worker.chunked(xrange(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(worker.chunked(xrange(6), 3)), [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual(list(worker.chunked([], 3)), [])
+
+        # Chunks are produced while the iterable is consumed.
+        consumed = []
+
+        def items():
+            for item in xrange(4):
+                consumed.append(item)
+                yield item
+
+        chunks = worker.chunked(items(), 2)
+        self.assertEqual(next(chunks), [0, 1])
+        self.assertEqual(consumed, [0, 1])
+
+    def test_dispatch(self):
+        run = TestRun(run_config(node_timeout=30))
+        run.prepare_workers()
+        statistics = worker.instrumentation.CycleStatistics(run.name)
+
+        # Nodes that have failed are skipped and workers enforce the node deadline.
+        durations, db_latencies = run.dispatch_stage(iter(['a', 'failing', 'slow', 'b']), 4, statistics)
+        self.assertEqual(durations, [1.0, 1.0, 1.0])
+        self.assertEqual(db_latencies, [0.01, 0.01, 0.01])
+        self.assertEqual([timeout for args, timeout in self.dispatched], [30] * 4)
+
+    def test_timeout(self):
+        class TimeoutResults(object):
+            def next(self, timeout=None):
+                raise multiprocessing.TimeoutError
+
+        run = TestRun(run_config())
+        run.prepare_workers()
+        run.workers.imap_unordered = lambda func, iterable, chunksize=1: TimeoutResults()
+
+        statistics = worker.instrumentation.CycleStatistics(run.name)
+        self.assertEqual(run.dispatch_stage(iter(['a']), 1, statistics), ([], []))
+
+
+class ThreadSafeProcessor(processors.NodeProcessor):
+    thread_safe = True
+
+
+class TestConnection(object):
+    """
+    A stand-in for the database connection that records which threads have
+    closed their connections.
+    """
+
+    def __init__(self):
+        self.closed = []
+
+    def close(self):
+        self.closed.append(threading.current_thread().ident)
+
+
+class ThreadedStageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.threads = set()
+        self._stage_worker = worker.stage_worker
+        worker.stage_worker = self.stage_worker
+        self._connection = worker.connection
+        self.connection = worker.connection = TestConnection()
+
+    def tearDown(self):
+        if worker._thread_pool is not None:
+            worker._thread_pool.close()
+            worker._thread_pool.join()
+            worker._thread_pool = None
+            worker._thread_pool_size = None
+
+        worker.stage_worker = self._stage_worker
+        worker.connection = self._connection
+
+    def stage_worker(self, args, timeout=None, registry_cache=False, instrument=False):
+        self.threads.add(threading.current_thread().ident)
+        if args == 'failing':
+            raise ValueError
+
+        # Give other threads a chance to pick up nodes.
+        time.sleep(0.01)
+        return args, 1.0, False, [], 0.01
+
+    def test_stage_threads(self):
+        run = TestRun(run_config(threads=4))
+        self.assertEqual(run.get_stage_threads([ThreadSafeProcessor, ThreadSafeProcessor]), 4)
+        # Stages with processors that are not thread-safe use one thread.
+        self.assertEqual(run.get_stage_threads([ThreadSafeProcessor, RecordingProcessor]), 1)
+
+        run = TestRun(run_config(threads=1))
+        self.assertEqual(run.get_stage_threads([ThreadSafeProcessor]), 1)
+
+    def test_threaded_worker(self):
+        results = worker.threaded_stage_worker(['a', 'failing', 'b', 'c', 'd'], 4)
+
+        # Failures only affect the node that is being processed.
+        self.assertItemsEqual([result[0] for result in results], ['a', 'b', 'c', 'd'])
+        self.assertGreater(len(self.threads), 1)
+        self.assertEqual(worker._thread_pool_size, 4)
+
+        # The pool is kept for subsequent batches.
+        pool = worker._thread_pool
+        worker.threaded_stage_worker(['a'], 4)
+        self.assertIs(worker._thread_pool, pool)
+        self.assertEqual(self.connection.closed, [])
+
+    def test_replace_pool(self):
+        worker.threaded_stage_worker(['a', 'b'], 3)
+        pool = worker._thread_pool
+        threads = pool._pool
+
+        worker.threaded_stage_worker(['a', 'b'], 2)
+        self.assertIsNot(worker._thread_pool, pool)
+        self.assertEqual(worker._thread_pool_size, 2)
+
+        # Threads of the replaced pool have closed their connections and exited.
+        self.assertItemsEqual(self.connection.closed, [thread.ident for thread in threads])
+        for thread in threads:
+            self.assertFalse(thread.is_alive())
+
+    def test_dispatch(self):
+        run = TestRun(run_config(threads=2, chunk_size=2))
+        run.prepare_workers()
+        statistics = worker.instrumentation.CycleStatistics(run.name)
+
+        # Nodes are dispatched to workers in batches, which are processed by threads.
+        durations, db_latencies = run.dispatch_stage(iter(['a', 'b', 'c', 'd', 'e']), 5, statistics, threads=2)
+        self.assertEqual(durations, [1.0] * 5)
+        self.assertEqual(worker._thread_pool_size, 2)
+
+
+class LeakedObject(object):
+    pass
+
+
+class LogRecorder(logging.Handler):
+    def __init__(self):
+        super(LogRecorder, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class MemoryWatermarkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.leaked = []
+        self.slept = []
+        self.rss = 50 * 1024 * 1024
+
+        test_case = self
+
+        class TestTime(object):
+            time = staticmethod(time.time)
+
+            @staticmethod
+            def sleep(seconds):
+                test_case.slept.append(seconds)
+                # Objects that are created between cycles and never released.
+                test_case.leaked.extend([LeakedObject() for index in xrange(1000)])
+                test_case.rss = 200 * 1024 * 1024
+
+        self._time = worker.time
+        worker.time = TestTime
+        self._get_process_rss = worker.get_process_rss
+        worker.get_process_rss = lambda pid: self.rss
+        self._logger = worker.logger
+        self.log = LogRecorder()
+        logging.getLogger('monitor.worker').addHandler(self.log)
+
+    def tearDown(self):
+        worker.time = self._time
+        worker.get_process_rss = self._get_process_rss
+        worker.logger = self._logger
+        logging.getLogger('monitor.worker').removeHandler(self.log)
+
+    def test_check_memory(self):
+        run = TestRun(run_config(max_run_memory=100))
+        # The first check records live objects after the first cycle.
+        self.assertFalse(run.check_memory())
+        self.assertFalse(run.check_memory())
+
+        self.rss = 101 * 1024 * 1024
+        self.leaked.extend([LeakedObject() for index in xrange(1000)])
+        self.assertTrue(run.check_memory())
+        self.assertIn("Run 'telemetry' uses 101 MB of memory, restarting the run process.", self.log.messages)
+        self.assertIn("  - %s.LeakedObject: +1000" % __name__, self.log.messages)
+
+    def test_disabled(self):
+        self.rss = 10 * 1024 * 1024 * 1024
+        for config in (run_config(), run_config(worker_pool='cycle', max_run_memory=100)):
+            run = TestRun(config)
+            for cycle in xrange(3):
+                self.assertFalse(run.check_memory())
+
+        # Memory usage that cannot be determined never restarts the run.
+        self.rss = None
+        run = TestRun(run_config(max_run_memory=100))
+        for cycle in xrange(3):
+            self.assertFalse(run.check_memory())
+
+    def test_restart(self):
+        run = TestRun(run_config(max_run_memory=100))
+
+        # The run stops after the watermark has been crossed and requests a restart.
+        with self.assertRaises(SystemExit) as exit:
+            worker.main_worker(run)
+
+        self.assertEqual(exit.exception.code, worker.RESTART_EXIT_CODE)
+        self.assertTrue(run.restart_requested)
+        self.assertEqual(len(self.slept), 1)
+        self.assertTrue(run.pools[0].terminated)
+        self.assertIn("  - %s.LeakedObject: +1000" % __name__, self.log.messages)
+
+    def test_cycles(self):
+        run = TestRun(run_config(max_run_memory=1000, cycles=3))
+        worker.main_worker(run)
+
+        # Runs that stay below the watermark are not restarted.
+        self.assertFalse(run.restart_requested)
+        self.assertEqual(len(self.slept), 2)
+
+
+class StageWorkerTestCase(test.TestCase):
+    def setUp(self):
+        self.node = core_models.Node()
+        self.node.save()
+        RecordingProcessor.calls = []
+        CacheCheckingProcessor.cached = []
+        self._alarm_handler = signal.getsignal(signal.SIGALRM)
+
+    def tearDown(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._alarm_handler)
+
+    def run_stage(self, processor_list, **kwargs):
+        context = processors.ProcessorContext()
+        return worker.stage_worker((context, processors.ProcessorContext(), self.node.pk, processor_list), **kwargs)
+
+    def test_registry_cache(self):
+        for index in xrange(3):
+            self.run_stage([CacheCheckingProcessor], registry_cache=True)
+        self.run_stage([CacheCheckingProcessor])
+
+        # The cache is only enabled while the node is processed.
+        self.assertEqual(CacheCheckingProcessor.cached, [[True, True]] * 3 + [[False, False]])
+        for regpoint in ('node.config', 'node.monitoring'):
+            self.assertNotIn((regpoint, self.node.pk), registry_access._caches)
+
+    def test_cleanup(self):
+        class OtherProcessor(RecordingProcessor):
+            pass
+
+        node_pk, duration, timed_out, samples, db_latency = self.run_stage([RecordingProcessor, OtherProcessor], timeout=5)
+
+        self.assertEqual(node_pk, self.node.pk)
+        self.assertFalse(timed_out)
+        # Cleanup is performed in reverse order.
+        self.assertEqual(RecordingProcessor.calls, [
+            ('RecordingProcessor', 'process', self.node.pk),
+            ('OtherProcessor', 'process', self.node.pk),
+            ('OtherProcessor', 'cleanup', self.node.pk),
+            ('RecordingProcessor', 'cleanup', self.node.pk),
+        ])
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+
+    def test_deadline(self):
+        start = time.time()
+        node_pk, duration, timed_out, samples, db_latency = self.run_stage(
+            [RecordingProcessor, SlowProcessor, RecordingProcessor],
+            timeout=0.2,
+        )
+
+        self.assertTrue(timed_out)
+        self.assertLess(time.time() - start, 2)
+        self.assertLess(duration, 2)
+        # The timer is disarmed, so it cannot interrupt anything after the node.
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+        # Processors after the abandoned one do not run, but completed ones are still cleaned up.
+        self.assertEqual(RecordingProcessor.calls, [
+            ('RecordingProcessor', 'process', self.node.pk),
+            ('SlowProcessor', 'process', self.node.pk),
+            ('RecordingProcessor', 'cleanup', self.node.pk),
+        ])
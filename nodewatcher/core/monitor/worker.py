@@ -1,30 +1,217 @@
-import copy
+import collections
+import cPickle
+import functools
+import gc
 import logging
 import multiprocessing
+import multiprocessing.pool
+import os
+import signal
+import sys
+import tempfile
+import threading
 import time
 import traceback
+import uuid
 
 from django import db
 from django.db import connection, transaction
 
-from . import processors as monitor_processors, exceptions
+from . import processors as monitor_processors, concurrency, exceptions, feeds, instrumentation, replay, sharding, stats as monitor_stats
 from .config import config as monitor_config
 from .. import models as core_models
+from ..registry import access as registry_access, registration
 
 # Logger instance
 logger = logging.getLogger('monitor.worker')
 
+# Minimum number of seconds between two stage progress reports
+PROGRESS_REPORT_INTERVAL = 30
+# Exit code of a run process that should be restarted
+RESTART_EXIT_CODE = 75
+# Number of object types with the largest growth reported when a run exceeds its memory
+LEAK_REPORT_TYPES = 20
+# Number of seconds between checks whether run processes have exited
+SUPERVISE_INTERVAL = 1
+# Maximum number of seconds to wait for threads of a replaced pool to close their connections
+THREAD_CLOSE_TIMEOUT = 30
+
+# Shared context that has been most recently loaded by this worker
+_shared_context = None
+# Pool of threads used by this worker to process nodes of thread-safe stages
+_thread_pool = None
+# Number of threads in the pool of this worker
+_thread_pool_size = None
+
+
+class SharedContext(object):
+    """
+    A network-level context that is shipped to worker processes only once per
+    stage instead of being included in the arguments of every task.
+    """
+
+    def __init__(self, context):
+        """
+        Class constructor.
+
+        :param context: Network-level context
+        """
+
+        self.id = uuid.uuid4().hex
+        self.context = context
+
+        descriptor, self.path = tempfile.mkstemp(prefix='nodewatcher-context-')
+        with os.fdopen(descriptor, 'wb') as context_file:
+            cPickle.dump(context, context_file, cPickle.HIGHEST_PROTOCOL)
+
+    def __getstate__(self):
+        return {'id': self.id, 'path': self.path}
+
+    def get(self):
+        """
+        Returns the shared context. In worker processes the context is loaded at
+        most once per stage.
+        """
+
+        global _shared_context
+
+        if getattr(self, 'context', None) is not None:
+            return self.context
+
+        if _shared_context is None or _shared_context[0] != self.id:
+            with open(self.path, 'rb') as context_file:
+                _shared_context = (self.id, cPickle.load(context_file))
+
+        return _shared_context[1]
+
+    def release(self):
+        """
+        Removes the shared context once the stage is completed.
+        """
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def get_process_rss(pid):
+    """
+    Returns the resident set size of a process.
+
+    :param pid: Process identifier
+    :return: Resident set size in bytes or None when it cannot be determined
+    """
+
+    try:
+        with open('/proc/%d/statm' % pid, 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into lists of at most the given size.
+
+    :param iterable: Iterable to split
+    :param size: Maximum size of each list
+    """
+
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def get_object_counts():
+    """
+    Returns the number of live objects tracked by the garbage collector for
+    each object type.
+    """
+
+    counts = collections.Counter()
+    for obj in gc.get_objects():
+        obj_type = type(obj)
+        counts['%s.%s' % (obj_type.__module__, obj_type.__name__)] += 1
+
+    return counts
+
+
+def ensure_usable_connection():
+    """
+    Ensures that the database connection of a (possibly long-lived) worker can be
+    used. Connections that are no longer usable are closed so that a new one will
+    be established on the next query.
+    """
+
+    if connection.connection is None or not connection.errors_occurred:
+        return
+
+    if connection.is_usable():
+        connection.errors_occurred = False
+    else:
+        connection.close()
+
+
+def _node_deadline_handler(signum, frame):
+    """
+    Signal handler that aborts processing of a node once its deadline expires.
+    """
+
+    raise exceptions.NodeProcessorTimeout
+
 
-def stage_worker(args):
+def stage_worker(args, timeout=None, registry_cache=False, instrument=False):
     """
     Runs a list of (node) processors on a given node.
+
+    :param args: A tuple (context, node_context, node_pk, processors), where context
+      may either be a `ProcessorContext` or a `SharedContext`
+    :param timeout: Optional number of seconds after which processing of the node
+      is abandoned
+    :param registry_cache: Should registry items of the node be cached while the
+      processors are running
+    :param instrument: Should processor invocations be measured
+    :return: A tuple (node_pk, duration, timed_out, samples, db_latency), where db_latency
+      is the time it took to obtain a connection and fetch the node from the database
     """
 
+    start = time.time()
+    timed_out = False
+    recorder = instrumentation.Recorder(enabled=instrument)
+
     context, node_context, node_pk, processors = args
-    context = copy.deepcopy(context)
+    if isinstance(context, SharedContext):
+        context = context.get()
+
+    # Node processors only see a copy, so the network-level context is never modified
+    # and can be reused for all nodes.
+    context = context.isolated_copy()
     context.merge_with(node_context)
+
+    # Fetching the node also serves as a probe of database latency.
+    db_start = time.time()
+    ensure_usable_connection()
     node = core_models.Node.objects.get(pk=node_pk)
+    db_latency = time.time() - db_start
     cleanup_queue = []
+
+    if registry_cache:
+        # Registry items of the node are prefetched and lookups are served from memory
+        # while processing the node.
+        for regpoint in ('node.config', 'node.monitoring'):
+            registry_access.enable_cache(registration.point(regpoint), [node])
+
+    if timeout:
+        signal.signal(signal.SIGALRM, _node_deadline_handler)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
     try:
         for p in processors:
             try:
@@ -32,7 +219,8 @@ def stage_worker(args):
                 with transaction.atomic():
                     processor = p()
                     try:
-                        context = processor.process(context, node)
+                        with recorder.measure(p, 'process'):
+                            context = processor.process(context, node)
                         if not isinstance(context, monitor_processors.ProcessorContext):
                             logger.warning("Processor '%s' did not return a valid context!" % processor.__class__.__name__)
                     except exceptions.NodeProcessorAbort:
@@ -40,25 +228,115 @@ def stage_worker(args):
                         # do not rollback the transaction.
                         abort_requested = True
 
+                if registry_cache:
+                    # Processors may modify cached items without saving them, so such
+                    # changes must not be seen by later processors.
+                    registry_access.clear_modified(node)
+
                 cleanup_queue.append(processor)
                 if abort_requested:
                     break
             except KeyboardInterrupt:
                 raise
+            except exceptions.NodeProcessorTimeout:
+                logger.warning("Processing of node '%s' has exceeded the deadline of %d seconds, abandoning." % (node.pk, timeout))
+                timed_out = True
+                registry_access.clear_cache(node)
+                break
             except:
                 logger.error("Processor for node '%s' has failed with exception:" % node.pk)
                 logger.error(traceback.format_exc())
+                # Cached registry items may have been modified by a rolled back transaction.
+                registry_access.clear_cache(node)
                 break
     finally:
+        if timeout:
+            # Disarm the deadline timer, cleanup must not be interrupted.
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
         # Invoke all cleanup functions in reverse order
         for processor in cleanup_queue[::-1]:
             try:
-                with transaction.atomic():
+                with transaction.atomic(), recorder.measure(processor.__class__, 'cleanup'):
                     processor.cleanup(context, node)
             except:
                 logger.warning("Processor cleanup method for node '%s' has failed with exception:" % node.pk)
                 logger.warning(traceback.format_exc())
 
+        if registry_cache:
+            # Long-lived workers must not keep track of caches of every node they have processed.
+            for regpoint in ('node.config', 'node.monitoring'):
+                registry_access.disable_cache(registration.point(regpoint), [node])
+
+    return node_pk, time.time() - start, timed_out, recorder.samples, db_latency
+
+
+def _thread_stage_worker(args, **kwargs):
+    """
+    Runs `stage_worker` in a thread of a worker process. Failures only affect
+    the node that is being processed.
+    """
+
+    try:
+        return stage_worker(args, **kwargs)
+    except:
+        logger.error("Worker thread has failed with exception:")
+        logger.error(traceback.format_exc())
+        return None
+
+
+def close_thread_connections(pool, threads):
+    """
+    Closes database connections of all threads in a pool. Each thread waits
+    until all threads have closed their connections, so that every thread
+    receives exactly one task.
+
+    :param pool: Thread pool
+    :param threads: Number of threads in the pool
+    """
+
+    condition = threading.Condition()
+    remaining = [threads]
+
+    def close(index):
+        connection.close()
+
+        deadline = time.time() + THREAD_CLOSE_TIMEOUT
+        with condition:
+            remaining[0] -= 1
+            condition.notify_all()
+            while remaining[0] > 0 and time.time() < deadline:
+                condition.wait(deadline - time.time())
+
+    pool.map(close, xrange(threads), 1)
+
+
+def threaded_stage_worker(batch, threads, **kwargs):
+    """
+    Runs a list of (node) processors on a batch of nodes concurrently, using
+    a pool of threads in the worker process. Each thread uses its own database
+    connection, which is kept open for subsequent batches.
+
+    :param batch: A list of `stage_worker` arguments
+    :param threads: Number of threads
+    :return: A list of `stage_worker` results
+    """
+
+    global _thread_pool, _thread_pool_size
+
+    if _thread_pool is not None and _thread_pool_size != threads:
+        close_thread_connections(_thread_pool, _thread_pool_size)
+        _thread_pool.close()
+        _thread_pool.join()
+        _thread_pool = None
+
+    if _thread_pool is None:
+        _thread_pool = multiprocessing.pool.ThreadPool(threads)
+        _thread_pool_size = threads
+
+    worker = functools.partial(_thread_stage_worker, **kwargs)
+    return [result for result in _thread_pool.map(worker, batch, 1) if result is not None]
+
 
 def main_worker(run):
     """
@@ -69,13 +347,21 @@ def main_worker(run):
     logger = logger.getChild('run.%s' % run.name)
     run.start()
 
+    if run.restart_requested:
+        sys.exit(RESTART_EXIT_CODE)
 
-def cycle_worker(run):
+
+def cycle_worker(run, results=None):
     """
     Starts a cycle of the given run.
+
+    :param run: Monitoring run
+    :param results: Optional connection that the cycle report is sent to
     """
 
-    run.cycle()
+    report = run.cycle()
+    if results is not None:
+        results.send(report)
 
 
 class MonitorRun(object):
@@ -83,6 +369,139 @@ class MonitorRun(object):
     def __init__(self, config):
         self.name = config['name']
         self.config = config
+        self.workers = None
+        self.concurrency = config['workers']
+        self.controller = None
+        self.schedule_window = None
+        self._last_schedule = None
+        self.shard = None
+        self.restart_requested = False
+        self._baseline_objects = None
+
+        if config.get('shard_instance', None) is not None:
+            lease_duration = config['shard_lease'] or 3 * max(30, self.period)
+            self.shard = sharding.Shard(self.name, config['shard_instance'], lease_duration)
+
+        if config['max_workers'] is not None:
+            self.controller = concurrency.ConcurrencyController(
+                config['min_workers'],
+                config['max_workers'],
+                config['target_utilization'],
+                config['workers'],
+            )
+            self.concurrency = self.controller.workers
+
+    @property
+    def period(self):
+        """
+        Number of seconds between two cycles. When nodes are spread across the
+        interval, multiple cycles are performed in each interval.
+        """
+
+        return float(self.config['interval']) / (self.config['spread'] or 1)
+
+    def update_schedule(self):
+        """
+        Updates the scheduling window of the next cycle. Each cycle processes
+        nodes that are due between the start of the previous cycle and now.
+        """
+
+        if not self.config['spread']:
+            return
+
+        now = time.time()
+        if self._last_schedule is None:
+            self._last_schedule = now - self.period
+
+        self.schedule_window = (self._last_schedule, now)
+        self._last_schedule = now
+
+    def update_concurrency(self, cycle_duration, report):
+        """
+        Chooses the number of workers for the next cycle when concurrency is adaptive.
+
+        :param cycle_duration: Duration of the last cycle in seconds
+        :param report: Report of the last cycle or None if it is not available
+        """
+
+        if self.controller is None:
+            return
+
+        utilization = cycle_duration / self.period
+        db_latency = (report or {}).get('db_latency', None)
+        previous = self.concurrency
+        self.concurrency = self.controller.update(utilization, db_latency)
+        if self.concurrency != previous:
+            logger.info("Changing the number of workers for run '%s' from %d to %d." % (self.name, previous, self.concurrency))
+
+        gauges = {'workers': self.concurrency, 'utilization': utilization}
+        if db_latency is not None:
+            gauges['db_latency'] = db_latency
+        instrumentation.export_gauges(self.name, gauges)
+
+    def check_memory(self):
+        """
+        Checks whether the run process has crossed its memory watermark. The first
+        call records the live objects after caches have been warmed up by a cycle,
+        so that growth of objects can be reported once the watermark is crossed.
+
+        :return: True when the run process should be restarted
+        """
+
+        max_memory = self.config['max_run_memory']
+        if not self.persistent_workers or max_memory is None:
+            return False
+
+        if self._baseline_objects is None:
+            self._baseline_objects = get_object_counts()
+            return False
+
+        rss = get_process_rss(os.getpid())
+        if rss is None or rss <= max_memory * 1024 * 1024:
+            return False
+
+        logger.warning("Run '%s' uses %d MB of memory, restarting the run process." % (self.name, rss // (1024 * 1024)))
+        growth = get_object_counts()
+        growth.subtract(self._baseline_objects)
+        logger.warning("Object types with the largest growth since the first cycle:")
+        for name, count in growth.most_common(LEAK_REPORT_TYPES):
+            if count <= 0:
+                break
+            logger.warning("  - %s: +%d" % (name, count))
+
+        return True
+
+    def update_shard(self):
+        """
+        Renews the lease of this instance when the run is sharded.
+        """
+
+        if self.shard is None:
+            return
+
+        try:
+            self.shard.renew()
+        except db.DatabaseError:
+            logger.error("Failed to renew the shard lease, keeping previous members:")
+            logger.error(traceback.format_exc())
+            return
+        finally:
+            # The connection must not be shared with the forked cycle process.
+            connection.close()
+
+        logger.info("Run '%s' is sharded across %d instances%s." % (
+            self.name,
+            len(self.shard.members),
+            ', this instance is the leader' if self.shard.leader else '',
+        ))
+
+    @property
+    def persistent_workers(self):
+        """
+        True when the worker pool should be kept alive across monitoring cycles.
+        """
+
+        return self.config['worker_pool'] == 'persistent'
 
     def prepare_workers(self):
         """
@@ -97,44 +516,230 @@ class MonitorRun(object):
         # Prepare worker processes
         try:
             self.workers = multiprocessing.Pool(
-                self.config['workers'],
+                self.concurrency,
                 maxtasksperchild=self.config['max_tasks_per_child'],
             )
         except TypeError:
             # Compatibility with Python 2.6 that doesn't have the maxtasksperchild argument
-            self.workers = multiprocessing.Pool(self.config['workers'])
+            self.workers = multiprocessing.Pool(self.concurrency)
+
+        logger.info("Ready with %d workers for run '%s'." % (self.concurrency, self.name))
+
+    def stop_workers(self):
+        """
+        Stops all worker processes.
+        """
+
+        if not self.workers:
+            return
 
-        logger.info("Ready with %d workers for run '%s'." % (self.config['workers'], self.name))
+        logger.info("Stopping worker processes...")
+        self.workers.terminate()
+        self.workers.join()
+        self.workers = None
+
+    def recycle_workers(self):
+        """
+        Ensures that a warm worker pool is available for the next cycle. The pool
+        is recreated when any of its workers has crossed the configured memory
+        ceiling. Recycling of workers after a number of tasks is handled by the
+        pool itself.
+        """
+
+        if self.workers and self.workers._processes != self.concurrency:
+            logger.info("Resizing the worker pool for run '%s' to %d workers..." % (self.name, self.concurrency))
+            self.stop_workers()
+
+        max_memory = self.config['max_worker_memory']
+        if self.workers and max_memory is not None:
+            for process in self.workers._pool:
+                rss = get_process_rss(process.pid)
+                if rss is not None and rss > max_memory * 1024 * 1024:
+                    logger.info("Worker %d uses %d MB of memory, recycling the worker pool for run '%s'..." % (
+                        process.pid, rss // (1024 * 1024), self.name
+                    ))
+                    self.stop_workers()
+                    break
+
+        if not self.workers:
+            logger.info("Preparing the worker pool for run '%s'..." % self.name)
+            self.prepare_workers()
+
+    def get_stage_threads(self, processor_list):
+        """
+        Returns the number of threads each worker process should use for the
+        given stage. Multiple threads are only used when all processors of the
+        stage are thread-safe.
+
+        :param processor_list: A list of node processors
+        """
+
+        threads = self.config['threads']
+        if threads > 1 and not all(processor.thread_safe for processor in processor_list):
+            logger.info("Not all processors are thread-safe, processing one node per worker.")
+            return 1
+
+        return threads
+
+    def dispatch_stage(self, arguments, count, statistics, threads=1):
+        """
+        Dispatches node processors to the worker pool and streams back the results
+        as soon as individual nodes are processed.
+
+        :param arguments: An iterable of arguments for `stage_worker`
+        :param count: Number of nodes in the stage
+        :param statistics: Cycle statistics that processor measurements are added to
+        :param threads: Number of threads each worker process uses to process nodes
+        :return: A tuple (durations, db_latencies) of per-node measurements
+        """
+
+        if threads > 1:
+            # Node deadlines are implemented using signals, which are only delivered
+            # to the main thread of a worker.
+            if self.config['node_timeout']:
+                logger.warning("Node deadlines are not enforced when processing nodes in threads.")
+
+            worker = functools.partial(
+                threaded_stage_worker,
+                threads=threads,
+                registry_cache=self.config['registry_cache'],
+                instrument=self.config['instrumentation'],
+            )
+            results = self.workers.imap_unordered(worker, chunked(arguments, threads * self.config['chunk_size']))
+        else:
+            worker = functools.partial(
+                stage_worker,
+                timeout=self.config['node_timeout'],
+                registry_cache=self.config['registry_cache'],
+                instrument=self.config['instrumentation'],
+            )
+            results = self.workers.imap_unordered(worker, arguments, self.config['chunk_size'])
+
+        durations = []
+        db_latencies = []
+        abandoned = 0
+        last_report = time.time()
+        while True:
+            try:
+                result = results.next(0xFFFF)
+            except StopIteration:
+                break
+            except multiprocessing.TimeoutError:
+                logger.error("Timed out while waiting for node processing results.")
+                break
+            except:
+                logger.error("Worker has failed with exception:")
+                logger.error(traceback.format_exc())
+                continue
+
+            for node_pk, duration, timed_out, samples, db_latency in (result if threads > 1 else [result]):
+                durations.append(duration)
+                db_latencies.append(db_latency)
+                statistics.add(samples)
+                if timed_out:
+                    abandoned += 1
+
+            if time.time() - last_report >= PROGRESS_REPORT_INTERVAL:
+                logger.info("Processed %d of %d nodes." % (len(durations), count))
+                last_report = time.time()
+
+        if abandoned:
+            logger.warning("Abandoned %d nodes that exceeded the deadline." % abandoned)
+
+        return durations, db_latencies
+
+    def report_stage_latencies(self, stage_latencies):
+        """
+        Logs per-node latency percentiles for all node processor stages of a cycle.
+
+        :param stage_latencies: A list of tuples (processor_list, durations)
+        """
+
+        for index, (processor_list, durations) in enumerate(stage_latencies):
+            summary = monitor_stats.summarize(durations)
+            if not summary['count']:
+                continue
+
+            logger.info("Stage %d (%s, ...) processed %d nodes, latency p50=%.2fs p90=%.2fs p99=%.2fs max=%.2fs." % (
+                index,
+                processor_list[0].__name__,
+                summary['count'],
+                summary['p50'],
+                summary['p90'],
+                summary['p99'],
+                summary['max'],
+            ))
 
     def cycle(self):
         """
         Performs a single monitoring cycle.
+
+        :return: A cycle report dictionary with keys 'db_latency' (the 90th percentile of
+          database latency measured by workers or None), 'nodes' (the number of nodes in
+          the largest node processor stage) and 'processors' (per-processor summaries when
+          instrumentation is enabled)
         """
 
-        logger.info("Preparing the worker pool for run '%s'..." % self.name)
-        self.prepare_workers()
+        if self.persistent_workers:
+            self.recycle_workers()
+        else:
+            logger.info("Preparing the worker pool for run '%s'..." % self.name)
+            self.prepare_workers()
+
+        stage_latencies = []
+        db_latencies = []
+        statistics = instrumentation.CycleStatistics(self.name)
+        recorder = instrumentation.Recorder(enabled=self.config['instrumentation'])
+
+        if self.config.get('record', None):
+            # Data obtained from external sources by network processors is recorded, so
+            # that the cycle can be replayed later.
+            replay.start_recording()
 
         try:
             nodes = set()
             context = monitor_processors.ProcessorContext()
+            context.run = self.name
+
+            if self.schedule_window is not None:
+                # Scheduling information for processors that select nodes.
+                context.schedule.start, context.schedule.end = self.schedule_window
+                context.schedule.interval = self.config['interval']
+                context.schedule.backoff_after = self.config['backoff_after']
+                context.schedule.max_interval = self.config['max_interval']
+
+            if self.shard is not None:
+                # Sharding information for processors that must only run once.
+                context.shard.instance = self.shard.instance
+                context.shard.members = self.shard.members
+                context.shard.leader = self.shard.leader
 
             for processor_list in self.config['processors']:
                 lead_proc = processor_list[0]
                 if issubclass(lead_proc, monitor_processors.NetworkProcessor):
+                    if lead_proc.run_once and not sharding.is_leader(context):
+                        logger.info("Skipping network processor %s, it only runs on the leader." % lead_proc.__name__)
+                        continue
+
                     # Network processors run serially and may modify the nodes list
                     logger.info("Running network processor %s..." % lead_proc.__name__)
 
                     try:
                         if lead_proc.requires_transaction:
-                            with transaction.atomic():
+                            with transaction.atomic(), recorder.measure(lead_proc, 'process'):
                                 context, nodes = lead_proc(worker_pool=self.workers).process(context, nodes)
                         else:
-                            context, nodes = lead_proc(worker_pool=self.workers).process(context, nodes)
+                            with recorder.measure(lead_proc, 'process'):
+                                context, nodes = lead_proc(worker_pool=self.workers).process(context, nodes)
                     except KeyboardInterrupt:
                         raise
                     except:
                         logger.error("Processor has failed with exception:")
                         logger.error(traceback.format_exc())
+
+                    if self.shard is not None:
+                        # Only process nodes that belong to this instance.
+                        nodes = self.shard.filter_nodes(nodes)
                 elif issubclass(lead_proc, monitor_processors.NodeProcessor):
                     # Node processors run in parallel on all nodes
                     logger.info("Running the following node processors:")
@@ -146,51 +751,91 @@ class MonitorRun(object):
                     node_local_context = context.for_node
                     del context['for_node']
 
+                    # The network-level context is shipped to the workers only once per stage.
+                    shared_context = SharedContext(context)
+
                     def node_arguments(node):
                         return (
-                            context,
+                            shared_context,
                             node_local_context.get(node.pk, monitor_processors.ProcessorContext()),
                             node.pk,
                             processor_list,
                         )
 
+                    stage_nodes = nodes
                     if self.config['process_only_node'] is not None:
                         logger.info("Limiting only to the following node: %s" % self.config['process_only_node'])
-                        self.workers.map_async(stage_worker, (node_arguments(node) for node in nodes if node.pk == self.config['process_only_node'])).get(0xFFFF)
-                    else:
-                        self.workers.map_async(stage_worker, (node_arguments(node) for node in nodes)).get(0xFFFF)
+                        stage_nodes = [node for node in nodes if node.pk == self.config['process_only_node']]
+
+                    try:
+                        durations, stage_db_latencies = self.dispatch_stage(
+                            (node_arguments(node) for node in stage_nodes),
+                            len(stage_nodes),
+                            statistics,
+                            threads=self.get_stage_threads(processor_list),
+                        )
+                        stage_latencies.append((processor_list, durations))
+                        db_latencies.extend(stage_db_latencies)
+                    finally:
+                        shared_context.release()
 
                     # Restore per-node context for further network processors.
                     context.for_node = node_local_context
                 else:
                     logger.warning("Ignoring unkown type of processor '%s'!" % lead_proc.__name__)
-
-            self.workers.terminate()
-            self.workers = None
         finally:
-            # Ensure that the worker pool gets cleaned up after processing is completed
-            if self.workers:
-                logger.info("Stopping worker processes...")
-                self.workers.terminate()
-
+            # Ensure that the worker pool gets cleaned up after processing is completed, unless
+            # the workers should be kept warm for the next cycle.
+            if not self.persistent_workers:
+                self.stop_workers()
+
+            if self.config.get('record', None):
+                replay.stop_recording(self.config['record'])
+
+        self.report_stage_latencies(stage_latencies)
+        if self.config['instrumentation']:
+            statistics.add(recorder.samples)
+            statistics.export()
         logger.info("All done.")
 
+        return {
+            'db_latency': monitor_stats.percentile(sorted(db_latencies), 90),
+            'nodes': max([len(durations) for processor_list, durations in stage_latencies] or [0]),
+            'processors': statistics.summarize() if self.config['instrumentation'] else [],
+        }
+
     def start(self):
         logger.info("Run '%s' entering monitoring cycle..." % self.name)
         try:
             cycle = 0
             while True:
                 start = time.time()
+                self.update_schedule()
+                self.update_shard()
 
-                # Spawn monitoring cycle in its own process to isolate potential leaks
-                p = multiprocessing.Process(target=cycle_worker, args=(self,))
-                p.start()
-                p.join()
-                del p
+                if self.persistent_workers:
+                    # Run the cycle in this process, reusing the same worker pool for all cycles.
+                    report = self.cycle()
+                else:
+                    # Spawn monitoring cycle in its own process to isolate potential leaks
+                    receiver, sender = multiprocessing.Pipe(False)
+                    p = multiprocessing.Process(target=cycle_worker, args=(self, sender))
+                    p.start()
+                    p.join()
+                    del p
+
+                    report = receiver.recv() if receiver.poll() else None
+                    receiver.close()
+                    sender.close()
 
                 # Log the amount of time a cycle took
                 cycle_duration = time.time() - start
-                logger.info("Run took %d%% of configured period time." % int(100 * cycle_duration / self.config['interval']))
+                logger.info("Run took %d%% of configured period time." % int(100 * cycle_duration / self.period))
+                self.update_concurrency(cycle_duration, report)
+
+                if self.check_memory():
+                    self.restart_requested = True
+                    break
 
                 if self.config['cycles'] is not None:
                     # Only increase cycle counter when limit is set
@@ -201,10 +846,16 @@ class MonitorRun(object):
                         break
 
                 # Sleep for the right amount of time that cycles will be triggered
-                # on every "interval" seconds (but no less then 30 seconds apart)
-                time.sleep(max(30, self.config['interval'] - cycle_duration))
+                # on every period (but no less then 30 seconds apart)
+                time.sleep(max(30, self.period - cycle_duration))
         except KeyboardInterrupt:
             logger.info("Aborted by user.")
+        finally:
+            self.stop_workers()
+
+            # A restarted run process renews the lease of this instance.
+            if self.shard is not None and not self.restart_requested:
+                self.shard.release()
 
 
 class Worker(object):
@@ -212,11 +863,13 @@ class Worker(object):
     Monitoring daemon.
     """
 
-    def start_run(self, run, cycles=None, process_only_node=None):
+    def start_run(self, run, cycles=None, process_only_node=None, shard_instance=None, record=None):
         # Create a run descriptor.
         run_info = run.copy()
         run_info['cycles'] = cycles
         run_info['process_only_node'] = process_only_node
+        run_info['shard_instance'] = shard_instance
+        run_info['record'] = record
         rd = MonitorRun(run_info)
 
         # Fork a process for this run
@@ -224,9 +877,20 @@ class Worker(object):
         p.start()
         return p
 
-    def run(self, cycles=None, process_only_node=None, filter_run=None):
+    def run(self, cycles=None, process_only_node=None, filter_run=None, shard=False, instance=None, record=None,
+            replay_archive=None):
         """
         Runs the monitoring process.
+
+        :param cycles: Optional number of cycles after which runs stop
+        :param process_only_node: Optional identifier of the only node to process
+        :param filter_run: Optional name of the only run to execute
+        :param shard: Should nodes be shared with other instances of the daemon
+        :param instance: Optional identifier of this instance when sharding
+        :param record: Optional filename of an archive that data obtained from external
+          sources is recorded into
+        :param replay_archive: Optional filename of a recorded archive that is replayed
+          instead of obtaining data from external sources
         """
 
         logger.info("Starting the nodewatcher monitoring system.")
@@ -240,8 +904,23 @@ class Worker(object):
             logger.error("Failed to establish a database connection, exiting.")
             return
 
+        shard_instance = None
+        if shard:
+            shard_instance = instance or sharding.get_instance_id()
+            logger.info("Sharding runs with other instances as '%s'." % shard_instance)
+
+        if replay_archive is not None:
+            logger.info("Replaying data recorded in '%s'." % replay_archive)
+            replay.start_replay(replay_archive)
+
+        collectors = {}
+        if replay_archive is None:
+            for collector_path in feeds.get_collectors():
+                logger.info("Starting feed collector '%s'..." % collector_path)
+                collectors[collector_path] = feeds.start_collector(collector_path)
+
         logger.info("Starting monitoring runs...")
-        runs = []
+        runs = {}
         for run in monitor_config.get_runs():
             if filter_run is not None and run['name'] != filter_run:
                 continue
@@ -250,7 +929,33 @@ class Worker(object):
             if run['on_demand']:
                 continue
 
-            runs.append(self.start_run(run, cycles, process_only_node))
+            runs[run['name']] = (run, self.start_run(run, cycles, process_only_node, shard_instance, record))
 
-        for p in runs:
-            p.join()
+        try:
+            while runs:
+                time.sleep(SUPERVISE_INTERVAL)
+
+                for name, (run, p) in runs.items():
+                    if p.is_alive():
+                        continue
+
+                    p.join()
+                    if p.exitcode == RESTART_EXIT_CODE:
+                        # The run has crossed its memory watermark and should continue in a fresh process.
+                        logger.info("Restarting run '%s'..." % name)
+                        runs[name] = (run, self.start_run(run, cycles, process_only_node, shard_instance, record))
+                    else:
+                        del runs[name]
+
+                for collector_path, p in collectors.items():
+                    if not p.is_alive():
+                        logger.warning("Feed collector '%s' has exited, restarting." % collector_path)
+                        collectors[collector_path] = feeds.start_collector(collector_path)
+        except KeyboardInterrupt:
+            # Run processes also receive the interrupt and stop on their own.
+            for run, p in runs.values():
+                p.join()
+        finally:
+            for p in collectors.values():
+                p.terminate()
+                p.join()
@@ -1,3 +1,227 @@
+import collections
+import contextlib
+import copy
+import weakref
+
+# Active registry caches, indexed by (registration point name, root primary key)
+_caches = collections.defaultdict(weakref.WeakSet)
+
+
+def _get_item_values(item):
+    """
+    Returns a dictionary of concrete field values of a registry item.
+
+    :param item: Registry item
+    """
+
+    values = {}
+    for field in item._meta.concrete_fields:
+        value = field.value_from_object(item)
+        if isinstance(value, (dict, list)):
+            value = copy.deepcopy(value)
+        values[field.attname] = value
+
+    return values
+
+
+class RegistryCache(object):
+    """
+    In-memory cache of registry items for a single root instance under a
+    specific registration point.
+    """
+
+    def __init__(self, regpoint, root):
+        """
+        Class constructor.
+
+        :param regpoint: Registration point
+        :param root: Root model instance
+        """
+
+        self.regpoint = regpoint
+        self.root_pk = root.pk
+        self.items = {}
+        self.snapshots = {}
+
+    def get(self, registry_id):
+        """
+        Returns a list of cached items for the given registry identifier or None
+        if the items have not been cached.
+
+        :param registry_id: Registry identifier
+        """
+
+        return self.items.get(registry_id, None)
+
+    def set(self, registry_id, items):
+        """
+        Caches items for the given registry identifier.
+
+        :param registry_id: Registry identifier
+        :param items: A list of registry items
+        """
+
+        self.items[registry_id] = list(items)
+        self.snapshots[registry_id] = [_get_item_values(item) for item in self.items[registry_id]]
+        return self.items[registry_id]
+
+    def invalidate(self, registry_id=None):
+        """
+        Invalidates cached items.
+
+        :param registry_id: Optional registry identifier; when not specified, all
+          items are invalidated
+        """
+
+        if registry_id is None:
+            self.items.clear()
+            self.snapshots.clear()
+        else:
+            self.items.pop(registry_id, None)
+            self.snapshots.pop(registry_id, None)
+
+    def invalidate_modified(self):
+        """
+        Invalidates cached items which have been modified, but not saved. Saved
+        items are already invalidated by `invalidate_cache`, so any remaining
+        changes would otherwise leak to later users of the cache.
+        """
+
+        for registry_id, items in self.items.items():
+            for item, snapshot in zip(items, self.snapshots[registry_id]):
+                if _get_item_values(item) != snapshot:
+                    self.invalidate(registry_id)
+                    break
+
+
+def get_cache(regpoint, root):
+    """
+    Returns the registry cache of a root instance or None when caching is not
+    enabled for it.
+
+    :param regpoint: Registration point
+    :param root: Root model instance
+    """
+
+    return getattr(root, '_registry_caches', {}).get(regpoint.name, None)
+
+
+def enable_cache(regpoint, roots, registry_ids=None, prefetch=True):
+    """
+    Enables caching of registry items for the given root instances. When
+    prefetching is requested, all items are fetched in bulk using one query
+    per item table for all roots. Otherwise, items are cached on first access.
+
+    :param regpoint: Registration point
+    :param roots: An iterable of root model instances
+    :param registry_ids: Optional list of registry identifiers to prefetch
+    :param prefetch: Should the items be prefetched
+    """
+
+    roots = list(roots)
+    for root in roots:
+        if get_cache(regpoint, root) is not None:
+            continue
+
+        cache = RegistryCache(regpoint, root)
+        if not hasattr(root, '_registry_caches'):
+            root._registry_caches = {}
+        root._registry_caches[regpoint.name] = cache
+        _caches[(regpoint.name, root.pk)].add(cache)
+
+    if not prefetch or not roots:
+        return
+
+    roots_by_pk = {root.pk: root for root in roots}
+    if registry_ids is None:
+        registry_ids = regpoint.get_all_registry_ids()
+
+    for registry_id in registry_ids:
+        top_level = regpoint.get_top_level_class(registry_id)
+        root_cache_name = top_level._meta.get_field('root').get_cache_name()
+        items = collections.defaultdict(list)
+        for item in top_level.objects.filter(root__in=roots_by_pk.keys()):
+            root = roots_by_pk[item.root_id]
+            setattr(item, root_cache_name, root)
+            items[item.root_id].append(item)
+
+        for root in roots:
+            get_cache(regpoint, root).set(registry_id, items.get(root.pk, []))
+
+
+def disable_cache(regpoint, roots):
+    """
+    Disables caching of registry items for the given root instances.
+
+    :param regpoint: Registration point
+    :param roots: An iterable of root model instances
+    """
+
+    for root in roots:
+        cache = getattr(root, '_registry_caches', {}).pop(regpoint.name, None)
+        if cache is None:
+            continue
+
+        key = (regpoint.name, root.pk)
+        _caches[key].discard(cache)
+        if not _caches[key]:
+            del _caches[key]
+
+
+@contextlib.contextmanager
+def cached(regpoint, roots, registry_ids=None, prefetch=True):
+    """
+    A context manager that enables caching of registry items for the given
+    root instances for the duration of the block. See `enable_cache`.
+    """
+
+    roots = list(roots)
+    enable_cache(regpoint, roots, registry_ids=registry_ids, prefetch=prefetch)
+    try:
+        yield
+    finally:
+        disable_cache(regpoint, roots)
+
+
+def clear_cache(root):
+    """
+    Invalidates all cached registry items of a root instance, while keeping
+    caching enabled.
+
+    :param root: Root model instance
+    """
+
+    for cache in getattr(root, '_registry_caches', {}).values():
+        cache.invalidate()
+
+
+def clear_modified(root):
+    """
+    Invalidates cached registry items of a root instance which have been
+    modified without being saved, while keeping caching enabled.
+
+    :param root: Root model instance
+    """
+
+    for cache in getattr(root, '_registry_caches', {}).values():
+        cache.invalidate_modified()
+
+
+def invalidate_cache(sender, instance=None, **kwargs):
+    """
+    Signal handler that invalidates cached registry items when a registry item
+    is saved or deleted.
+    """
+
+    if not _caches:
+        return
+
+    options = getattr(instance, '_registry', None)
+    if options is None or options.registration_point is None:
+        return
+
+    for cache in _caches.get((options.registration_point.name, getattr(instance, 'root_id', None)), ()):
+        cache.invalidate(options.registry_id)
 
 
 class RegistryResolver(object):
@@ -31,8 +255,18 @@ class RegistryResolver(object):
         if default is not None and not issubclass(default, top_level):
             raise TypeError("Not a valid registry item class for '{0}'!".format(registry_id))
 
+        cache = get_cache(self._regpoint, self._root)
+        if cache is not None and not queryset:
+            items = cache.get(registry_id)
+            if items is None:
+                items = cache.set(registry_id, cfg.all())
+        else:
+            items = None
+
         if onlyclass is not None:
             cfg = cfg.instance_of(onlyclass)
+            if items is not None:
+                items = [item for item in items if isinstance(item, onlyclass)]
         if queryset:
             return cfg.all()
 
@@ -42,11 +276,20 @@ class RegistryResolver(object):
                 return create(root=self._root, **kwargs)
             elif default is not None:
                 return default(root=self._root, **kwargs)
+            elif items is not None:
+                # Return a queryset which is already populated with the cached items.
+                cfg = cfg.all()
+                cfg._result_cache = items
+                cfg._prefetch_done = True
+                return cfg
             else:
                 return cfg.all()
         else:
             # Only a single configuration option is supported
             try:
+                if items is not None:
+                    return items[0]
+
                 return cfg.all()[0]
             except (IndexError, top_level.DoesNotExist):
                 if create is not None:
@@ -1,7 +1,7 @@
 from django import apps
 from django.db.models import signals as models_signals
 
-from . import permissions
+from . import access, permissions
 
 
 class RegistryConfig(apps.AppConfig):
@@ -11,3 +11,5 @@ class RegistryConfig(apps.AppConfig):
         super(RegistryConfig, self).ready()
 
         models_signals.post_migrate.connect(permissions.create_permissions)
+        models_signals.post_save.connect(access.invalidate_cache, dispatch_uid='registry_invalidate_cache')
+        models_signals.post_delete.connect(access.invalidate_cache, dispatch_uid='registry_invalidate_cache')
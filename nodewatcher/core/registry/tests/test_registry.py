@@ -7,7 +7,7 @@ from django.core import management, exceptions as django_exceptions
 from django.db.models import query
 from django.test import utils
 
-from nodewatcher.core.registry import registration, exceptions, expression
+from nodewatcher.core.registry import access, registration, exceptions, expression
 
 CUSTOM_SETTINGS = {
     'DEBUG': True,
@@ -311,6 +311,50 @@ class RegistryTestCase(django_test.TransactionTestCase):
             self.assertEqual(thing.f1.level, None)
             self.assertEqual(thing.f1.test, None)
 
+    def test_resolver_cache(self):
+        from .registry_tests import models
+
+        thing = models.Thing(foo='hello', bar=1)
+        thing.save()
+
+        simple = thing.first.foo.simple(create=models.SimpleRegistryItem)
+        simple.interesting = 'foo'
+        simple.save()
+
+        for i in xrange(3):
+            item = thing.second.foo.multiple(create=models.FirstSubRegistryItem)
+            item.foo = i
+            item.save()
+
+        with access.cached(registration.point('thing.second'), [thing]):
+            with self.assertNumQueries(0):
+                self.assertEqual(len(thing.second.foo.multiple()), 3)
+                self.assertEqual(thing.second.foo.multiple(onlyclass=models.FirstSubRegistryItem)[0].foo, 0)
+
+            # Saving an item invalidates the cache.
+            item = thing.second.foo.multiple(create=models.SecondSubRegistryItem)
+            item.foo = 3
+            item.save()
+            self.assertEqual(len(thing.second.foo.multiple()), 4)
+
+        with access.cached(registration.point('thing.first'), [thing], prefetch=False):
+            self.assertEqual(thing.first.foo.simple().interesting, 'foo')
+            with self.assertNumQueries(0):
+                self.assertEqual(thing.first.foo.simple().interesting, 'foo')
+
+        self.assertIsNone(access.get_cache(registration.point('thing.first'), thing))
+
+        with access.cached(registration.point('thing.first'), [thing]):
+            # Items modified without being saved are invalidated.
+            thing.first.foo.simple().interesting = 'bar'
+            access.clear_modified(thing)
+            self.assertEqual(thing.first.foo.simple().interesting, 'foo')
+
+            # Unmodified items stay cached.
+            access.clear_modified(thing)
+            with self.assertNumQueries(0):
+                self.assertEqual(thing.first.foo.simple().interesting, 'foo')
+
     def test_filter_expression_parser(self):
         from .registry_tests import models
 
@@ -11,6 +11,8 @@ class Koruza(monitor_processors.NodeProcessor):
     monitor module has previously fetched data.
     """
 
+    thread_safe = True
+
     ACCELEROMETER_COORDINATES = ('x', 'y', 'z')
     ACCELEROMETER_RANGES = 4
 
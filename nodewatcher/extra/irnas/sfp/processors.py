@@ -2,9 +2,12 @@ import math
 
 from django.core import exceptions
 
-from nodewatcher.core.monitor import processors as monitor_processors
+from nodewatcher.core.monitor import persistence, processors as monitor_processors
+from nodewatcher.modules.monitor.datastream import processors as ds_processors
 from nodewatcher.modules.monitor.sources.http import processors as http_processors
 
+from . import models
+
 
 class SFP(monitor_processors.NodeProcessor):
     """
@@ -12,6 +15,8 @@ class SFP(monitor_processors.NodeProcessor):
     monitor module has previously fetched data.
     """
 
+    thread_safe = True
+
     MEASUREMENTS = ('temperature', 'vcc', 'tx_bias', 'tx_power', 'rx_power', 'rx_power_dbm')
     STATISTICS = ('variance', 'minimum', 'maximum')
 
@@ -34,6 +39,7 @@ class SFP(monitor_processors.NodeProcessor):
         return rx_power_dbm
 
     @monitor_processors.depends_on_context("http", http_processors.HTTPTelemetryContext)
+    @http_processors.depends_on_modules('irnas.sfp')
     def process(self, context, node):
         """
         Called for every processed node.
@@ -45,8 +51,11 @@ class SFP(monitor_processors.NodeProcessor):
 
         version = context.http.get_module_version('irnas.sfp')
 
+        uow = persistence.UnitOfWork()
         existing_sfps = {}
         for sfp in node.monitoring.irnas.sfp():
+            uow.track(sfp)
+
             # Clear measurements.
             for measurement in self.MEASUREMENTS:
                 setattr(sfp, measurement, None)
@@ -55,7 +64,6 @@ class SFP(monitor_processors.NodeProcessor):
 
         if version >= 1:
             for serial_number, data in context.http.irnas.sfp.modules.items():
-                qs = node.monitoring.irnas.sfp(queryset=True)
                 statistics = context.http.irnas.sfp.statistics[serial_number]
 
                 defaults = {
@@ -80,22 +88,40 @@ class SFP(monitor_processors.NodeProcessor):
                     for statistic in self.STATISTICS:
                         field = '{}_{}'.format(measurement, statistic)
                         try:
-                            qs.model._meta.get_field(field)
+                            models.SFPMonitor._meta.get_field(field)
                         except exceptions.FieldDoesNotExist:
                             continue
 
                         defaults[field] = get_value(statistics, statistic)
 
-                qs.update_or_create(
-                    root=node,
-                    serial_number=serial_number,
-                    defaults=defaults,
-                )
+                sfp = existing_sfps.pop(serial_number, None)
+                if sfp is None:
+                    sfp = node.monitoring.irnas.sfp(create=models.SFPMonitor)
+                    sfp.serial_number = serial_number
+
+                for field, value in defaults.items():
+                    setattr(sfp, field, value)
 
-                if serial_number in existing_sfps:
-                    del existing_sfps[serial_number]
+                uow.save(sfp)
 
         for sfp in existing_sfps.values():
-            sfp.save()
+            uow.save(sfp)
+
+        uow.flush()
+
+        return context
+
+    def process_unchanged(self, context, node):
+        """
+        Called instead of `process` when SFP telemetry has not changed.
+
+        :param context: Current context
+        :param node: Node that is being processed
+        :return: A (possibly) modified context
+        """
+
+        # Stored measurements are still current, so they only need to be included
+        # into datastream processing.
+        ds_processors.track_models(context, node.monitoring.irnas.sfp())
 
         return context
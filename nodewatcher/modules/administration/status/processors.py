@@ -1,9 +1,10 @@
+import calendar
 import datetime
 
 from django.utils import timezone
 
 from nodewatcher.core import models as core_models
-from nodewatcher.core.monitor import processors as monitor_processors
+from nodewatcher.core.monitor import processors as monitor_processors, scheduling
 
 from . import models, events
 
@@ -14,6 +15,8 @@ class NodeStatus(monitor_processors.NodeProcessor):
     other processors (OLSR, HTTP telemetry, ...).
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -66,6 +69,8 @@ class PushNodeStatus(monitor_processors.NetworkProcessor):
     A processor which updates status for nodes that push data.
     """
 
+    run_once = True
+
     def process(self, context, nodes):
         """
         Performs network-wide processing and selects the nodes that will be processed
@@ -92,3 +97,67 @@ class PushNodeStatus(monitor_processors.NetworkProcessor):
         models.StatusMonitor.objects.filter(root__in=down_nodes).update(network='down')
 
         return context, nodes
+
+
+class ScheduleNodes(monitor_processors.NetworkProcessor):
+    """
+    A processor that only keeps nodes which are due to be processed in the current
+    cycle of a run with the 'spread' option, so that nodes are spread evenly across
+    the run's interval. Nodes that have been down for more than 'backoff_after'
+    seconds are processed less often, their polling interval is doubled each time
+    their downtime doubles, up to 'max_interval' seconds. Nodes that have been found to be available
+    by preceding processors are always polled at the run's interval.
+    """
+
+    def get_interval(self, context, node, schedule, now):
+        """
+        Returns the polling interval of a node.
+
+        :param context: Current context
+        :param node: Node instance with status annotations
+        :param schedule: Schedule context
+        :param now: Current UNIX timestamp
+        """
+
+        node_context = context.for_node.get(node.pk, None)
+        if node.network_status != 'down' or (node_context is not None and node_context.get('node_available', None)):
+            return schedule.interval
+
+        if node.last_seen is not None:
+            down_for = now - calendar.timegm(node.last_seen.utctimetuple())
+        else:
+            down_for = None
+
+        return scheduling.get_backoff_interval(
+            schedule.interval,
+            down_for,
+            schedule.backoff_after,
+            schedule.max_interval,
+        )
+
+    def process(self, context, nodes):
+        """
+        Performs network-wide processing and selects the nodes that will be processed
+        in any following processors. Context is passed between network processors.
+
+        :param context: Current context
+        :param nodes: A set of nodes that are to be processed
+        :return: A (possibly) modified context and a (possibly) modified set of nodes
+        """
+
+        schedule = context.get('schedule', None)
+        if not schedule or not nodes:
+            return context, nodes
+
+        due_nodes = set()
+        for node in core_models.Node.objects.regpoint('monitoring').registry_fields(
+            last_seen='core.general__last_seen',
+            network_status='core.status__network',
+        ).filter(pk__in=[node.pk for node in nodes]):
+            interval = self.get_interval(context, node, schedule, schedule.end)
+            if scheduling.is_due(node.pk, interval, schedule.start, schedule.end):
+                due_nodes.add(node.pk)
+
+        self.logger.info("Scheduled %d out of %d nodes." % (len(due_nodes), len(nodes)))
+
+        return context, set([node for node in nodes if node.pk in due_nodes])
@@ -41,40 +41,34 @@
             }
         });
         
-        //APIv1 request for all the currently active nodes with the location parameter set
+        //Request for all the currently active nodes with the location parameter set
         $.ajax({
-            'url': "/api/v1/stream/?format=json&tags__module=topology&limit=1",
+            'url': $('#map-topology').data('url'),
         }).done(function(data) {
-            var streamId = data.objects[0].id;
-            var latestTimestamp = moment(data.objects[0].latest_datapoint).unix();
-            $.ajax({
-                'url': "/api/v1/stream/" + streamId + "/?format=json&limit=1&start=" + latestTimestamp,
-            }).done(function(data) {
-                var graph = data.datapoints[0].v;
-                var nodes = [];
-                var edges = [];
-                var nodeIndex = {};
-                
-                //storing each node data
-                $.each(graph.v, function(index, vertex) {
-                    nodes.push({
-                        'index': index,     //index of the node
-                        'data': vertex,     //data which stores the name, id, type and coordinates
-                    });
-                    nodeIndex[vertex.i] = index;
+            var graph = data.graph;
+            var nodes = [];
+            var edges = [];
+            var nodeIndex = {};
+            
+            //storing each node data
+            $.each(graph.v, function(index, vertex) {
+                nodes.push({
+                    'index': index,     //index of the node
+                    'data': vertex,     //data which stores the name, id, type and coordinates
                 });
-                
-                //storing the links between the nodes
-                $.each(graph.e, function(index, edge) {
-                    edges.push({
-                        'source': nodeIndex[edge.f],
-                        'target': nodeIndex[edge.t],
-                        'data': edge,
-                    });
+                nodeIndex[vertex.i] = index;
+            });
+            
+            //storing the links between the nodes
+            $.each(graph.e, function(index, edge) {
+                edges.push({
+                    'source': nodeIndex[edge.f],
+                    'target': nodeIndex[edge.t],
+                    'data': edge,
                 });
-
-                $.nodewatcher.map.extend(map, nodes, edges);
             });
+
+            $.nodewatcher.map.extend(map, nodes, edges);
         });
     });
 })(jQuery);
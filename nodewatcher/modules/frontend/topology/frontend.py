@@ -1,3 +1,4 @@
+from django.conf import urls
 from django.core import urlresolvers
 
 from nodewatcher.core.frontend import components
@@ -14,6 +15,12 @@ class TopologyComponent(components.FrontendComponent):
             'name': 'topology',
         }
 
+    @classmethod
+    def get_urls(cls):
+        return super(TopologyComponent, cls).get_urls() + [
+            urls.url(r'^topology/graph/$', views.TopologyGraph.as_view(), name='graph'),
+        ]
+
 components.pool.register(TopologyComponent)
 
 
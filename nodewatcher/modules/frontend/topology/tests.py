@@ -0,0 +1,52 @@
+import datetime
+import json
+import unittest
+
+from django import http
+from django.test import client
+
+from nodewatcher.modules.monitor.topology import exceptions as topology_exceptions
+
+from . import views
+
+
+class TopologyGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.factory = client.RequestFactory()
+        self.requested = []
+        self._get_topology = views.topology_history.get_topology
+
+        def get_topology(at=None):
+            self.requested.append(at)
+            if at is not None and at < datetime.datetime(2016, 1, 1):
+                raise topology_exceptions.TopologyNotAvailable
+
+            return {'v': [{'i': 'a'}], 'e': []}, datetime.datetime(2016, 1, 1)
+
+        views.topology_history.get_topology = get_topology
+
+    def tearDown(self):
+        views.topology_history.get_topology = self._get_topology
+
+    def get(self, **params):
+        return views.TopologyGraph.as_view()(self.factory.get('/topology/graph/', params))
+
+    def test_latest(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {
+            'graph': {'v': [{'i': 'a'}], 'e': []},
+            'timestamp': '2016-01-01T00:00:00',
+        })
+        self.assertEqual(self.requested, [None])
+
+    def test_at(self):
+        self.assertEqual(self.get(at='1451610000').status_code, 200)
+        self.assertEqual(self.requested, [datetime.datetime(2016, 1, 1, 1)])
+
+    def test_invalid(self):
+        self.assertEqual(self.get(at='yesterday').status_code, 400)
+        self.assertEqual(self.requested, [])
+
+    def test_not_available(self):
+        self.assertRaises(http.Http404, self.get, at='1000')
@@ -1,5 +1,32 @@
+import datetime
+
+from django import http
 from django.views import generic
 
+from nodewatcher.modules.monitor.topology import exceptions as topology_exceptions, history as topology_history
+
 
 class Topology(generic.TemplateView):
     template_name = 'topology/topology.html'
+
+
+class TopologyGraph(generic.View):
+    def get(self, request):
+        """
+        Returns the network topology graph at the time given by the optional
+        `at` UNIX timestamp parameter.
+        """
+
+        at = None
+        if request.GET.get('at'):
+            try:
+                at = datetime.datetime.utcfromtimestamp(float(request.GET['at']))
+            except ValueError:
+                return http.HttpResponseBadRequest("Invalid timestamp.")
+
+        try:
+            graph, timestamp = topology_history.get_topology(at)
+        except topology_exceptions.TopologyNotAvailable:
+            raise http.Http404
+
+        return http.JsonResponse({'graph': graph, 'timestamp': timestamp})
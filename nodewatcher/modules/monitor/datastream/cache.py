@@ -0,0 +1,187 @@
+import hashlib
+
+from django.conf import settings
+from django.core import cache as django_cache
+
+# Prefix used for keys stored in the shared cache.
+KEY_PREFIX = 'nodewatcher.datastream.stream'
+
+
+def freeze(value):
+    """
+    Converts a (possibly nested) tag structure into a hashable value.
+
+    :param value: Value to convert
+    :return: Hashable value
+    """
+
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.iteritems()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    elif callable(value):
+        # Identities of callables differ between processes, so use their names.
+        return '%s.%s' % (value.__module__, getattr(value, '__name__', value.__class__.__name__))
+
+    return value
+
+
+class StreamCache(object):
+    """
+    A cache of stream identifiers, so that fields do not need to ensure their
+    streams via the datastream backend on every monitoring run.
+
+    Entries are keyed by descriptor type, field name and the stream query tags.
+    Each entry also stores a fingerprint of all the inputs that are used to build
+    stream tags, so any change of tags invalidates the entry. When a shared cache
+    is configured via the `DATASTREAM_STREAM_CACHE` setting, entries are also shared
+    between processes.
+    """
+
+    def __init__(self):
+        """
+        Class constructor.
+        """
+
+        self._entries = {}
+
+    def get_shared_cache(self):
+        """
+        Returns the configured shared cache or None if no shared cache is used.
+        """
+
+        alias = getattr(settings, 'DATASTREAM_STREAM_CACHE', None)
+        if not alias:
+            return None
+
+        return django_cache.caches[alias]
+
+    def get_key(self, descriptor, field):
+        """
+        Returns the cache key for a given field.
+
+        :param descriptor: Stream descriptor
+        :param field: Field descriptor
+        :return: Cache key
+        """
+
+        query_tags = descriptor.get_stream_query_tags()
+        query_tags.update(field.prepare_query_tags())
+        return (descriptor.__class__.__module__, descriptor.__class__.__name__, field.name, freeze(query_tags))
+
+    def get_fingerprint(self, descriptor, field):
+        """
+        Returns a fingerprint of inputs used to build tags of the field's stream.
+
+        :param descriptor: Stream descriptor
+        :param field: Field descriptor
+        :return: Fingerprint
+        """
+
+        return hashlib.sha1(repr(freeze(field.get_cache_fingerprint(descriptor)))).hexdigest()
+
+    def get_shared_key(self, key):
+        """
+        Returns the key used to store an entry in the shared cache.
+
+        :param key: Cache key
+        """
+
+        return '%s.%s' % (KEY_PREFIX, hashlib.sha1(repr(key)).hexdigest())
+
+    def get(self, key, fingerprint):
+        """
+        Returns a cached stream identifier.
+
+        :param key: Cache key
+        :param fingerprint: Tags fingerprint
+        :return: Stream identifier or None if not cached or tags have changed
+        """
+
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            shared_cache = self.get_shared_cache()
+            if shared_cache is None:
+                return None
+
+            entry = shared_cache.get(self.get_shared_key(key))
+            if entry is None:
+                return None
+
+            self._entries[key] = entry
+
+        if entry[0] != fingerprint:
+            return None
+
+        return entry[1]
+
+    def set(self, key, fingerprint, stream_id):
+        """
+        Stores a stream identifier into the cache.
+
+        :param key: Cache key
+        :param fingerprint: Tags fingerprint
+        :param stream_id: Stream identifier
+        """
+
+        entry = (fingerprint, stream_id)
+        if self._entries.get(key) == entry:
+            return
+
+        self._entries[key] = entry
+        shared_cache = self.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(self.get_shared_key(key), entry, None)
+
+    def warm(self, descriptors):
+        """
+        Loads entries for all fields of the given descriptors from the shared
+        cache using a single request.
+
+        :param descriptors: A list of stream descriptors
+        """
+
+        shared_cache = self.get_shared_cache()
+        if shared_cache is None:
+            return
+
+        keys = {}
+        for descriptor in descriptors:
+            for field in descriptor.get_fields():
+                if not field.cache_stream:
+                    continue
+
+                key = self.get_key(descriptor, field)
+                if key not in self._entries:
+                    keys[self.get_shared_key(key)] = key
+
+        if not keys:
+            return
+
+        for shared_key, entry in shared_cache.get_many(keys.keys()).iteritems():
+            self._entries[keys[shared_key]] = entry
+
+    def invalidate(self, descriptor, field):
+        """
+        Removes the entry for a given field.
+
+        :param descriptor: Stream descriptor
+        :param field: Field descriptor
+        """
+
+        key = self.get_key(descriptor, field)
+        self._entries.pop(key, None)
+        shared_cache = self.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self.get_shared_key(key))
+
+    def clear(self):
+        """
+        Clears all locally cached entries.
+        """
+
+        self._entries.clear()
+
+
+stream_cache = StreamCache()
@@ -6,6 +6,7 @@ from django.core import exceptions
 from datastream import exceptions as ds_exceptions
 
 from nodewatcher.utils import datastructures
+from .cache import stream_cache
 from .pool import pool
 
 
@@ -63,6 +64,9 @@ class Field(object):
     API.
     """
 
+    # Whether stream identifiers of this field may be cached.
+    cache_stream = True
+
     def __init__(self, attribute=None, tags=None, value_downsamplers=None, value_type='numeric'):
         """
         Class constructor.
@@ -186,6 +190,49 @@ class Field(object):
 
         return stream.ensure_stream(query_tags, tags, downsamplers, highest_granularity, value_type=self.value_type)
 
+    def get_cache_fingerprint(self, descriptor):
+        """
+        Returns all inputs which are used to build the stream, so that cached
+        stream identifiers are invalidated when any of them changes.
+
+        :param descriptor: Destination stream descriptor
+        """
+
+        # Tags are fingerprinted after references are resolved, as references may
+        # depend on other models (for example the name of a link's peer).
+        query_tags, tags = self.process_tags(descriptor)
+
+        return (
+            query_tags,
+            tags,
+            self.get_downsamplers(),
+            self.value_type,
+            str(descriptor.get_stream_highest_granularity()),
+        )
+
+    def get_stream_id(self, descriptor, stream):
+        """
+        Returns the stream identifier, ensuring the stream only when it is not
+        already cached.
+
+        :param descriptor: Destination stream descriptor
+        :param stream: Stream API instance
+        :return: Stream identifier
+        """
+
+        if not self.cache_stream:
+            return self.ensure_stream(descriptor, stream)
+
+        key = stream_cache.get_key(descriptor, self)
+        fingerprint = stream_cache.get_fingerprint(descriptor, self)
+        stream_id = stream_cache.get(key, fingerprint)
+        if stream_id is None:
+            stream_id = self.ensure_stream(descriptor, stream)
+            if stream_id is not None:
+                stream_cache.set(key, fingerprint, stream_id)
+
+        return stream_id
+
     def to_stream(self, descriptor, stream, timestamp=None):
         """
         Creates streams and inserts datapoints to the stream via the datastream API.
@@ -201,7 +248,7 @@ class Field(object):
         else:
             value = getattr(descriptor.get_model(), attribute)
 
-        stream_id = self.ensure_stream(descriptor, stream)
+        stream_id = self.get_stream_id(descriptor, stream)
         if value is None:
             return
 
@@ -400,7 +447,7 @@ class DerivedField(Field):
                 raise exceptions.ImproperlyConfigured("Datastream field '%s' not found!" % field_ref['field'])
 
             streams.append(
-                {'name': field_ref['name'], 'stream': field.ensure_stream(mdl_descriptor, stream)}
+                {'name': field_ref['name'], 'stream': field.get_stream_id(mdl_descriptor, stream)}
             )
 
         query_tags, tags = self.process_tags(descriptor)
@@ -418,6 +465,16 @@ class DerivedField(Field):
             value_type=self.value_type,
         )
 
+    def get_cache_fingerprint(self, descriptor):
+        """
+        Returns all inputs which are used to build the stream, so that cached
+        stream identifiers are invalidated when any of them changes.
+
+        :param descriptor: Destination stream descriptor
+        """
+
+        return super(DerivedField, self).get_cache_fingerprint(descriptor) + (self.streams, self.op, self.op_arguments)
+
     def to_stream(self, descriptor, stream, timestamp=None):
         """
         Creates streams and inserts datapoints to the stream via the datastream API.
@@ -427,7 +484,7 @@ class DerivedField(Field):
         :param timestamp: Optional datapoint timestamp
         """
 
-        self.ensure_stream(descriptor, stream)
+        self.get_stream_id(descriptor, stream)
 
 
 class ResetField(DerivedField):
@@ -479,6 +536,9 @@ class DynamicSumField(Field):
     recreated whenever the set of source streams changes.
     """
 
+    # The set of source fields changes dynamically, so the stream must always be ensured.
+    cache_stream = False
+
     def __init__(self, **kwargs):
         """
         Class constructor.
@@ -516,7 +576,7 @@ class DynamicSumField(Field):
         streams = []
         for src_field, src_descriptor in self._fields:
             streams.append(
-                {'stream': src_field.ensure_stream(src_descriptor, stream)}
+                {'stream': src_field.get_stream_id(src_descriptor, stream)}
             )
 
         if not streams:
@@ -0,0 +1,138 @@
+from django.utils.translation import gettext_noop as _
+
+from django_datastream import datastream
+
+from nodewatcher.core.monitor import processors as monitor_processors
+
+from . import base, fields, processors as ds_processors
+from .pool import pool
+
+
+class InstrumentationStreamsBase(base.StreamsBase):
+    def get_stream_query_tags(self):
+        return {'module': 'monitor.instrumentation', 'run': self._model.run}
+
+    def get_stream_tags(self):
+        return self.get_stream_query_tags()
+
+    def get_stream_highest_granularity(self):
+        return datastream.Granularity.Minutes
+
+
+def line_tags(title, description):
+    return {
+        'title': title,
+        'description': description,
+        'visualization': {
+            'type': 'line',
+            'initial_set': False,
+            'time_downsamplers': ['mean'],
+            'value_downsamplers': ['min', 'mean', 'max'],
+        },
+    }
+
+
+class ProcessorStatisticsStreams(InstrumentationStreamsBase):
+    calls = fields.IntegerField(tags=line_tags(_("Calls"), _("Number of processor invocations.")))
+    datapoints = fields.IntegerField(tags=line_tags(_("Datapoints"), _("Number of emitted datapoints.")))
+    duration_p50 = fields.FloatField(tags=line_tags(_("Duration (median)"), _("Median processor duration in seconds.")))
+    duration_p95 = fields.FloatField(tags=line_tags(_("Duration (p95)"), _("95th percentile of processor duration in seconds.")))
+    duration_max = fields.FloatField(tags=line_tags(_("Duration (max)"), _("Maximum processor duration in seconds.")))
+    queries_p95 = fields.FloatField(tags=line_tags(_("Queries (p95)"), _("95th percentile of database queries per invocation.")))
+    query_time_p95 = fields.FloatField(tags=line_tags(_("Query time (p95)"), _("95th percentile of database query time in seconds.")))
+
+    def get_stream_query_tags(self):
+        tags = super(ProcessorStatisticsStreams, self).get_stream_query_tags()
+        tags.update({'processor': self._model.processor, 'phase': self._model.phase})
+        return tags
+
+
+class ProcessorStatistics(object):
+    """
+    Statistics of a processor in a single monitoring cycle.
+    """
+
+    def __init__(self, run, summary):
+        self.run = run
+        self.processor = summary['processor']
+        self.phase = summary['phase']
+        self.calls = summary['count']
+        self.datapoints = summary['datapoints']
+        self.duration_p50 = summary['duration']['p50']
+        self.duration_p95 = summary['duration']['p95']
+        self.duration_max = summary['duration']['max']
+        self.queries_p95 = summary['queries']['p95']
+        self.query_time_p95 = summary['query_time']['p95']
+
+pool.register(ProcessorStatistics, ProcessorStatisticsStreams)
+
+
+class RunGaugesStreams(InstrumentationStreamsBase):
+    workers = fields.IntegerField(tags=line_tags(_("Workers"), _("Number of worker processes.")))
+    utilization = fields.FloatField(tags=line_tags(_("Utilization"), _("Duration of the cycle relative to the run interval.")))
+    db_latency = fields.FloatField(tags=line_tags(_("Database latency"), _("Database latency observed by workers in seconds.")))
+    datastream_written = fields.IntegerField(tags=line_tags(_("Written datapoints"), _("Number of datapoints written by the write-behind buffer.")))
+    datastream_batches = fields.IntegerField(tags=line_tags(_("Write batches"), _("Number of batches written by the write-behind buffer.")))
+    datastream_dropped = fields.IntegerField(tags=line_tags(_("Dropped datapoints"), _("Number of datapoints dropped by the write-behind buffer.")))
+    datastream_peak_pending = fields.IntegerField(tags=line_tags(_("Peak buffered datapoints"), _("Maximum number of datapoints in the write-behind buffer.")))
+
+
+class RunGauges(object):
+    """
+    Run-level gauges of a single monitoring cycle. Gauges without a stream
+    field are not stored.
+    """
+
+    workers = None
+    utilization = None
+    db_latency = None
+    datastream_written = None
+    datastream_batches = None
+    datastream_dropped = None
+    datastream_peak_pending = None
+
+    def __init__(self, run, gauges):
+        self.run = run
+        for name, value in gauges.iteritems():
+            if hasattr(self, name):
+                setattr(self, name, value)
+
+pool.register(RunGauges, RunGaugesStreams)
+
+
+class DatastreamSink(object):
+    """
+    Stores per-processor statistics and run-level gauges into the datastream,
+    so that they can be visualized together with the monitoring data.
+    """
+
+    def emit(self, run, summaries):
+        """
+        Exports statistics of a monitoring cycle.
+
+        :param run: Monitoring run name
+        :param summaries: A list of per-processor summaries
+        """
+
+        self.insert([ProcessorStatistics(run, summary) for summary in summaries])
+
+    def emit_gauges(self, run, gauges):
+        """
+        Exports run-level gauges.
+
+        :param run: Monitoring run name
+        :param gauges: A dictionary mapping gauge names to values
+        """
+
+        self.insert([RunGauges(run, gauges)])
+
+    def insert(self, items):
+        """
+        Inserts datapoints of the given items in bulk.
+
+        :param items: A list of items with registered stream descriptors
+        """
+
+        context = monitor_processors.ProcessorContext()
+        context.datastream.instrumentation = items
+        ds_processors.DatastreamBase().process_context(context)
@@ -1,16 +1,24 @@
 import datetime
+import threading
 import traceback
 
+from django.conf import settings
 from django.db.models import signals as model_signals
 
 from django_datastream import datastream
 
-from nodewatcher.core.monitor import processors as monitor_processors
+from nodewatcher.core.monitor import instrumentation, processors as monitor_processors
 from nodewatcher.core.registry import registration
 
-from . import exceptions
+from . import exceptions, writer as ds_writer
+from .cache import stream_cache
 from .pool import pool
 
+# Write-behind buffer that is active for the current monitoring run
+_writer = None
+# Registry models tracked for the node that is being processed in each thread
+_tracking = threading.local()
+
 
 class TrackRegistryModels(monitor_processors.NodeProcessor):
     """
@@ -18,6 +26,8 @@ class TrackRegistryModels(monitor_processors.NodeProcessor):
     processor can know where to generate the streams from.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -27,33 +37,52 @@ class TrackRegistryModels(monitor_processors.NodeProcessor):
         :return: A (possibly) modified context
         """
 
-        # Start tracking the models
+        # Start tracking the models. Models are tracked per thread, so that nodes may be
+        # processed concurrently.
         context.datastream.tracked_models = {}
+        _tracking.models = context.datastream.tracked_models
 
-        def registry_track_save(sender, instance=None, **kwargs):
-            if not isinstance(instance, registration.bases.NodeMonitoringRegistryItem):
-                return
+        model_signals.post_save.connect(_registry_track_save, dispatch_uid='ds_track_models')
+        model_signals.post_delete.connect(_registry_track_delete, dispatch_uid='ds_track_models')
 
-            context.datastream.tracked_models[(sender, instance.pk)] = instance
+        return context
 
-        def registry_track_delete(sender, instance=None, **kwargs):
-            if not isinstance(instance, registration.bases.NodeMonitoringRegistryItem):
-                return
+    def cleanup(self, context, node):
 
-            try:
-                del context.datastream.tracked_models[(sender, instance.pk)]
-            except KeyError:
-                pass
+        _tracking.models = None
 
-        model_signals.post_save.connect(registry_track_save, weak=False, dispatch_uid='ds_track_models')
-        model_signals.post_delete.connect(registry_track_delete, weak=False, dispatch_uid='ds_track_models')
 
-        return context
+def _registry_track_save(sender, instance=None, **kwargs):
+    tracked_models = getattr(_tracking, 'models', None)
+    if tracked_models is None or not isinstance(instance, registration.bases.NodeMonitoringRegistryItem):
+        return
 
-    def cleanup(self, context, node):
+    tracked_models[(sender, instance.pk)] = instance
+
+
+def _registry_track_delete(sender, instance=None, **kwargs):
+    tracked_models = getattr(_tracking, 'models', None)
+    if tracked_models is None or not isinstance(instance, registration.bases.NodeMonitoringRegistryItem):
+        return
 
-        model_signals.post_save.disconnect(dispatch_uid='ds_track_models')
-        model_signals.post_delete.disconnect(dispatch_uid='ds_track_models')
+    tracked_models.pop((sender, instance.pk), None)
+
+
+def track_models(context, instances):
+    """
+    Includes registry items that have not been saved by processors into datastream
+    processing, so that their streams still receive datapoints.
+
+    :param context: Current context
+    :param instances: An iterable of registry items
+    """
+
+    tracked_models = context.datastream.get('tracked_models', None)
+    if tracked_models is None:
+        return
+
+    for instance in instances:
+        tracked_models[(instance.__class__, instance.pk)] = instance
 
 
 class DatastreamBase(object):
@@ -73,6 +102,7 @@ class DatastreamBase(object):
             now = datetime.datetime.utcnow()
 
         processed_items = set()
+        descriptors = []
         datapoints = []
 
         class DatastreamBulkProxy(object):
@@ -103,14 +133,28 @@ class DatastreamBase(object):
                 processed_items.add(item)
 
                 try:
-                    descriptor = pool.get_descriptor(item)
-                    descriptor.insert_to_stream(datastream_bulk_proxy, timestamp=now)
-                    pool.clear_descriptor(item)
+                    descriptors.append((item, pool.get_descriptor(item)))
                 except exceptions.StreamDescriptorNotRegistered:
                     continue
 
-        # Insert datapoints in bulk.
-        datastream.append_multiple(datapoints)
+        # Fetch cached stream identifiers for all descriptors at once.
+        stream_cache.warm([descriptor for item, descriptor in descriptors])
+
+        for item, descriptor in descriptors:
+            # Items may choose their own timestamp when it must be known in advance.
+            timestamp = getattr(item, 'datastream_timestamp', None) or now
+            descriptor.insert_to_stream(datastream_bulk_proxy, timestamp=timestamp)
+            pool.clear_descriptor(item)
+
+        instrumentation.record_datapoints(len(datapoints))
+
+        # Insert datapoints in bulk, either via the write-behind buffer when one
+        # is running or directly.
+        writer_address = context.get('datastream_writer')
+        if writer_address:
+            ds_writer.send(writer_address, datapoints)
+        else:
+            datastream.append_multiple(datapoints)
 
 
 class NodeDatastream(DatastreamBase, monitor_processors.NodeProcessor):
@@ -118,6 +162,8 @@ class NodeDatastream(DatastreamBase, monitor_processors.NodeProcessor):
     A processor that stores all per-node monitoring data into the datastream.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -136,6 +182,8 @@ class NetworkDatastream(DatastreamBase, monitor_processors.NetworkProcessor):
     A processor that stores all network-wide monitoring data into the datastream.
     """
 
+    run_once = True
+
     def process(self, context, nodes):
         """
         Performs network-wide processing and selects the nodes that will be processed
@@ -150,12 +198,94 @@ class NetworkDatastream(DatastreamBase, monitor_processors.NetworkProcessor):
         return context, nodes
 
 
+class StartDatastreamWriter(monitor_processors.NetworkProcessor):
+    """
+    Starts a write-behind buffer, so that datapoints of all nodes processed by
+    any following processors are inserted into the datastream in large batches.
+    """
+
+    requires_transaction = False
+
+    def process(self, context, nodes):
+        """
+        Performs network-wide processing and selects the nodes that will be processed
+        in any following processors. Context is passed between network processors.
+
+        :param context: Current context
+        :param nodes: A set of nodes that are to be processed
+        :return: A (possibly) modified context and a (possibly) modified set of nodes
+        """
+
+        global _writer
+
+        if _writer is not None:
+            self.logger.warning("Datastream writer is already running, stopping it first.")
+            _writer.stop()
+
+        _writer = ds_writer.DatastreamWriter(
+            batch_size=getattr(settings, 'DATASTREAM_WRITER_BATCH_SIZE', 5000),
+            flush_interval=getattr(settings, 'DATASTREAM_WRITER_FLUSH_INTERVAL', 5),
+            max_pending=getattr(settings, 'DATASTREAM_WRITER_MAX_PENDING', 500000),
+        )
+        try:
+            _writer.start()
+        except ds_writer.WriterError:
+            self.logger.error("Failed to start the datastream writer, datapoints will be written directly.")
+            _writer = None
+            return context, nodes
+
+        context.datastream_writer = _writer.address
+
+        return context, nodes
+
+
+class StopDatastreamWriter(monitor_processors.NetworkProcessor):
+    """
+    Stops the write-behind buffer after inserting all buffered datapoints.
+    """
+
+    requires_transaction = False
+
+    def process(self, context, nodes):
+        """
+        Performs network-wide processing and selects the nodes that will be processed
+        in any following processors. Context is passed between network processors.
+
+        :param context: Current context
+        :param nodes: A set of nodes that are to be processed
+        :return: A (possibly) modified context and a (possibly) modified set of nodes
+        """
+
+        global _writer
+
+        context.datastream_writer = None
+        if _writer is None:
+            return context, nodes
+
+        self.logger.info("Draining datastream write buffer...")
+        try:
+            _writer.stop()
+        finally:
+            writer = _writer
+            _writer = None
+
+        instrumentation.export_gauges(context.run, {
+            'datastream_written': writer.written,
+            'datastream_batches': writer.batches,
+            'datastream_dropped': writer.dropped,
+            'datastream_peak_pending': writer.peak_pending,
+        })
+
+        return context, nodes
+
+
 class MaintenanceBackprocess(monitor_processors.NetworkProcessor):
     """
     Datastream backprocessing maintenance processor.
     """
 
     requires_transaction = False
+    run_once = True
 
     def process(self, context, nodes):
         """
@@ -187,6 +317,7 @@ class MaintenanceDownsample(monitor_processors.NetworkProcessor):
     """
 
     requires_transaction = False
+    run_once = True
 
     def process(self, context, nodes):
         """
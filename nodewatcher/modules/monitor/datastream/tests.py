@@ -1,9 +1,13 @@
+import multiprocessing
+import unittest
+
 from django import test as django_test
 from django.conf import settings
 
 import django_datastream
 
-from . import base, exceptions, fields
+from . import base, exceptions, fields, writer
+from .cache import stream_cache
 from .pool import pool
 
 
@@ -17,6 +21,12 @@ class DummyModel(object):
     topology = None
 
 
+class PeerModel(object):
+    uuid = None
+    peer_name = None
+    rtt = None
+
+
 class InvalidBaseStreams(object):
     pass
 
@@ -53,6 +63,12 @@ class TestStreams(TestBaseStreams):
     topology = fields.GraphField()
 
 
+class PeerStreams(TestBaseStreams):
+    rtt = fields.IntegerField(tags={
+        'title': fields.TagReference(transform=lambda m: "RTT to %s" % m.peer_name),
+    })
+
+
 class RegistryTestCase(django_test.TestCase):
     def setUp(self):
         DATASTREAM_BACKEND_SETTINGS = settings.DATASTREAM_BACKEND_SETTINGS.copy()
@@ -124,3 +140,148 @@ class RegistryTestCase(django_test.TestCase):
         pool.unregister(DummyModel)
         with self.assertRaises(exceptions.StreamDescriptorNotRegistered):
             pool.unregister(DummyModel)
+
+    def test_stream_cache(self):
+        class CountingStream(object):
+            def __init__(self):
+                self.ensured = 0
+
+            def ensure_stream(self, *args, **kwargs):
+                self.ensured += 1
+                return self.ensured
+
+            def append(self, stream_id, value, timestamp=None):
+                pass
+
+        pool.register(DummyModel, TestStreams)
+        stream_cache.clear()
+        stream = CountingStream()
+        item = DummyModel()
+        item.uuid = 2
+        item.uptime = 1
+        item.topology = {'v': [], 'e': []}
+
+        # Uptime, reboots with its source stream and topology are ensured only once.
+        TestStreams(item).insert_to_stream(stream)
+        self.assertEqual(stream.ensured, 3)
+        TestStreams(item).insert_to_stream(stream)
+        self.assertEqual(stream.ensured, 3)
+
+        # Changing tags must invalidate the cached stream.
+        descriptor = TestStreams(item)
+        descriptor.uptime.set_tags(visualization={'initial_set': True})
+        descriptor.uptime.to_stream(descriptor, stream)
+        self.assertEqual(stream.ensured, 4)
+        descriptor.uptime.to_stream(descriptor, stream)
+        self.assertEqual(stream.ensured, 4)
+
+        stream_cache.clear()
+        pool.clear_descriptor(item)
+        pool.unregister(DummyModel)
+
+    def test_stream_cache_tag_references(self):
+        class CountingStream(object):
+            def __init__(self):
+                self.tags = []
+
+            def ensure_stream(self, query_tags, tags, *args, **kwargs):
+                self.tags.append(tags)
+                return len(self.tags)
+
+            def append(self, stream_id, value, timestamp=None):
+                pass
+
+        pool.register(PeerModel, PeerStreams)
+        stream_cache.clear()
+        stream = CountingStream()
+        item = PeerModel()
+        item.uuid = 3
+        item.peer_name = 'peer-a'
+        item.rtt = 1
+
+        PeerStreams(item).insert_to_stream(stream)
+        PeerStreams(item).insert_to_stream(stream)
+        self.assertEqual(len(stream.tags), 1)
+
+        # Renaming the peer changes the resolved title, so the stream must be ensured again.
+        item.peer_name = 'peer-b'
+        PeerStreams(item).insert_to_stream(stream)
+        self.assertEqual(len(stream.tags), 2)
+        self.assertEqual(stream.tags[-1]['title'], "RTT to peer-b")
+        PeerStreams(item).insert_to_stream(stream)
+        self.assertEqual(len(stream.tags), 2)
+
+        stream_cache.clear()
+        pool.clear_descriptor(item)
+        pool.unregister(PeerModel)
+
+
+class QueueDatastream(object):
+    """
+    A stand-in for the datastream API that passes inserted batches to the
+    test process.
+    """
+
+    def __init__(self):
+        self.batches = multiprocessing.Queue()
+
+    def append_multiple(self, datapoints):
+        self.batches.put(datapoints)
+
+
+class DatastreamWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datastream = QueueDatastream()
+        self._datastream = writer.datastream
+        writer.datastream = self.datastream
+
+    def tearDown(self):
+        writer.datastream = self._datastream
+
+    def test_drain(self):
+        # Datapoints are only inserted when batches are full or when the writer is stopped.
+        ds_writer = writer.DatastreamWriter(batch_size=40, flush_interval=60, max_pending=10000)
+        ds_writer.start()
+
+        def client(index):
+            for batch in xrange(10):
+                writer.send(ds_writer.address, [
+                    {'stream_id': index, 'value': batch * 10 + value, 'timestamp': None}
+                    for value in xrange(10)
+                ])
+
+        clients = [multiprocessing.Process(target=client, args=(index,)) for index in xrange(5)]
+        for process in clients:
+            process.start()
+        for process in clients:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        ds_writer.stop()
+        self.assertFalse(ds_writer.process.is_alive())
+        self.assertEqual(ds_writer.received, 500)
+        self.assertEqual(ds_writer.written, 500)
+        self.assertEqual(ds_writer.dropped, 0)
+        self.assertGreaterEqual(ds_writer.batches, 13)
+
+        datapoints = []
+        for batch in xrange(ds_writer.batches):
+            datapoints.extend(self.datastream.batches.get(timeout=5))
+
+        self.assertItemsEqual(
+            [(datapoint['stream_id'], datapoint['value']) for datapoint in datapoints],
+            [(index, value) for index in xrange(5) for value in xrange(100)]
+        )
+
+    def test_backpressure(self):
+        ds_writer = writer.DatastreamWriter(batch_size=1000, flush_interval=60, max_pending=25)
+        ds_writer.start()
+        for batch in xrange(3):
+            writer.send(ds_writer.address, [{'stream_id': 1, 'value': value, 'timestamp': None} for value in xrange(10)])
+        ds_writer.stop()
+
+        # The third batch does not fit into the buffer.
+        self.assertEqual(ds_writer.received, 30)
+        self.assertEqual(ds_writer.written, 20)
+        self.assertEqual(ds_writer.dropped, 10)
+        self.assertEqual(ds_writer.peak_pending, 20)
@@ -0,0 +1,387 @@
+import collections
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import traceback
+
+from multiprocessing import connection as mp_connection
+
+from django.db import connection
+
+from django_datastream import datastream
+
+# Logger instance
+logger = logging.getLogger('monitor.datastream.writer')
+
+# Number of seconds to wait for data when polling connections
+POLL_INTERVAL = 0.1
+# Minimum number of seconds between two back-pressure warnings
+BACKPRESSURE_REPORT_INTERVAL = 30
+# Number of seconds to wait for the writer process to start listening
+START_TIMEOUT = 30
+
+# Connection to the writer that has most recently been used by each thread
+_local = threading.local()
+
+
+class WriterError(Exception):
+    pass
+
+
+class DatastreamWriter(object):
+    """
+    Write-behind buffer for datastream datapoints. Worker processes send their
+    datapoints to the writer over a local socket and the writer inserts them
+    into the datastream in large batches.
+
+    The buffer runs in its own process, so that its threads never run in the
+    process which owns the worker pool. Worker processes forked from a process
+    with running threads could otherwise inherit locks held by those threads.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_pending):
+        """
+        Class constructor.
+
+        :param batch_size: Maximum number of datapoints inserted at once
+        :param flush_interval: Maximum number of seconds a datapoint may wait
+          before being inserted
+        :param max_pending: Maximum number of buffered datapoints; datapoints
+          received while the buffer is full are dropped
+        """
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.address = None
+        self.process = None
+        self._control = None
+
+        # Statistics, available once the writer has been stopped.
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.peak_pending = 0
+
+    def start(self):
+        """
+        Starts the writer process and waits until it accepts datapoints.
+        """
+
+        self.address = mp_connection.arbitrary_address('AF_UNIX')
+        self._control, control = multiprocessing.Pipe()
+
+        # The database connection must not be shared with the writer process.
+        connection.close()
+
+        self.process = multiprocessing.Process(
+            target=_writer_worker,
+            args=(control, self.address, self.batch_size, self.flush_interval, self.max_pending),
+        )
+        self.process.daemon = True
+        self.process.start()
+        control.close()
+
+        try:
+            if not self._control.poll(START_TIMEOUT):
+                raise EOFError
+            self._control.recv()
+        except (IOError, OSError, EOFError):
+            self.process.terminate()
+            self.process.join()
+            raise WriterError("Datastream writer process has failed to start.")
+
+    def stop(self):
+        """
+        Stops accepting datapoints and waits until all buffered datapoints have
+        been inserted.
+        """
+
+        try:
+            self._control.send(None)
+            statistics = self._control.recv()
+        except (IOError, OSError, EOFError):
+            logger.error("Datastream writer process has failed, buffered datapoints may have been lost.")
+            statistics = None
+
+        self.process.join()
+        self._control.close()
+
+        if statistics is None:
+            return
+
+        for name, value in statistics.iteritems():
+            setattr(self, name, value)
+
+        logger.info("Wrote %d datapoints in %d batches, dropped %d datapoints, buffer peaked at %d datapoints." % (
+            self.written,
+            self.batches,
+            self.dropped,
+            self.peak_pending,
+        ))
+
+
+def _writer_worker(control, address, batch_size, flush_interval, max_pending):
+    """
+    Entry point of the writer process. Runs the buffer until a stop request
+    is received over the control connection and replies with statistics.
+    """
+
+    # Interrupts are handled by the parent process, which stops the writer.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    buffer = WriteBuffer(batch_size, flush_interval, max_pending)
+    buffer.start(address)
+    control.send(True)
+
+    try:
+        control.recv()
+    except (IOError, OSError, EOFError):
+        # The parent process has gone away, but buffered datapoints are still inserted.
+        pass
+
+    buffer.stop()
+    try:
+        control.send(buffer.get_statistics())
+    except (IOError, OSError):
+        pass
+
+
+class WriteBuffer(object):
+    """
+    Buffer of the writer process. Accepts connections from worker processes,
+    receives their datapoints in a thread per connection and inserts them
+    from a single flush thread.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_pending):
+        """
+        Class constructor.
+
+        :param batch_size: Maximum number of datapoints inserted at once
+        :param flush_interval: Maximum number of seconds a datapoint may wait
+          before being inserted
+        :param max_pending: Maximum number of buffered datapoints
+        """
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.listener = None
+        self.address = None
+        self._pending = collections.deque()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._draining = False
+        self._readers = []
+        self._accept_thread = None
+        self._flush_thread = None
+        self._last_backpressure_report = 0
+
+        # Statistics.
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.peak_pending = 0
+
+    def start(self, address):
+        """
+        Starts accepting datapoints.
+
+        :param address: Address of the Unix socket to listen on
+        """
+
+        self.listener = mp_connection.Listener(address, family='AF_UNIX')
+        self.address = self.listener.address
+
+        self._accept_thread = threading.Thread(target=self._accept)
+        self._accept_thread.daemon = True
+        self._accept_thread.start()
+        self._flush_thread = threading.Thread(target=self._flush)
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def stop(self):
+        """
+        Stops accepting datapoints and inserts all buffered datapoints.
+        """
+
+        self._stopping = True
+
+        # Wake up the accepting thread by connecting to the listener.
+        try:
+            conn = mp_connection.Client(self.address, family='AF_UNIX')
+            conn.send(None)
+            conn.close()
+        except (IOError, OSError):
+            pass
+        self._accept_thread.join()
+        self.listener.close()
+
+        # Readers exit once they have received all data that has already been sent.
+        for thread in self._readers:
+            thread.join()
+
+        with self._condition:
+            self._draining = True
+            self._condition.notify()
+        self._flush_thread.join()
+
+    def get_statistics(self):
+        """
+        Returns a dictionary of buffer statistics.
+        """
+
+        return {
+            'received': self.received,
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'peak_pending': self.peak_pending,
+        }
+
+    def _accept(self):
+        """
+        Accepts connections from worker processes.
+        """
+
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (IOError, OSError, EOFError):
+                break
+
+            if self._stopping:
+                # Connections are accepted in order, so all worker connections have been
+                # accepted once the wake-up connection made by `stop` is reached.
+                try:
+                    datapoints = conn.recv()
+                except (IOError, OSError, EOFError):
+                    datapoints = None
+
+                if datapoints is None:
+                    conn.close()
+                    break
+
+                self.put(datapoints)
+
+            thread = threading.Thread(target=self._read, args=(conn,))
+            thread.daemon = True
+            thread.start()
+            self._readers.append(thread)
+
+    def _read(self, conn):
+        """
+        Receives datapoints from a single worker process.
+        """
+
+        try:
+            while True:
+                if not conn.poll(POLL_INTERVAL):
+                    if self._stopping:
+                        break
+                    continue
+
+                self.put(conn.recv())
+        except (IOError, OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+
+    def put(self, datapoints):
+        """
+        Adds datapoints to the buffer.
+
+        :param datapoints: A list of datapoints
+        """
+
+        with self._condition:
+            self.received += len(datapoints)
+            if len(self._pending) + len(datapoints) > self.max_pending:
+                self.dropped += len(datapoints)
+                self._report_backpressure()
+                return
+
+            self._pending.extend(datapoints)
+            self.peak_pending = max(self.peak_pending, len(self._pending))
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _report_backpressure(self):
+        """
+        Reports that datapoints are arriving faster than they can be written.
+        """
+
+        if time.time() - self._last_backpressure_report < BACKPRESSURE_REPORT_INTERVAL:
+            return
+
+        logger.warning("Datastream write buffer is full (%d datapoints), dropped %d datapoints so far." % (
+            len(self._pending),
+            self.dropped,
+        ))
+        self._last_backpressure_report = time.time()
+
+    def _flush(self):
+        """
+        Inserts buffered datapoints in batches, either when a batch is full or
+        when the flush interval expires.
+        """
+
+        while True:
+            deadline = time.time() + self.flush_interval
+            with self._condition:
+                while not self._draining and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                if not self._pending:
+                    if self._draining:
+                        break
+                    continue
+
+                batch = [self._pending.popleft() for _ in xrange(min(self.batch_size, len(self._pending)))]
+
+            try:
+                datastream.append_multiple(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except:
+                logger.error("Failed to write %d datapoints:" % len(batch))
+                logger.error(traceback.format_exc())
+                self.dropped += len(batch)
+
+
+def send(address, datapoints):
+    """
+    Sends datapoints to the writer listening on the given address. When the
+    writer cannot be reached, datapoints are inserted directly.
+
+    :param address: Writer address
+    :param datapoints: A list of datapoints
+    """
+
+    if not datapoints:
+        return
+
+    client = getattr(_local, 'client', None)
+    try:
+        if client is None or client[0] != address:
+            if client is not None:
+                client[1].close()
+                _local.client = None
+
+            client = _local.client = (address, mp_connection.Client(address, family='AF_UNIX'))
+
+        client[1].send(datapoints)
+    except (IOError, OSError, EOFError):
+        logger.warning("Datastream writer is not available, writing datapoints directly.")
+        _local.client = None
+        datastream.append_multiple(datapoints)
@@ -3,7 +3,7 @@ import pytz
 
 from django.utils.translation import gettext_noop
 
-from nodewatcher.core.monitor import models as monitor_models, processors as monitor_processors
+from nodewatcher.core.monitor import models as monitor_models, persistence, processors as monitor_processors
 from nodewatcher.utils import ipaddr
 from nodewatcher.modules.monitor.sources.http import processors as http_processors
 
@@ -46,7 +46,10 @@ class ClientInfo(monitor_processors.NodeProcessor):
     only run if HTTP monitor module has previously fetched data.
     """
 
+    thread_safe = True
+
     @monitor_processors.depends_on_context('http', http_processors.HTTPTelemetryContext)
+    @http_processors.depends_on_modules('core.clients')
     def process(self, context, node):
         """
         Called for every processed node.
@@ -56,43 +59,73 @@ class ClientInfo(monitor_processors.NodeProcessor):
         :return: A (possibly) modified context
         """
 
+        if context.http.not_modified:
+            # Clients have already been stored when the same feed has been fetched before.
+            return self.process_unchanged(context, node)
+
+        uow = persistence.UnitOfWork()
         existing_clients = {}
         for client in node.monitoring.network.clients():
-            existing_clients[client.client_id] = client
+            existing_clients[client.client_id] = uow.track(client)
 
         version = context.http.get_module_version('core.clients')
         if version == 0:
             # Unsupported version or data fetch failed (v0)
             return context
 
-        client_count = 0
+        clients = {}
         for client_id, data in context.http.core.clients.iteritems():
             if client_id.startswith('_'):
                 continue
 
             try:
-                client = existing_clients[client_id]
+                client = existing_clients.pop(client_id)
             except KeyError:
                 client = node.monitoring.network.clients(create=monitor_models.ClientMonitor)
                 client.client_id = client_id
-                existing_clients[client_id] = client
-
-            client.save()
-            self.process_client(context, node, client, data)
-            client_count += 1
 
-            del existing_clients[client_id]
+            uow.save(client)
+            clients[client_id] = client
 
         for client in existing_clients.values():
-            client.delete()
+            uow.delete(client)
+
+        # Clients must be saved before their addresses can reference them
+        uow.flush()
+
+        # Fetch all existing client addresses at once
+        existing_addresses = {}
+        for address in monitor_models.ClientAddress.objects.filter(client__root=node):
+            existing_addresses.setdefault(address.client_id, {})[address.address] = uow.track(address)
+
+        for client_id, client in clients.items():
+            data = context.http.core.clients[client_id]
+            self.process_client(context, node, client, data, existing_addresses.get(client.pk, {}), uow)
+
+        uow.flush()
 
         if DATASTREAM_SUPPORTED:
             # Store client count into datastream.
-            context.datastream.monitor_http_clients = ClientStreamsData(node, client_count)
+            context.datastream.monitor_http_clients = ClientStreamsData(node, len(clients))
 
         return context
 
-    def process_client(self, context, node, client, data):
+    def process_unchanged(self, context, node):
+        """
+        Called instead of `process` when reported clients have not changed.
+
+        :param context: Current context
+        :param node: Node that is being processed
+        :return: A (possibly) modified context
+        """
+
+        if DATASTREAM_SUPPORTED and context.http.get_module_version('core.clients') != 0:
+            clients = [client_id for client_id in context.http.core.clients if not client_id.startswith('_')]
+            context.datastream.monitor_http_clients = ClientStreamsData(node, len(clients))
+
+        return context
+
+    def process_client(self, context, node, client, data, existing_addresses, uow):
         """
         Processes a single client descriptor.
 
@@ -100,22 +133,15 @@ class ClientInfo(monitor_processors.NodeProcessor):
         :param node: Node that is being processed
         :param client: Client model
         :param data: Telemetry data
+        :param existing_addresses: A dictionary of existing client addresses
+        :param uow: Unit of work for queuing changes
         """
 
-        existing_addresses = {}
-        for address in client.addresses.all():
-            existing_addresses[address.address] = address
-
         for address in data.addresses:
             ip = ipaddr.IPNetwork(address['address'])
-            client_address = existing_addresses.get(ip, None)
+            client_address = existing_addresses.pop(ip, None)
             if client_address is None:
-                client_address, _ = client.addresses.get_or_create(
-                    client=client,
-                    address=ip,
-                )
-
-                existing_addresses[ip] = client_address
+                client_address = monitor_models.ClientAddress(client=client, address=ip)
 
             client_address.expiry_time = datetime.datetime.fromtimestamp(
                 int(address['expires']),
@@ -129,8 +155,7 @@ class ClientInfo(monitor_processors.NodeProcessor):
             else:
                 self.logger.warning("Unknown network family '%s' on node '%s' client '%s'!" % (address['family'], node.pk, client.client_id))
 
-            client_address.save()
-            del existing_addresses[ip]
+            uow.save(client_address)
 
         for address in existing_addresses.values():
-            address.delete()
+            uow.delete(address)
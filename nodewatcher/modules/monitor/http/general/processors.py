@@ -11,6 +11,8 @@ class GeneralInfo(monitor_processors.NodeProcessor):
     monitor module has previously fetched data.
     """
 
+    thread_safe = True
+
     @monitor_processors.depends_on_context('http', http_processors.HTTPTelemetryContext)
     def process(self, context, node):
         """
@@ -1,4 +1,4 @@
-from nodewatcher.core.monitor import models as monitor_models, processors as monitor_processors
+from nodewatcher.core.monitor import models as monitor_models, persistence, processors as monitor_processors
 from nodewatcher.utils import ipaddr
 from nodewatcher.modules.monitor.sources.http import processors as http_processors
 
@@ -15,6 +15,8 @@ class Interfaces(monitor_processors.NodeProcessor):
     Stores interface monitoring data.
     """
 
+    thread_safe = True
+
     @monitor_processors.depends_on_context('http', http_processors.HTTPTelemetryContext)
     def process(self, context, node):
         """
@@ -25,9 +27,16 @@ class Interfaces(monitor_processors.NodeProcessor):
         :return: A (possibly) modified context
         """
 
+        version_ifaces = context.http.get_module_version('core.interfaces')
+        version_wifi = context.http.get_module_version('core.wireless')
+        if version_ifaces < 3 or version_wifi < 3 or context.http.get_version() < 3:
+            return context
+
         # Fetch models for all existing interfaces and reset measured variables
+        uow = persistence.UnitOfWork()
         existing_interfaces = {}
         for iface in node.monitoring.core.interfaces():
+            uow.track(iface)
             iface.up = False
             iface.tx_packets = None
             iface.rx_packets = None
@@ -53,11 +62,6 @@ class Interfaces(monitor_processors.NodeProcessor):
 
             existing_interfaces[iface.name] = iface
 
-        version_ifaces = context.http.get_module_version('core.interfaces')
-        version_wifi = context.http.get_module_version('core.wireless')
-        if version_ifaces < 3 or version_wifi < 3 or context.http.get_version() < 3:
-            return context
-
         interfaces = {}
         for name, data in context.http.core.interfaces.iteritems():
             if name.startswith('_') or name in ('lo',):
@@ -74,17 +78,39 @@ class Interfaces(monitor_processors.NodeProcessor):
                 existing_interfaces[name] = iface
 
             self.process_interface(context, node, iface, data)
-            iface.save()
-            self.interface_enabled(context, node, iface)
+            uow.save(iface)
 
             del existing_interfaces[name]
             interfaces[name] = iface
 
-        # Store reset values for any interfaces that were not found; also hide these interfaces
+        # Store reset values for any interfaces that were not found
+        for iface in existing_interfaces.values():
+            uow.save(iface)
+
+        # Interfaces must be saved before their networks can reference them
+        uow.flush()
+
+        for iface in interfaces.values():
+            self.interface_enabled(context, node, iface)
+
+        # Also hide interfaces that were not found
         for iface in existing_interfaces.values():
-            iface.save()
             self.interface_disabled(context, node, iface)
 
+        # Fetch all existing networks at once
+        existing_networks = {}
+        for net in monitor_models.NetworkAddressMonitor.objects.filter(root=node):
+            existing_networks.setdefault(net.interface_id, {})[net.address] = uow.track(net)
+
+        for name, iface in interfaces.items():
+            data = context.http.core.interfaces[name]
+            if not data.up or not data.addresses:
+                continue
+
+            self.process_networks(context, node, iface, data, existing_networks.get(iface.pk, {}), uow)
+
+        uow.flush()
+
         return context
 
     def process_interface(self, context, node, iface, data):
@@ -138,36 +164,34 @@ class Interfaces(monitor_processors.NodeProcessor):
                 iface.snr = None
             iface.protocol = "".join(sorted(wdata.protocols)) if wdata.protocols else None
 
-        if data.addresses:
-            # Ensure that the interface is saved
-            iface.save()
-
-            existing_networks = {}
-            for net in iface.networks.all():
-                existing_networks[net.address] = net
-
-            for network in data.addresses:
-                address = ipaddr.IPNetwork("%(address)s/%(mask)d" % network)
-                net = existing_networks.get(address, None)
-                if net is None:
-                    net, _ = iface.networks.get_or_create(
-                        root=node,
-                        interface=iface,
-                        address=address
-                    )
-                    existing_networks[address] = net
-
-                if network['family'] == 'ipv4':
-                    net.family = 'ipv4'
-                elif network['family'] == 'ipv6':
-                    net.family = 'ipv6'
-                else:
-                    self.logger.warning("Unknown network family '%s' on node '%s' interface '%s'!" % (network.family, node.pk, iface.name))
-                net.save()
-                del existing_networks[address]
+    def process_networks(self, context, node, iface, data, existing_networks, uow):
+        """
+        Performs per-interface network address processing.
+
+        :param context: Current context
+        :param node: Node that is being processed
+        :param iface: Saved interface model
+        :param data: Interface telemetry data
+        :param existing_networks: A dictionary of existing interface networks
+        :param uow: Unit of work for queuing changes
+        """
+
+        for network in data.addresses:
+            address = ipaddr.IPNetwork("%(address)s/%(mask)d" % network)
+            net = existing_networks.pop(address, None)
+            if net is None:
+                net = monitor_models.NetworkAddressMonitor(root=node, interface=iface, address=address)
+
+            if network['family'] == 'ipv4':
+                net.family = 'ipv4'
+            elif network['family'] == 'ipv6':
+                net.family = 'ipv6'
+            else:
+                self.logger.warning("Unknown network family '%s' on node '%s' interface '%s'!" % (network.family, node.pk, iface.name))
+            uow.save(net)
 
-            for net in existing_networks.values():
-                net.delete()
+        for net in existing_networks.values():
+            uow.delete(net)
 
     def interface_enabled(self, context, node, iface):
         """
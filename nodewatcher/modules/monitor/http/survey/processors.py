@@ -44,6 +44,8 @@ class SurveyInfo(monitor_processors.NodeProcessor):
     fetched data.
     """
 
+    thread_safe = True
+
     @monitor_processors.depends_on_context('http', http_processors.HTTPTelemetryContext)
     def process(self, context, node):
         """
@@ -0,0 +1,215 @@
+import collections
+import errno
+import heapq
+import os
+import random
+import select
+import socket
+import struct
+import time
+
+# ICMP message types
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+# Size of the probe identifier that starts the payload of each request
+TOKEN_SIZE = 8
+# Maximum number of replies read before the send schedule is checked again
+RECEIVE_BATCH = 256
+
+
+class ProberError(Exception):
+    pass
+
+
+def checksum(data):
+    """
+    Computes the internet checksum of the given data.
+
+    :param data: Data string
+    """
+
+    if len(data) % 2:
+        data += '\0'
+
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def open_socket():
+    """
+    Opens an ICMP socket. Unprivileged ICMP datagram sockets are used when the
+    system allows them, otherwise a raw socket is opened, which requires
+    privileges.
+
+    :return: A tuple (socket, raw)
+    """
+
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except socket.error:
+        pass
+
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except socket.error, e:
+        raise ProberError("Unable to open an ICMP socket: %s" % e)
+
+
+class IcmpProber(object):
+    """
+    Measures RTTs by sending ICMP ECHO requests to many addresses from a single
+    event loop. Requests to each address are sent with a fixed interval, with
+    the first request delayed by a random fraction of the interval so that
+    requests to different addresses are spread out. The total rate of requests
+    is limited and replies that do not arrive in time are counted as lost.
+    """
+
+    def __init__(self, count, interval, timeout, rate):
+        """
+        Class constructor.
+
+        :param count: Number of requests sent to each address for each packet size
+        :param interval: Number of seconds between requests to the same address
+        :param timeout: Number of seconds to wait for each reply
+        :param rate: Maximum number of requests sent per second
+        """
+
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.rate = rate
+
+    def probe(self, addresses, sizes):
+        """
+        Sends requests of all packet sizes to all addresses and yields results
+        as measurements of each address and packet size complete.
+
+        :param addresses: A list of IPv4 addresses
+        :param sizes: A list of payload sizes in bytes
+        :return: An iterator over tuples (address, size, rtts), where rtts is a
+          list of RTTs of successful requests in milliseconds
+        """
+
+        sock, raw = open_socket()
+        sock.setblocking(False)
+
+        identifier = os.getpid() & 0xffff
+        nonce = random.getrandbits(32)
+        sizes = list(sizes)
+        slots = len(addresses) * len(sizes)
+
+        # Send schedule as a heap of (due time, slot, request number).
+        now = time.time()
+        schedule = [(now + random.random() * self.interval, slot, 0) for slot in xrange(slots)]
+        heapq.heapify(schedule)
+        # Requests that are waiting for a reply, in the order they were sent.
+        pending = collections.OrderedDict()
+        # RTTs and the number of unresolved requests of each slot.
+        rtts = collections.defaultdict(list)
+        unresolved = collections.defaultdict(int)
+        # Slots that still have requests to send.
+        waiting = set(xrange(slots))
+
+        def resolve(slot):
+            # Returns the result of a slot once all of its requests have been resolved.
+            unresolved[slot] -= 1
+            if unresolved[slot] == 0 and slot not in waiting:
+                del unresolved[slot]
+                return addresses[slot // len(sizes)], sizes[slot % len(sizes)], rtts.pop(slot, [])
+
+        tokens = 1.0
+        last_refill = now
+        sequence = 0
+
+        try:
+            while schedule or pending:
+                now = time.time()
+                tokens = min(max(1.0, self.rate * 0.01), tokens + (now - last_refill) * self.rate)
+                last_refill = now
+
+                # Send requests that are due, as long as the rate permits.
+                while schedule and schedule[0][0] <= now and tokens >= 1.0:
+                    due, slot, number = heapq.heappop(schedule)
+                    tokens -= 1.0
+                    sequence = (sequence + 1) & 0xffff
+                    probe_id = slot * self.count + number
+                    payload = struct.pack('!II', nonce, probe_id).ljust(max(TOKEN_SIZE, sizes[slot % len(sizes)]), '\0')
+                    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+                    packet = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum(header + payload), identifier, sequence) + payload
+
+                    unresolved[slot] += 1
+                    if number + 1 < self.count:
+                        heapq.heappush(schedule, (max(now, due + self.interval), slot, number + 1))
+                    else:
+                        waiting.discard(slot)
+
+                    try:
+                        sock.sendto(packet, (addresses[slot // len(sizes)], 0))
+                        pending[probe_id] = now
+                    except socket.error:
+                        # Requests that cannot be sent are lost.
+                        result = resolve(slot)
+                        if result is not None:
+                            yield result
+
+                # Requests that have not been replied to in time are lost.
+                while pending:
+                    probe_id, sent = next(pending.iteritems())
+                    if now - sent < self.timeout:
+                        break
+
+                    del pending[probe_id]
+                    result = resolve(probe_id // self.count)
+                    if result is not None:
+                        yield result
+
+                # Wait until the next request is due, a reply arrives or a request expires.
+                deadlines = []
+                if schedule:
+                    deadlines.append(max(schedule[0][0], now + (1.0 - tokens) / self.rate))
+                if pending:
+                    deadlines.append(next(pending.itervalues()) + self.timeout)
+                if not deadlines:
+                    break
+
+                readable, _, _ = select.select([sock], [], [], max(0.0, min(deadlines) - time.time()))
+                if not readable:
+                    continue
+
+                for _ in xrange(RECEIVE_BATCH):
+                    try:
+                        data, address = sock.recvfrom(65536)
+                    except socket.error, e:
+                        if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                            break
+                        raise
+
+                    received = time.time()
+                    if raw:
+                        # Raw sockets receive the IP header and replies to other processes.
+                        data = data[(ord(data[0]) & 0x0f) * 4:]
+
+                    if len(data) < 8 + TOKEN_SIZE:
+                        continue
+
+                    message_type, _, _, reply_identifier, _ = struct.unpack('!BBHHH', data[:8])
+                    reply_nonce, probe_id = struct.unpack('!II', data[8:8 + TOKEN_SIZE])
+                    if message_type != ICMP_ECHO_REPLY or reply_nonce != nonce:
+                        continue
+                    if raw and reply_identifier != identifier:
+                        continue
+
+                    slot = probe_id // self.count
+                    if probe_id not in pending or addresses[slot // len(sizes)] != address[0]:
+                        continue
+
+                    sent = pending.pop(probe_id)
+
+                    rtts[slot].append((received - sent) * 1000.0)
+                    result = resolve(slot)
+                    if result is not None:
+                        yield result
+        finally:
+            sock.close()
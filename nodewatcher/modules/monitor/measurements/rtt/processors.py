@@ -1,14 +1,14 @@
 import subprocess
 import threading
-import collections
-import math
 
 from django.conf import settings
 from django.utils import timezone
 
 from nodewatcher.core import models as core_models
-from nodewatcher.core.monitor import models as monitor_models, processors as monitor_processors
-from nodewatcher.utils import which, ipaddr
+from nodewatcher.core.monitor import models as monitor_models, processors as monitor_processors, replay, routerid
+from nodewatcher.utils import which
+
+from . import prober as rtt_prober, results as rtt_results
 
 
 class RttMeasurement(monitor_processors.NetworkProcessor):
@@ -18,6 +18,117 @@ class RttMeasurement(monitor_processors.NetworkProcessor):
 
     PACKET_SIZES = (56, 100, 500, 1000, 1480)
     PACKET_COUNT = 10
+    # Number of seconds between packets sent to the same node
+    PACKET_INTERVAL = 0.02
+
+    def run_fping(self, args, node_ips):
+        """
+        Runs fping and yields lines of its output as they are produced.
+
+        :param args: fping command line
+        :param node_ips: A list of IP addresses to measure
+        """
+
+        process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+        )
+
+        def writer():
+            try:
+                process.stdin.write(("\n".join(node_ips)) + '\n')
+                process.stdin.close()
+            except IOError:
+                pass
+
+        # Addresses are written in a separate thread, so that output is consumed while fping is running.
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.daemon = True
+        writer_thread.start()
+
+        try:
+            for line in iter(process.stdout.readline, ''):
+                yield line
+        finally:
+            try:
+                process.kill()
+            except OSError:
+                pass
+            process.wait()
+            writer_thread.join()
+
+    def measure(self, context, args, node_ips, size):
+        """
+        Performs measurements using a specific packet size and records results
+        as fping output is being produced.
+
+        :param context: Current context
+        :param args: fping command line
+        :param node_ips: A list of IP addresses to measure
+        :param size: Packet size
+        """
+
+        start = timezone.now()
+        try:
+            for line in replay.capture_stream('fping', size, lambda: self.run_fping(args, node_ips)):
+                # Output lines are in the form "<address> : <rtt> <rtt> - <rtt> ...".
+                result = line.split()
+                if not result:
+                    continue
+
+                try:
+                    rtt = [float(x) for x in result[2:] if x != '-']
+                except ValueError:
+                    # TODO: Handle output for duplicate packets
+                    continue
+
+                # fping error messages for specific packets are ignored as they do not start with a measured address.
+                context.rtt.results.add(result[0], size, rtt)
+        except replay.FeedNotRecorded:
+            return
+
+        context.rtt.meta[size] = {
+            'start': start,
+            'end': timezone.now(),
+        }
+
+    def measure_native(self, context, node_ips):
+        """
+        Performs measurements using all packet sizes with the built-in ICMP prober
+        and records results as they become available.
+
+        :param context: Current context
+        :param node_ips: A list of IP addresses to measure
+        """
+
+        prober = rtt_prober.IcmpProber(
+            count=self.PACKET_COUNT,
+            interval=self.PACKET_INTERVAL,
+            timeout=getattr(settings, 'MEASUREMENT_RTT_TIMEOUT', 1),
+            rate=getattr(settings, 'MEASUREMENT_RTT_RATE', 2000),
+        )
+
+        self.logger.info("Performing ICMP ECHO RTT measurements with %d packet sizes to %d nodes." % (len(self.PACKET_SIZES), len(node_ips)))
+
+        start = timezone.now()
+        try:
+            for address, size, rtt in replay.capture_stream('icmp', None, lambda: prober.probe(node_ips, self.PACKET_SIZES)):
+                context.rtt.results.add(address, size, rtt)
+        except replay.FeedNotRecorded:
+            return
+        except rtt_prober.ProberError, e:
+            self.logger.error(str(e))
+            return
+
+        end = timezone.now()
+        for size in self.PACKET_SIZES:
+            context.rtt.meta[size] = {
+                'start': start,
+                'end': end,
+            }
 
     def process(self, context, nodes):
         """
@@ -29,9 +140,11 @@ class RttMeasurement(monitor_processors.NetworkProcessor):
         :return: A (possibly) modified context and a (possibly) modified set of nodes
         """
 
+        native = getattr(settings, 'MEASUREMENT_RTT_PROBER', 'fping') == 'native'
+
         # Detect the location of fping binary
         fping = which.which('fping')
-        if not fping:
+        if not native and not fping and not replay.is_replaying():
             self.logger.error("Unable to find 'fping' binary!")
             return context, nodes
 
@@ -44,107 +157,51 @@ class RttMeasurement(monitor_processors.NetworkProcessor):
             context.rtt.source_node = None
 
         # Prepare a list of node IPv4 addresses
+        index = routerid.get_index(context)
         node_ips = []
         for node in nodes:
-            try:
-                node_ips.append(str(node.config.core.routerid(queryset=True).filter(rid_family='ipv4')[0].router_id))
-            except IndexError:
-                continue
+            router_ids = index.get_router_ids(node.pk, families=['ipv4'])
+            if router_ids:
+                node_ips.append(router_ids[0])
 
         # If there are no node IPs skip the measurement procedure
         if not node_ips:
             self.logger.warning("No nodes selected for measurement. Skipping RTT measurement.")
             return context, nodes
 
+        context.rtt.meta = {}
+        context.rtt.results = rtt_results.RttResults(node_ips, self.PACKET_SIZES, self.PACKET_COUNT)
+
+        if native:
+            self.measure_native(context, node_ips)
+            if not context.rtt.results:
+                self.logger.warning("No measurements in results, the ICMP prober may have failed.")
+
+            return context, nodes
+
         # Perform ping tests of different sizes
-        processes = []
         threads = []
-        outputs = collections.deque()
-        metadata = collections.deque()
         for size in self.PACKET_SIZES:
             args = [
                 fping,
                 '-q',
-                '-p', '20',
+                '-p', str(int(self.PACKET_INTERVAL * 1000)),
                 '-b', str(size),
                 '-C', str(self.PACKET_COUNT),
             ]
 
             self.logger.info("Performing ICMP ECHO RTT measurements with %d byte packets to %d nodes." % (size, len(node_ips)))
-            process = subprocess.Popen(
-                args,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                close_fds=True,
-            )
-            processes.append(process)
 
-            def communicator(node_ips, size, process):
-                t0 = timezone.now()
-                data = process.communicate(("\n".join(node_ips)) + '\n')[0]
-                t1 = timezone.now()
-                outputs.append((size, [x.split() for x in data.strip().split('\n')]))
-                metadata.append((size, t0, t1))
-
-            thread = threading.Thread(target=communicator, args=(node_ips, size, process))
+            thread = threading.Thread(target=self.measure, args=(context, args, node_ips, size))
             thread.daemon = True
             threads.append(thread)
             thread.start()
 
         for t in threads:
             t.join()
-        for p in processes:
-            try:
-                p.kill()
-            except OSError:
-                pass
 
         self.logger.info("All ICMP ECHO RTT measurements completed.")
 
-        context.rtt.meta = {}
-        for size, start, end in metadata:
-            context.rtt.meta[size] = {
-                'start': start,
-                'end': end,
-            }
-
-        context.rtt.results = {}
-        for size, results in outputs:
-            for result in results:
-                try:
-                    node_ip = ipaddr.IPAddress(result[0])
-                except ValueError:
-                    # fping error message for a specific packet
-                    continue
-
-                try:
-                    rtt = [float(x) for x in result[2:] if x != '-']
-                except ValueError:
-                    # TODO: Handle output for duplicate packets
-                    continue
-
-                n = len(rtt)
-                s = sum(rtt)
-                ss = sum([x ** 2 for x in rtt])
-
-                if n == 0:
-                    std = None
-                elif n == 1:
-                    std = 0.0
-                else:
-                    std = math.sqrt((float(n) * ss - s ** 2) / (n * (n - 1)))
-
-                context.rtt.results.setdefault(str(node_ip), {})[size] = {
-                    'sent': self.PACKET_COUNT,
-                    'successful': n,
-                    'failed': max(0, self.PACKET_COUNT - n),
-                    'rtt_min': min(rtt) if rtt else None,
-                    'rtt_max': max(rtt) if rtt else None,
-                    'rtt_avg': (float(s) / n) if rtt else None,
-                    'rtt_std': std,
-                }
-
         if not context.rtt.results:
             self.logger.warning("No measurements in results, fping may have failed.")
 
@@ -156,6 +213,8 @@ class StoreNode(monitor_processors.NodeProcessor):
     A processor that stores per-node RTT measurement results.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
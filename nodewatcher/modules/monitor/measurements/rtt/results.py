@@ -0,0 +1,115 @@
+import array
+import math
+
+
+class RttResults(object):
+    """
+    Results of RTT measurements to a set of addresses using different packet
+    sizes. Statistics are accumulated into flat arrays with one slot for each
+    address and packet size, instead of a dictionary for each measurement.
+    """
+
+    def __init__(self, addresses, sizes, count):
+        """
+        Class constructor.
+
+        :param addresses: A list of measured addresses
+        :param sizes: A list of packet sizes
+        :param count: Number of packets sent to each address for each packet size
+        """
+
+        self.sizes = tuple(sizes)
+        self.count = count
+        self._addresses = dict([(address, index) for index, address in enumerate(addresses)])
+        self._size_index = dict([(size, index) for index, size in enumerate(self.sizes)])
+
+        slots = len(self._addresses) * len(self.sizes)
+        # Number of successful packets or -1 when there is no measurement.
+        self._successful = array.array('i', [-1]) * slots
+        self._minimum = array.array('d', [0.0]) * slots
+        self._maximum = array.array('d', [0.0]) * slots
+        self._sum = array.array('d', [0.0]) * slots
+        self._squares = array.array('d', [0.0]) * slots
+
+    def _get_slot(self, address, size):
+        index = self._addresses.get(address, None)
+        if index is None:
+            return None
+
+        return index * len(self.sizes) + self._size_index[size]
+
+    def add(self, address, size, rtts):
+        """
+        Records a measurement. Measurements of addresses that are not being
+        measured are ignored. Measurements of different packet sizes may be
+        added concurrently.
+
+        :param address: Measured address
+        :param size: Packet size
+        :param rtts: A list of RTTs of successful packets in milliseconds
+        :return: True if the measurement has been recorded
+        """
+
+        slot = self._get_slot(address, size)
+        if slot is None:
+            return False
+
+        self._successful[slot] = len(rtts)
+        if rtts:
+            self._minimum[slot] = min(rtts)
+            self._maximum[slot] = max(rtts)
+            self._sum[slot] = math.fsum(rtts)
+            self._squares[slot] = math.fsum([x * x for x in rtts])
+
+        return True
+
+    def get(self, address, default=None):
+        """
+        Returns a dictionary mapping packet sizes to statistics of the given
+        address or the default value if there are no measurements.
+
+        :param address: Measured address
+        :param default: Default value
+        """
+
+        index = self._addresses.get(address, None)
+        if index is None:
+            return default
+
+        results = {}
+        for size in self.sizes:
+            slot = index * len(self.sizes) + self._size_index[size]
+            n = self._successful[slot]
+            if n < 0:
+                continue
+
+            s = self._sum[slot]
+            if n == 0:
+                std = None
+            elif n == 1:
+                std = 0.0
+            else:
+                std = math.sqrt(max(0.0, (float(n) * self._squares[slot] - s ** 2) / (n * (n - 1))))
+
+            results[size] = {
+                'sent': self.count,
+                'successful': n,
+                'failed': max(0, self.count - n),
+                'rtt_min': self._minimum[slot] if n else None,
+                'rtt_max': self._maximum[slot] if n else None,
+                'rtt_avg': (s / n) if n else None,
+                'rtt_std': std,
+            }
+
+        return results or default
+
+    def __len__(self):
+        """
+        Returns the number of addresses with at least one measurement.
+        """
+
+        sizes = len(self.sizes)
+        return len([
+            index for index in xrange(len(self._addresses))
+            if max(self._successful[index * sizes:(index + 1) * sizes]) >= 0
+        ])
@@ -0,0 +1,82 @@
+import socket
+import time
+import unittest
+
+from . import prober, results
+
+
+class IcmpProberTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            prober.open_socket()[0].close()
+        except prober.ProberError:
+            raise unittest.SkipTest("ICMP sockets are not available.")
+
+    def test_checksum(self):
+        self.assertEqual(prober.checksum('\x08\x00\x00\x00\x00\x01\x00\x01'), 0xf7fd)
+        self.assertEqual(prober.checksum('\x08\x00\xf7\xfd\x00\x01\x00\x01'), 0)
+
+    def test_loopback(self):
+        sizes = (56, 1000)
+        icmp = prober.IcmpProber(count=3, interval=0.01, timeout=1, rate=1000)
+        measurements = list(icmp.probe(['127.0.0.1', '127.0.0.2'], sizes))
+
+        self.assertEqual(len(measurements), 4)
+        rtt = results.RttResults(['127.0.0.1', '127.0.0.2'], sizes, 3)
+        for address, size, rtts in measurements:
+            self.assertTrue(rtt.add(address, size, rtts))
+
+        for address in ('127.0.0.1', '127.0.0.2'):
+            result = rtt.get(address)
+            self.assertEqual(sorted(result.keys()), list(sizes))
+            for size in sizes:
+                self.assertEqual(result[size]['sent'], 3)
+                self.assertEqual(result[size]['successful'], 3)
+                self.assertEqual(result[size]['failed'], 0)
+                self.assertTrue(0 <= result[size]['rtt_min'] <= result[size]['rtt_avg'] <= result[size]['rtt_max'])
+
+    def test_unreachable(self):
+        # Requests to the broadcast address cannot be sent without SO_BROADCAST.
+        icmp = prober.IcmpProber(count=2, interval=0.01, timeout=1, rate=1000)
+        measurements = list(icmp.probe(['255.255.255.255'], (56,)))
+
+        self.assertEqual(measurements, [('255.255.255.255', 56, [])])
+
+    def test_timeout(self):
+        class SilentSocket(object):
+            # A stand-in for a socket of a target that never replies.
+            def __init__(self):
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+            def fileno(self):
+                return self._socket.fileno()
+
+            def setblocking(self, flag):
+                pass
+
+            def sendto(self, data, address):
+                return len(data)
+
+            def close(self):
+                self._socket.close()
+
+        open_socket = prober.open_socket
+        prober.open_socket = lambda: (SilentSocket(), False)
+        try:
+            icmp = prober.IcmpProber(count=2, interval=0.01, timeout=0.1, rate=1000)
+            start = time.time()
+            measurements = list(icmp.probe(['127.0.0.1'], (56, 100)))
+        finally:
+            prober.open_socket = open_socket
+
+        self.assertGreaterEqual(time.time() - start, 0.1)
+        self.assertEqual(sorted(measurements), [('127.0.0.1', 56, []), ('127.0.0.1', 100, [])])
+
+    def test_rate_limit(self):
+        icmp = prober.IcmpProber(count=5, interval=0, timeout=1, rate=100)
+        start = time.time()
+        measurements = list(icmp.probe(['127.0.0.1', '127.0.0.2'], (56,)))
+
+        # All requests are due immediately, but only 100 may be sent per second.
+        self.assertGreaterEqual(time.time() - start, 0.08)
+        self.assertEqual(sum([len(rtts) for address, size, rtts in measurements]), 10)
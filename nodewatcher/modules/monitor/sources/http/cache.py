@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core import cache as django_cache
+
+# Prefix used for keys stored in the cache.
+KEY_PREFIX = 'nodewatcher.monitor.http.feed'
+
+
+class FeedCache(object):
+    """
+    Stores the most recently fetched telemetry feed of each node together with
+    its HTTP validators, so that subsequent fetches can be made conditional, and
+    hashes of the most recently processed telemetry modules. The cache is only
+    used when the `MONITOR_HTTP_POLL_CACHE` setting names a cache alias, as
+    entries must outlive monitoring cycles.
+    """
+
+    def get_cache(self):
+        """
+        Returns the configured cache or None if feeds should not be cached.
+        """
+
+        alias = getattr(settings, 'MONITOR_HTTP_POLL_CACHE', None)
+        if not alias:
+            return None
+
+        return django_cache.caches[alias]
+
+    def get_key(self, key):
+        return '%s.%s' % (KEY_PREFIX, key)
+
+    def get(self, key):
+        """
+        Returns the cached feed entry.
+
+        :param key: Node identifier
+        :return: A dictionary with keys 'etag', 'last_modified' and 'data' or None
+        """
+
+        cache = self.get_cache()
+        if cache is None:
+            return None
+
+        return cache.get(self.get_key(key))
+
+    def get_many(self, keys):
+        """
+        Returns cached feed entries of multiple nodes using a single request.
+
+        :param keys: A list of node identifiers
+        :return: A dictionary mapping node identifiers to entries
+        """
+
+        cache = self.get_cache()
+        if cache is None or not keys:
+            return {}
+
+        entries = cache.get_many([self.get_key(key) for key in keys])
+        return dict([(key, entries[self.get_key(key)]) for key in keys if self.get_key(key) in entries])
+
+    def set(self, key, headers, data):
+        """
+        Stores a fetched feed if the response included any validators.
+
+        :param key: Node identifier
+        :param headers: Response headers dictionary with lowercase names
+        :param data: Decoded feed data
+        """
+
+        cache = self.get_cache()
+        if cache is None:
+            return
+
+        etag = headers.get('etag', None)
+        last_modified = headers.get('last-modified', None)
+        if not etag and not last_modified:
+            return
+
+        cache.set(self.get_key(key), {
+            'etag': etag,
+            'last_modified': last_modified,
+            'data': data,
+        }, None)
+
+    def get_module_hashes(self, key):
+        """
+        Returns hashes of the most recently processed telemetry modules.
+
+        :param key: Node identifier
+        :return: A dictionary mapping module names to hashes or None
+        """
+
+        cache = self.get_cache()
+        if cache is None:
+            return None
+
+        return cache.get(self.get_key('%s.modules' % key))
+
+    def set_module_hashes(self, key, hashes):
+        """
+        Stores hashes of processed telemetry modules.
+
+        :param key: Node identifier
+        :param hashes: A dictionary mapping module names to hashes
+        """
+
+        cache = self.get_cache()
+        if cache is None:
+            return
+
+        cache.set(self.get_key('%s.modules' % key), hashes, None)
+
+
+def get_conditional_headers(entry):
+    """
+    Returns request headers that make a request conditional on the feed having
+    been modified since the cached entry has been fetched.
+
+    :param entry: Cached feed entry or None
+    :return: A dictionary of request headers
+    """
+
+    headers = {}
+    if not entry:
+        return headers
+
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    return headers
+
+
+feed_cache = FeedCache()
@@ -0,0 +1,163 @@
+import json
+import time
+
+from django.core.management import base
+
+from nodewatcher.core.monitor import processors as monitor_processors
+from nodewatcher.utils import trimming
+
+from ... import parser as telemetry_parser
+
+
+def parse_v3_reference(data, tree):
+    """
+    Reference JSON (v3) parser that first decodes the feed and then converts it
+    into the target context. Used as a baseline for comparison.
+    """
+
+    data = json.loads(data)
+
+    tree['_meta'] = tree.__class__()
+    tree['_meta']['version'] = 3
+
+    def convert_to_context(data):
+        result = tree.__class__()
+        for key, value in data.iteritems():
+            if isinstance(value, dict):
+                value = convert_to_context(value)
+
+            result[key] = value
+
+        return result
+
+    for key, value in data.iteritems():
+        key = key.split('.')
+        value = convert_to_context(value)
+        reduce(lambda x, y: x.setdefault(y, x.__class__()), key[:-1], tree)[key[-1]] = value
+
+    return tree
+
+
+def generate_feed(interfaces):
+    """
+    Generates a synthetic JSON feed of a node with many interfaces and clients.
+
+    :param interfaces: Number of interfaces
+    :return: Raw feed data
+    """
+
+    statistics = dict([(key, 1000) for key in (
+        'collisions', 'rx_frame_errors', 'tx_compressed', 'multicast', 'rx_length_errors', 'tx_dropped',
+        'rx_bytes', 'rx_missed_errors', 'tx_errors', 'rx_compressed', 'rx_over_errors', 'tx_fifo_errors',
+        'rx_crc_errors', 'rx_packets', 'tx_heartbeat_errors', 'rx_dropped', 'tx_aborted_errors',
+        'tx_packets', 'rx_errors', 'tx_bytes', 'tx_window_errors', 'rx_fifo_errors', 'tx_carrier_errors',
+    )])
+
+    feed = {
+        'core.general': {
+            'uuid': '64840ad9-aac1-4494-b4d1-9de5d8cbedd9',
+            'hostname': 'benchmark',
+            'uptime': 962,
+            'hardware': {'board': 'tl-wr741nd-v4', 'model': 'TP-Link TL-WR740N/ND v4'},
+            '_meta': {'version': 4},
+        },
+        'core.interfaces': {'_meta': {'version': 3}},
+        'core.clients': {'_meta': {'version': 1}, 'clients': []},
+    }
+
+    for index in xrange(interfaces):
+        name = 'wlan%d' % index
+        feed['core.interfaces'][name] = {
+            'name': name,
+            'config': 'mesh',
+            'addresses': [{'family': 'ipv4', 'address': '10.254.%d.%d' % (index / 256, index % 256), 'mask': 16}],
+            'mac': '00:11:22:33:%02x:%02x' % (index / 256, index % 256),
+            'mtu': 1500,
+            'up': True,
+            'carrier': True,
+            'statistics': statistics,
+        }
+        feed['core.clients']['clients'].append({
+            'mac': '00:aa:bb:cc:%02x:%02x' % (index / 256, index % 256),
+            'addresses': [{'family': 'ipv4', 'address': '10.%d.%d.1' % (index / 256, index % 256), 'expires': 3600}],
+        })
+
+    return json.dumps(feed)
+
+
+class Command(base.BaseCommand):
+    help = trimming.trim("""
+        Measures the time needed to parse HTTP telemetry feeds into a processor
+        context and compares it with a reference parser.
+    """)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'feeds',
+            nargs='*',
+            help=trimming.trim("""
+                Files with raw JSON feeds. When no files are given, a synthetic
+                feed is generated.
+            """),
+        )
+
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            action='store',
+            dest='iterations',
+            default=50,
+            help="Number of times each feed is parsed.",
+        )
+
+        parser.add_argument(
+            '--interfaces',
+            type=int,
+            action='store',
+            dest='interfaces',
+            default=300,
+            help="Number of interfaces in the synthetic feed.",
+        )
+
+    def measure(self, parse, data, iterations):
+        """
+        Returns the average number of seconds needed to parse the given data.
+        """
+
+        start = time.time()
+        for _ in xrange(iterations):
+            parse(data, monitor_processors.ProcessorContext())
+
+        return (time.time() - start) / iterations
+
+    def handle(self, *args, **options):
+        """
+        Runs the benchmark.
+        """
+
+        feeds = []
+        for filename in options['feeds']:
+            with open(filename, 'rb') as feed:
+                feeds.append((filename, feed.read()))
+
+        if not feeds:
+            feeds.append(('synthetic', generate_feed(options['interfaces'])))
+
+        for name, data in feeds:
+            if telemetry_parser.get_format(data) != 3:
+                raise base.CommandError("Feed '%s' is not in the JSON format." % name)
+
+            parser = telemetry_parser.HttpTelemetryParser(data=data)
+            if parser.parse_v3(data, monitor_processors.ProcessorContext()) != parse_v3_reference(data, monitor_processors.ProcessorContext()):
+                raise base.CommandError("Parsers produce different results for feed '%s'." % name)
+
+            reference = self.measure(parse_v3_reference, data, options['iterations'])
+            current = self.measure(parser.parse_v3, data, options['iterations'])
+
+            self.stdout.write("%s (%d KB): reference %.2f ms, parser %.2f ms, speedup %.2fx" % (
+                name,
+                len(data) / 1024,
+                reference * 1000,
+                current * 1000,
+                reference / current,
+            ))
@@ -1,9 +1,14 @@
 import errno
 import json
 import httplib
+import zlib
 
 from django.conf import settings
 
+from nodewatcher.core.monitor import replay
+
+from . import cache as telemetry_cache
+
 
 class HttpTelemetryParseFailed(Exception):
     error = None
@@ -21,24 +26,73 @@ class FailedToParseData(HttpTelemetryParseFailed):
     error = 'parse'
 
 
+def decode_body(data, encoding):
+    """
+    Decodes a (possibly compressed) response body.
+
+    :param data: Raw response body
+    :param encoding: Value of the Content-Encoding header
+    :return: Decoded data
+    """
+
+    if encoding == 'gzip':
+        try:
+            return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        except zlib.error:
+            raise FailedToFetchData
+
+    return data
+
+
+def get_format(data):
+    """
+    Detects the telemetry format from raw data.
+
+    :param data: Raw data
+    :return: Format version, 3 for JSON and 2 for the legacy format
+    """
+
+    if data.lstrip()[:1] == '{':
+        return 3
+
+    return 2
+
+
 class HttpTelemetryParser(object):
     """
     A simple class for obtaining nodewatcher telemetry in HTTP format.
     """
 
-    def __init__(self, host=None, port=None, data=None):
+    def __init__(self, host=None, port=None, data=None, error=None, node_responds=False, not_modified=False, cache_key=None,
+                 headers=None):
         """
         Class constructor.
 
         :param host: Target host
         :param port: Target port
         :param data: Optional raw data to parse directly
+        :param error: Optional failure class when data has already been fetched
+          unsuccessfully
+        :param node_responds: Whether the node has already responded
+        :param not_modified: Whether the already fetched data is the same as in
+          the previous fetch
+        :param cache_key: Optional key under which the fetched feed is cached, so that
+          subsequent fetches can be conditional
+        :param headers: Optional response headers of already fetched data, which
+          are used to cache the feed
         """
 
         self.host = host
         self.port = port
         self.data = data
-        self.node_responds = False
+        self.error = error
+        self.node_responds = node_responds
+        self.not_modified = not_modified
+        self.cache_key = cache_key
+        self.headers = headers
+        # A tuple (headers, data) of a fetched feed that may be cached once it has been
+        # successfully processed or None if the feed should not be cached.
+        self.feed_entry = None
 
     def parse_into(self, tree=None):
         """
@@ -48,11 +102,15 @@ class HttpTelemetryParser(object):
         :return: Dictionary with parsed data
         """
 
-        try:
-            return self.parse_into_v3(tree)
-        except:
-            # We should also try to parse the legacy (v2) format
-            return self.parse_into_v2(tree)
+        data = self.fetch_data('/nodewatcher/feed')
+        if get_format(data) == 3:
+            return self.parse_v3(data, tree)
+
+        if self.data is None:
+            # The node does not provide the JSON feed, so fetch the legacy (v2) one.
+            data = self.fetch_data('/cgi-bin/nodewatcher')
+
+        return self.parse_v2(data, tree)
 
     def fetch_data(self, url):
         """
@@ -62,10 +120,19 @@ class HttpTelemetryParser(object):
         :return: Fetched data
         """
 
+        if self.error is not None:
+            raise self.error
+
         if self.data is not None:
             self.node_responds = True
+            if self.headers is not None and url == '/nodewatcher/feed':
+                self.feed_entry = (self.headers, self.data)
             return self.data
 
+        if replay.is_replaying():
+            # Only feeds fetched by the HTTPTelemetryPrefetch processor are replayed.
+            raise FailedToConnect
+
         # Create our own HTTP connection so we can use a successful TCP connection as
         # a signal that the node is up. We use a short timeout to see if we can establish
         # a connection.
@@ -85,53 +152,89 @@ class HttpTelemetryParser(object):
 
                 raise FailedToConnect
 
+            # Only the JSON feed is cached.
+            cacheable = self.cache_key is not None and url == '/nodewatcher/feed'
+            cached = telemetry_cache.feed_cache.get(self.cache_key) if cacheable else None
+
+            headers = {'Accept-Encoding': 'gzip'}
+            headers.update(telemetry_cache.get_conditional_headers(cached))
+
             try:
                 # A longer timeout to retrieve the data.
                 connection.sock.settimeout(getattr(settings, 'MONITOR_HTTP_POLL_READ_TIMEOUT', 15))
-                connection.request('GET', url)
-                return connection.getresponse().read()
+                connection.request('GET', url, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
             except (httplib.HTTPException, IOError):
                 raise FailedToFetchData
+
+            if response.status == 304 and cached:
+                # The feed has not changed since it has been cached.
+                self.not_modified = True
+                return cached['data']
+
+            data = decode_body(data, response.getheader('content-encoding'))
+            if cacheable and response.status == 200:
+                self.feed_entry = (dict(response.getheaders()), data)
+
+            return data
         finally:
             connection.close()
 
     def parse_into_v3(self, tree=None):
         """
-        Fetches and parses data from the daemon via HTTP (legacy feed).
+        Fetches and parses data from the daemon via HTTP (JSON feed).
 
         :param tree: Target dictionary where data should be parsed into
         :return: Dictionary with parsed data
         """
 
-        data = self.fetch_data('/nodewatcher/feed')
+        return self.parse_v3(self.fetch_data('/nodewatcher/feed'), tree)
 
-        try:
-            data = json.loads(data)
-        except ValueError:
-            raise FailedToParseData
+    def parse_v3(self, data, tree=None):
+        """
+        Parses data in the JSON (v3) format.
+
+        :param data: Raw data
+        :param tree: Target dictionary where data should be parsed into
+        :return: Dictionary with parsed data
+        """
 
         if tree is None:
             tree = {}
 
-        # Set version metadata to JSON (v3) format
-        tree['_meta'] = tree.__class__()
-        tree['_meta']['version'] = 3
+        # Objects are directly decoded into the same type as the target tree, so no
+        # further conversion of the decoded data is needed.
+        context_class = tree.__class__
 
-        # Convert data to nodewatcher context format
-        def convert_to_context(data):
-            result = tree.__class__()
-            for key, value in data.iteritems():
-                if isinstance(value, dict):
-                    value = convert_to_context(value)
+        def object_pairs_hook(pairs):
+            result = context_class()
+            dict.update(result, pairs)
+            return result
 
-                result[key] = value
+        try:
+            data = json.loads(data, object_pairs_hook=object_pairs_hook)
+        except ValueError:
+            raise FailedToParseData
 
-            return result
+        if not isinstance(data, dict):
+            raise FailedToParseData
+
+        # Set version metadata to JSON (v3) format
+        tree['_meta'] = context_class()
+        tree['_meta']['version'] = 3
+        tree['_meta']['modules'] = data.keys()
 
         for key, value in data.iteritems():
+            if '.' not in key:
+                tree[key] = value
+                continue
+
             key = key.split('.')
-            value = convert_to_context(value)
-            reduce(lambda x, y: x.setdefault(y, x.__class__()), key[:-1], tree)[key[-1]] = value
+            node = tree
+            for part in key[:-1]:
+                node = node.setdefault(part, context_class())
+            node[key[-1]] = value
 
         return tree
 
@@ -143,7 +246,16 @@ class HttpTelemetryParser(object):
         :return: Dictionary with parsed data
         """
 
-        data = self.fetch_data('/cgi-bin/nodewatcher')
+        return self.parse_v2(self.fetch_data('/cgi-bin/nodewatcher'), tree)
+
+    def parse_v2(self, data, tree=None):
+        """
+        Parses data in the legacy (v2) format.
+
+        :param data: Raw data
+        :param tree: Target dictionary where data should be parsed into
+        :return: Dictionary with parsed data
+        """
 
         if tree is None:
             tree = {}
@@ -0,0 +1,293 @@
+import errno
+import select
+import socket
+import time
+
+from . import cache as telemetry_cache, parser as telemetry_parser
+
+# Maximum number of bytes read from a socket at once
+READ_SIZE = 65536
+
+
+class FeedRequest(object):
+    """
+    State of a single non-blocking HTTP telemetry request.
+    """
+
+    def __init__(self, key, host, port, path, cached=None):
+        """
+        Class constructor.
+
+        :param key: Key under which the result will be stored
+        :param host: Target host
+        :param port: Target port
+        :param path: Requested path
+        :param cached: Optional cached feed entry used to make the request conditional
+        """
+
+        self.key = key
+        self.host = host
+        self.port = port
+        self.path = path
+        self.cached = cached
+        self.socket = None
+        self.deadline = None
+        self.connected = False
+        self.request = None
+        self.response = []
+
+        # Result attributes.
+        self.node_responds = False
+        self.error = None
+        self.status = None
+        self.headers = {}
+        self.data = None
+        self.not_modified = False
+
+    def get_request(self):
+        """
+        Returns the raw HTTP request that should be sent to the node.
+        """
+
+        headers = {
+            'Host': self.host,
+            'Connection': 'close',
+            'Accept-Encoding': 'gzip',
+        }
+        headers.update(telemetry_cache.get_conditional_headers(self.cached))
+
+        return 'GET %s HTTP/1.0\r\n%s\r\n\r\n' % (
+            self.path,
+            '\r\n'.join(['%s: %s' % (name, value) for name, value in sorted(headers.items())]),
+        )
+
+    def start(self, connect_timeout):
+        """
+        Starts connecting to the node.
+
+        :param connect_timeout: Connect timeout in seconds
+        """
+
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setblocking(0)
+        self.deadline = time.time() + connect_timeout
+
+        result = self.socket.connect_ex((self.host, self.port))
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, errno.EISCONN):
+            self.connect_failed(result)
+
+    def connect_failed(self, error):
+        """
+        Marks the connection attempt as failed.
+
+        :param error: Error number
+        """
+
+        # Receiving a TCP RST is also a response.
+        if error in (errno.ECONNREFUSED, errno.ECONNRESET):
+            self.node_responds = True
+
+        self.fail(telemetry_parser.FailedToConnect)
+
+    def connect_finished(self, read_timeout):
+        """
+        Called when the socket becomes writable while connecting.
+
+        :param read_timeout: Read timeout in seconds
+        """
+
+        error = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self.connect_failed(error)
+            return
+
+        self.connected = True
+        self.node_responds = True
+        self.request = self.get_request()
+        self.deadline = time.time() + read_timeout
+
+    def write(self):
+        """
+        Sends (part of) the request.
+        """
+
+        try:
+            sent = self.socket.send(self.request)
+        except socket.error:
+            self.fail(telemetry_parser.FailedToFetchData)
+            return
+
+        self.request = self.request[sent:]
+
+    def read(self):
+        """
+        Reads (part of) the response.
+        """
+
+        try:
+            chunk = self.socket.recv(READ_SIZE)
+        except socket.error as error:
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+
+            self.fail(telemetry_parser.FailedToFetchData)
+            return
+
+        if chunk:
+            self.response.append(chunk)
+        else:
+            self.finish()
+
+    def finish(self):
+        """
+        Parses the response once the node has closed the connection.
+        """
+
+        self.close()
+
+        response = ''.join(self.response)
+        self.response = []
+        try:
+            head, body = response.split('\r\n\r\n', 1)
+            lines = head.split('\r\n')
+            self.status = int(lines[0].split(None, 2)[1])
+            for line in lines[1:]:
+                name, value = line.split(':', 1)
+                self.headers[name.strip().lower()] = value.strip()
+        except (ValueError, IndexError):
+            self.fail(telemetry_parser.FailedToFetchData)
+            return
+
+        if self.status == 304 and self.cached:
+            # The feed has not changed since it has been cached.
+            self.not_modified = True
+            self.data = self.cached['data']
+            return
+
+        try:
+            self.data = telemetry_parser.decode_body(body, self.headers.get('content-encoding', None))
+        except telemetry_parser.FailedToFetchData as error:
+            self.fail(error.__class__)
+
+    def fail(self, error):
+        """
+        Marks the request as failed.
+
+        :param error: Telemetry parser failure class
+        """
+
+        self.error = error
+        self.close()
+
+    def close(self):
+        """
+        Closes the socket.
+        """
+
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    @property
+    def done(self):
+        return self.socket is None
+
+
+class HttpTelemetryPoller(object):
+    """
+    Fetches HTTP telemetry from many nodes concurrently, using non-blocking sockets
+    driven by a single event loop.
+    """
+
+    request_class = FeedRequest
+
+    def __init__(self, connect_timeout, read_timeout, concurrency):
+        """
+        Class constructor.
+
+        :param connect_timeout: Connect timeout in seconds
+        :param read_timeout: Timeout for receiving the whole response in seconds
+        :param concurrency: Maximum number of connections in flight
+        """
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.concurrency = concurrency
+
+    def fetch(self, targets, path='/nodewatcher/feed', cached=None):
+        """
+        Fetches the given path from all targets.
+
+        :param targets: A dictionary mapping keys to (host, port) tuples
+        :param path: Requested path
+        :param cached: Optional dictionary mapping keys to cached feed entries; requests
+          for these keys are conditional
+        :return: A dictionary mapping keys to completed `FeedRequest` instances
+        """
+
+        if cached is None:
+            cached = {}
+
+        pending = [
+            self.request_class(key, host, port, path, cached.get(key, None))
+            for key, (host, port) in targets.iteritems()
+        ]
+        pending.reverse()
+        active = {}
+        results = {}
+        poll = select.poll()
+
+        while pending or active:
+            # Start new connections until the concurrency limit is reached.
+            while pending and len(active) < self.concurrency:
+                request = pending.pop()
+                request.start(self.connect_timeout)
+                if request.done:
+                    results[request.key] = request
+                    continue
+
+                active[request.socket.fileno()] = request
+                poll.register(request.socket, select.POLLOUT)
+
+            timeout = max(0, min(request.deadline for request in active.itervalues()) - time.time()) if active else 0
+            try:
+                events = poll.poll(timeout * 1000)
+            except select.error as error:
+                if error.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd, event in events:
+                request = active[fd]
+                if not request.connected:
+                    request.connect_finished(self.read_timeout)
+                    if not request.done:
+                        poll.modify(fd, select.POLLOUT | select.POLLIN)
+                elif event & select.POLLOUT and request.request:
+                    request.write()
+                    if not request.done and not request.request:
+                        poll.modify(fd, select.POLLIN)
+                else:
+                    request.read()
+
+                if request.done:
+                    poll.unregister(fd)
+                    del active[fd]
+                    results[request.key] = request
+
+            # Abort requests that have exceeded their deadline.
+            now = time.time()
+            for fd, request in active.items():
+                if request.deadline > now:
+                    continue
+
+                poll.unregister(fd)
+                del active[fd]
+                if request.connected:
+                    request.fail(telemetry_parser.FailedToFetchData)
+                else:
+                    request.fail(telemetry_parser.FailedToConnect)
+                results[request.key] = request
+
+        return results
@@ -1,7 +1,12 @@
+import hashlib
+import json
+
+from django.conf import settings
+
 from nodewatcher.core import models as core_models
-from nodewatcher.core.monitor import processors as monitor_processors, events as monitor_events
+from nodewatcher.core.monitor import processors as monitor_processors, events as monitor_events, replay
 
-from . import parser as telemetry_parser
+from . import cache as telemetry_cache, parser as telemetry_parser, poller as telemetry_poller, push as monitor_push
 
 
 class HTTPTelemetryContext(monitor_processors.ProcessorContext):
@@ -54,6 +59,67 @@ class HTTPTelemetryContext(monitor_processors.ProcessorContext):
 
         return 0
 
+    def module_changed(self, module):
+        """
+        Returns True when a telemetry module may have changed since the telemetry
+        of this node has last been successfully processed.
+
+        :param module: Module name (dot-separated namespace)
+        """
+
+        if not self.get('successfully_parsed', False) or self._meta.version != 3:
+            return True
+
+        previous_hashes = self._meta.get('previous_module_hashes', None)
+        if not previous_hashes:
+            return True
+
+        return previous_hashes.get(module, None) != self._meta.module_hashes.get(module, None)
+
+
+def get_module_hashes(tree):
+    """
+    Computes a hash of each telemetry module in a parsed JSON (v3) feed.
+
+    :param tree: Parsed telemetry
+    :return: A dictionary mapping module names to hashes
+    """
+
+    hashes = {}
+    for module in tree._meta.modules:
+        data = reduce(lambda x, y: x[y], module.split('.'), tree)
+        hashes[module] = hashlib.sha1(json.dumps(data, sort_keys=True, separators=(',', ':'))).hexdigest()
+
+    return hashes
+
+
+def depends_on_modules(*modules):
+    """
+    A decorator for the process method of node processors which only need to run
+    when at least one of the given telemetry modules has changed since the telemetry
+    of the node has last been successfully processed. Otherwise the `process_unchanged`
+    method of the processor is called instead, when it is defined.
+
+    Module hashes are only tracked when `MONITOR_HTTP_POLL_CACHE` is configured and
+    the `StoreModuleHashes` processor is part of the run.
+    """
+
+    def decorator(f):
+        def wrapper(self, context, node, *args, **kwargs):
+            http_context = context.get('http', None)
+            if not isinstance(http_context, HTTPTelemetryContext) or any([http_context.module_changed(module) for module in modules]):
+                return f(self, context, node, *args, **kwargs)
+
+            process_unchanged = getattr(self, 'process_unchanged', None)
+            if process_unchanged is None:
+                return context
+
+            return process_unchanged(context, node)
+
+        return wrapper
+
+    return decorator
+
 
 class HTTPTelemetry(monitor_processors.NodeProcessor):
     """
@@ -62,6 +128,8 @@ class HTTPTelemetry(monitor_processors.NodeProcessor):
     individual modules in their store/analyze methods.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -87,19 +155,29 @@ class HTTPTelemetry(monitor_processors.NodeProcessor):
 
         http_context = context.create('http', HTTPTelemetryContext)
         http_context.successfully_parsed = False
+        http_context.not_modified = False
 
         # If the node is not marked as available, we should skip telemetry parsing
         if not node_available:
             return context
 
-        if not push:
+        if not push and context.http_prefetch:
+            # Telemetry has already been fetched by the HTTPTelemetryPrefetch processor.
+            parser = telemetry_parser.HttpTelemetryParser(
+                data=context.http_prefetch.data,
+                error=context.http_prefetch.error,
+                node_responds=context.http_prefetch.node_responds,
+                not_modified=context.http_prefetch.not_modified,
+                headers=context.http_prefetch.headers,
+            )
+        elif not push:
             try:
                 router_id = node.config.core.routerid(queryset=True).filter(rid_family='ipv4')[0].router_id
             except IndexError:
                 # No router-id for this node can be found for IPv4.
                 pass
 
-            parser = telemetry_parser.HttpTelemetryParser(router_id, 80)
+            parser = telemetry_parser.HttpTelemetryParser(router_id, 80, cache_key=node.pk)
         else:
             parser = telemetry_parser.HttpTelemetryParser(data=context.push.data)
 
@@ -110,8 +188,20 @@ class HTTPTelemetry(monitor_processors.NodeProcessor):
                 # TODO: Add a warning that the node is using a legacy feed
                 pass
             http_context.successfully_parsed = True
+            # Processors may use this flag to skip storing data that has not changed.
+            http_context.not_modified = parser.not_modified
             context.node_responds = True
 
+            if http_context._meta.version == 3 and telemetry_cache.feed_cache.get_cache() is not None:
+                if parser.feed_entry is not None:
+                    # The feed is only cached by StoreModuleHashes once all processors have succeeded, so
+                    # that a feed which has failed to be processed is fetched and processed again.
+                    http_context._meta.feed_entry = parser.feed_entry
+
+                # Hashes are used to determine which modules have changed since the last run.
+                http_context._meta.module_hashes = get_module_hashes(http_context)
+                http_context._meta.previous_module_hashes = telemetry_cache.feed_cache.get_module_hashes(node.pk)
+
             # Remove the warning if it is present.
             if hasattr(node.config.core.general(), 'router'):
                 monitor_events.TelemetryProcessingFailed(node, method='http').absent()
@@ -127,10 +217,98 @@ class HTTPTelemetry(monitor_processors.NodeProcessor):
         return context
 
 
+class StoreModuleHashes(monitor_processors.NodeProcessor):
+    """
+    Caches the processed feed together with its HTTP validators and stores hashes
+    of telemetry modules, so that the next fetch can be conditional and processors
+    can skip modules that have not changed in the next run. Must be placed after all
+    processors that use HTTP telemetry, as nothing is stored unless all of them
+    have succeeded.
+    """
+
+    thread_safe = True
+
+    @monitor_processors.depends_on_context('http', HTTPTelemetryContext)
+    def process(self, context, node):
+        """
+        Called for every processed node.
+
+        :param context: Current context
+        :param node: Node that is being processed
+        :return: A (possibly) modified context
+        """
+
+        feed_entry = context.http._meta.get('feed_entry', None)
+        if feed_entry is not None:
+            headers, data = feed_entry
+            telemetry_cache.feed_cache.set(node.pk, headers, data)
+
+        module_hashes = context.http._meta.get('module_hashes', None)
+        if module_hashes and module_hashes != context.http._meta.get('previous_module_hashes', None):
+            telemetry_cache.feed_cache.set_module_hashes(node.pk, module_hashes)
+
+        return context
+
+
+class HTTPTelemetryPrefetch(monitor_processors.NetworkProcessor):
+    """
+    Fetches HTTP telemetry of all polled nodes concurrently, so that the
+    `HTTPTelemetry` processor only needs to parse the already fetched data.
+    """
+
+    requires_transaction = False
+
+    def process(self, context, nodes):
+        """
+        Performs network-wide processing and selects the nodes that will be processed
+        in any following processors. Context is passed between network processors.
+
+        :param context: Current context
+        :param nodes: A set of nodes that are to be processed
+        :return: A (possibly) modified context and a (possibly) modified set of nodes
+        """
+
+        targets = {}
+        for node in core_models.Node.objects.regpoint('config').registry_fields(
+            source='core.telemetry.http__source',
+            router_ids='core.routerid[rid_family="ipv4"]__router_id',
+        ).filter(pk__in=[node.pk for node in nodes], source='poll'):
+            for router_id in node.router_ids.all():
+                targets[node.pk] = (str(router_id), 80)
+                break
+
+        self.logger.info("Fetching telemetry from %d nodes..." % len(targets))
+        poller = telemetry_poller.HttpTelemetryPoller(
+            connect_timeout=getattr(settings, 'MONITOR_HTTP_POLL_CONNECT_TIMEOUT', 2),
+            read_timeout=getattr(settings, 'MONITOR_HTTP_POLL_READ_TIMEOUT', 15),
+            concurrency=getattr(settings, 'MONITOR_HTTP_POLL_CONCURRENCY', 1000),
+        )
+
+        # Previously fetched feeds are only requested again when they have been modified.
+        cached = telemetry_cache.feed_cache.get_many(targets.keys())
+
+        requests = replay.capture_many('http', targets.keys(), lambda: poller.fetch(targets, cached=cached))
+        for node_pk, request in requests.iteritems():
+            if request.error is None and request.status != 200 and not request.not_modified:
+                # The node does not provide the feed (it may be using the legacy format), so
+                # leave fetching and parsing to the HTTPTelemetry processor.
+                continue
+
+            prefetch = context.for_node[node_pk].http_prefetch
+            # Fetched feeds are only cached after they have been processed.
+            prefetch.headers = request.headers if request.error is None and request.status == 200 else None
+            prefetch.data = request.data
+            prefetch.error = request.error
+            prefetch.node_responds = request.node_responds
+            prefetch.not_modified = request.not_modified
+
+        return context, nodes
+
+
 class HTTPGetPushedNode(monitor_processors.NetworkProcessor):
     """
-    A processor that populates the nodes set with the node that is set as the push
-    source in the context.
+    A processor that populates the nodes set with the nodes that are set as push
+    sources in the context.
     """
 
     def process(self, context, nodes):
@@ -143,18 +321,32 @@ class HTTPGetPushedNode(monitor_processors.NetworkProcessor):
         :return: A (possibly) modified context and a (possibly) modified set of nodes
         """
 
-        if context.push.source:
-            # Fetch a node based on the UUID set in the context and add it to the set.
-            try:
-                node = core_models.Node.objects.get(uuid=context.push.source)
-                telemetry_source = node.config.core.telemetry.http()
-                if not telemetry_source or telemetry_source.source != 'push':
-                    # If the node is not configured to push, we ignore it.
-                    self.logger.error("Node '%s' not configured to push." % context.push.source)
-                    return context, nodes
-
-                nodes.add(node)
-            except core_models.Node.DoesNotExist:
-                self.logger.error("Node with UUID '%s' does not exist." % context.push.source)
+        pushes = monitor_push.get_pushes(context)
+        if not pushes:
+            return context, nodes
+
+        # Fetch nodes based on the UUIDs set in the context and add them to the set.
+        missing = set(pushes.keys())
+        for node in core_models.Node.objects.regpoint('config').registry_fields(
+            source='core.telemetry.http__source',
+        ).filter(uuid__in=pushes.keys()):
+            missing.discard(node.uuid)
+            if node.source != 'push':
+                # If the node is not configured to push, we ignore it.
+                self.logger.error("Node '%s' not configured to push." % node.uuid)
+                continue
+
+            if 'pushes' in context:
+                # Pushes are processed in a batch, so each node only gets its own push.
+                context.for_node[node.pk].merge_with(pushes[node.uuid])
+
+            nodes.add(node)
+
+        for source in missing:
+            self.logger.error("Node with UUID '%s' does not exist." % source)
+
+        if 'pushes' in context:
+            # Push data is now only kept in per-node contexts.
+            del context['pushes']
 
         return context, nodes
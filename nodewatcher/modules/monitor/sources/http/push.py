@@ -0,0 +1,87 @@
+import cPickle
+
+from django.conf import settings
+
+import redis
+
+# Prefix of keys used to store pending pushes.
+KEY_PREFIX = 'nodewatcher.monitor.push'
+# Minimum number of seconds after which a lost batch is rescheduled.
+SCHEDULE_EXPIRY = 60
+
+
+class PushQueue(object):
+    """
+    Collects pushes that arrive within a short window, so they may be processed
+    in a single batch. Pending pushes are keyed by node UUID, so when a node
+    pushes multiple times within the same window, only its newest push is kept.
+    """
+
+    def __init__(self, run, window):
+        """
+        Class constructor.
+
+        :param run: Identifier of the monitoring run that handles pushes
+        :param window: Number of seconds that pushes are collected for
+        """
+
+        self.run = run
+        self.window = window
+        self.redis = redis.StrictRedis.from_url(
+            getattr(settings, 'MONITOR_HTTP_PUSH_BATCH_REDIS', None) or settings.BROKER_URL
+        )
+
+    @property
+    def pending_key(self):
+        return '%s.%s.pending' % (KEY_PREFIX, self.run)
+
+    @property
+    def scheduled_key(self):
+        return '%s.%s.scheduled' % (KEY_PREFIX, self.run)
+
+    def add(self, source, context):
+        """
+        Adds a push to the queue.
+
+        :param source: UUID of the pushing node
+        :param context: Base context of the push
+        :return: True if a batch should be scheduled to process the push
+        """
+
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self.pending_key, source, cPickle.dumps(context, cPickle.HIGHEST_PROTOCOL))
+        # In case the batch task is lost, the flag expires and a new batch is scheduled.
+        pipeline.set(self.scheduled_key, '1', nx=True, ex=max(int(self.window * 10), SCHEDULE_EXPIRY))
+        return bool(pipeline.execute()[1])
+
+    def take(self):
+        """
+        Removes all pending pushes from the queue. Pushes added afterwards are
+        processed by the next batch.
+
+        :return: A dictionary of push contexts keyed by node UUID
+        """
+
+        pipeline = self.redis.pipeline()
+        pipeline.delete(self.scheduled_key)
+        pipeline.hgetall(self.pending_key)
+        pipeline.delete(self.pending_key)
+        pending = pipeline.execute()[1]
+
+        return dict([(source, cPickle.loads(context)) for source, context in pending.iteritems()])
+
+
+def get_pushes(context):
+    """
+    Returns all pushes that are being processed.
+
+    :param context: Current context
+    :return: A dictionary of push contexts keyed by node UUID
+    """
+
+    if 'pushes' in context:
+        return context.pushes
+    elif context.push.source:
+        return {context.push.source: context}
+
+    return {}
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from celery.task import task as celery_task
+
+from nodewatcher.core.monitor import tasks as monitor_tasks
+
+from . import push as monitor_push
+
+
+@celery_task(bind=True)
+def process_push_batch(self, run_id):
+    """
+    Processes all pushes that have been collected since the batch has been
+    scheduled.
+
+    :param run_id: Monitoring run identifier
+    """
+
+    queue = monitor_push.PushQueue(run_id, getattr(settings, 'MONITOR_HTTP_PUSH_BATCH_WINDOW', None))
+    pushes = queue.take()
+    if not pushes:
+        return
+
+    monitor_tasks.run_pipeline(
+        run_id=run_id,
+        base_context={'pushes': pushes},
+        fan_out=getattr(settings, 'MONITOR_HTTP_PUSH_BATCH_CHUNK_SIZE', 50),
+    )
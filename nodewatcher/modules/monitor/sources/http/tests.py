@@ -1,6 +1,15 @@
+import gzip
+import socket
+import StringIO
+import threading
 import unittest
 
-from . import parser
+from django import test
+from django.test import client, utils
+
+from nodewatcher.core.monitor import tasks as monitor_tasks
+
+from . import cache, parser, poller, push, tasks, views
 
 
 class TestContext(dict):
@@ -70,3 +79,276 @@ general.buffers: 1788
         self.assertEquals(tree['core']['general']['uuid'], '64840ad9-aac1-4494-b4d1-9de5d8cbedd9')
 
         self.assertEquals(tree['_meta']['version'], 3)
+        self.assertItemsEqual(tree['_meta']['modules'], ['core.general', 'core.interfaces', 'core.resources', 'core.wireless'])
+
+    def test_parser_format_detection(self):
+        self.assertEquals(parser.get_format('  { "core.general": {} }'), 3)
+        self.assertEquals(parser.get_format('; comment\nMETA.version: 2'), 2)
+
+        p = parser.HttpTelemetryParser(data='{ "core.general": { "interfaces": [ { "name": "lo" } ], "uptime": 962 }, "flat": 1 }')
+        tree = TestContext()
+        p.parse_into(tree)
+
+        self.assertIsInstance(tree['core']['general']['interfaces'][0], TestContext)
+        self.assertEquals(tree['core']['general']['uptime'], 962)
+        self.assertEquals(tree['flat'], 1)
+
+        # Malformed JSON feeds must not be parsed as legacy feeds.
+        p = parser.HttpTelemetryParser(data='{ "core.general": { "uptime": 962 }')
+        self.assertRaises(parser.FailedToParseData, p.parse_into, TestContext())
+
+
+class HttpPollerTestCase(unittest.TestCase):
+    def serve(self, response, count):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(count)
+
+        def handler():
+            for _ in xrange(count):
+                client, _ = server.accept()
+                request = ''
+                while '\r\n\r\n' not in request:
+                    request += client.recv(1024)
+                client.sendall(response)
+                client.close()
+            server.close()
+
+        thread = threading.Thread(target=handler)
+        thread.daemon = True
+        thread.start()
+        return server.getsockname()[1]
+
+    def test_fetch(self):
+        port = self.serve('HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n{"core.general": {}}', 2)
+
+        # Obtain a port that nobody is listening on.
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+
+        results = poller.HttpTelemetryPoller(connect_timeout=2, read_timeout=2, concurrency=1).fetch({
+            'a': ('127.0.0.1', port),
+            'b': ('127.0.0.1', port),
+            'c': ('127.0.0.1', closed_port),
+        })
+
+        for key in ('a', 'b'):
+            self.assertIsNone(results[key].error)
+            self.assertTrue(results[key].node_responds)
+            self.assertEqual(results[key].status, 200)
+            self.assertEqual(results[key].headers['content-type'], 'application/json')
+            self.assertEqual(results[key].data, '{"core.general": {}}')
+
+        self.assertIs(results['c'].error, parser.FailedToConnect)
+        self.assertTrue(results['c'].node_responds)
+        self.assertIsNone(results['c'].data)
+
+    def test_compressed_fetch(self):
+        buf = StringIO.StringIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as feed:
+            feed.write('{"core.general": {}}')
+        port = self.serve('HTTP/1.0 200 OK\r\nContent-Encoding: gzip\r\nETag: "1"\r\n\r\n' + buf.getvalue(), 1)
+
+        results = poller.HttpTelemetryPoller(connect_timeout=2, read_timeout=2, concurrency=1).fetch({
+            'a': ('127.0.0.1', port),
+        })
+
+        self.assertIsNone(results['a'].error)
+        self.assertFalse(results['a'].not_modified)
+        self.assertEqual(results['a'].headers['etag'], '"1"')
+        self.assertEqual(results['a'].data, '{"core.general": {}}')
+
+    def test_conditional_fetch(self):
+        port = self.serve('HTTP/1.0 304 Not Modified\r\nETag: "1"\r\n\r\n', 1)
+
+        cached = {'etag': '"1"', 'last_modified': None, 'data': '{"core.general": {}}'}
+        request = poller.FeedRequest('a', '127.0.0.1', port, '/nodewatcher/feed', cached)
+        self.assertIn('If-None-Match: "1"', request.get_request())
+        self.assertNotIn('If-Modified-Since', request.get_request())
+
+        results = poller.HttpTelemetryPoller(connect_timeout=2, read_timeout=2, concurrency=1).fetch(
+            {'a': ('127.0.0.1', port)},
+            cached={'a': cached},
+        )
+
+        self.assertIsNone(results['a'].error)
+        self.assertTrue(results['a'].not_modified)
+        self.assertEqual(results['a'].data, cached['data'])
+
+    def test_feed_cached_after_processing(self):
+        port = self.serve('HTTP/1.0 200 OK\r\nETag: "2"\r\n\r\n{"core.general": {}}', 1)
+
+        with utils.override_settings(
+            CACHES={'feeds': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            MONITOR_HTTP_POLL_CACHE='feeds',
+        ):
+            p = parser.HttpTelemetryParser('127.0.0.1', port, cache_key='a')
+            p.parse_into({})
+
+            # Feeds are only cached once all processors have succeeded.
+            self.assertIsNone(cache.feed_cache.get('a'))
+            headers, data = p.feed_entry
+            self.assertEqual(headers['etag'], '"2"')
+            self.assertEqual(data, '{"core.general": {}}')
+
+    def test_prefetched_feed_entry(self):
+        p = parser.HttpTelemetryParser(data='{"core.general": {}}', headers={'etag': '"1"'})
+        p.parse_into({})
+        self.assertEqual(p.feed_entry, ({'etag': '"1"'}, '{"core.general": {}}'))
+
+        # Feeds that are not modified are already cached.
+        p = parser.HttpTelemetryParser(data='{"core.general": {}}', not_modified=True)
+        p.parse_into({})
+        self.assertIsNone(p.feed_entry)
+
+    def test_prefetched_failure(self):
+        p = parser.HttpTelemetryParser(error=parser.FailedToConnect, node_responds=True)
+        self.assertRaises(parser.HttpTelemetryParseFailed, p.parse_into, {})
+        self.assertTrue(p.node_responds)
+
+
+class TestRedis(object):
+    """
+    A stand-in for a Redis server that supports the commands used by push queues.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return TestPipeline(self)
+
+
+class TestPipeline(object):
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def hset(self, key, field, value):
+        self.commands.append(lambda data: data.setdefault(key, {}).__setitem__(field, value))
+
+    def hgetall(self, key):
+        self.commands.append(lambda data: dict(data.get(key, {})))
+
+    def set(self, key, value, nx=False, ex=None):
+        def command(data):
+            if nx and key in data:
+                return None
+
+            data[key] = value
+            return True
+
+        self.commands.append(command)
+
+    def delete(self, key):
+        self.commands.append(lambda data: int(data.pop(key, None) is not None))
+
+    def execute(self):
+        return [command(self.server.data) for command in self.commands]
+
+
+class TaskRecorder(object):
+    """
+    A stand-in for a task that records its invocations.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def delay(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def apply_async(self, kwargs, countdown=None):
+        self.calls.append((kwargs, countdown))
+
+
+@utils.override_settings(
+    MONITOR_HTTP_PUSH_RUN='telemetry-push',
+    MONITOR_HTTP_PUSH_BATCH_REDIS='redis://localhost/0',
+    MONITOR_HTTP_PUSH_BATCH_CHUNK_SIZE=50,
+)
+class HttpPushBatchTestCase(test.SimpleTestCase):
+    def setUp(self):
+        server = self.server = TestRedis()
+
+        class StrictRedis(object):
+            @classmethod
+            def from_url(cls, url):
+                return server
+
+        self._strict_redis = push.redis.StrictRedis
+        push.redis.StrictRedis = StrictRedis
+
+        self.process_push_batch = tasks.process_push_batch
+        self.batches = tasks.process_push_batch = TaskRecorder()
+        self._run_pipeline = monitor_tasks.run_pipeline
+        self.pipelines = monitor_tasks.run_pipeline = TaskRecorder()
+
+    def tearDown(self):
+        push.redis.StrictRedis = self._strict_redis
+        tasks.process_push_batch = self.process_push_batch
+        monitor_tasks.run_pipeline = self._run_pipeline
+
+    def push(self, uuid, data):
+        request = client.RequestFactory().post('/push/http/%s' % uuid, data, content_type='application/json')
+        response = views.HttpPushEndpoint.as_view()(request, uuid=uuid)
+        self.assertEqual(response.status_code, 200)
+
+    def test_queue(self):
+        queue = push.PushQueue('telemetry-push', 5)
+        self.assertEqual(queue.take(), {})
+
+        # Only the first push schedules a batch.
+        self.assertTrue(queue.add('a', {'push': {'data': '1'}}))
+        self.assertFalse(queue.add('b', {'push': {'data': '2'}}))
+        # Repeated pushes are coalesced to the newest one.
+        self.assertFalse(queue.add('a', {'push': {'data': '3'}}))
+
+        self.assertEqual(queue.take(), {'a': {'push': {'data': '3'}}, 'b': {'push': {'data': '2'}}})
+        self.assertEqual(queue.take(), {})
+        # Pushes after the batch has been taken schedule a new batch.
+        self.assertTrue(queue.add('a', {'push': {'data': '4'}}))
+
+        # Queues of different runs are independent.
+        self.assertTrue(push.PushQueue('telemetry-other', 5).add('a', {}))
+
+    @utils.override_settings(MONITOR_HTTP_PUSH_BATCH_WINDOW=5)
+    def test_batch(self):
+        self.push('a', '{"v": 1}')
+        self.push('b', '{"v": 2}')
+        self.push('a', '{"v": 3}')
+
+        # One batch task is scheduled per window.
+        self.assertEqual(self.batches.calls, [({'run_id': 'telemetry-push'}, 5)])
+        self.assertEqual(self.pipelines.calls, [])
+
+        self.process_push_batch('telemetry-push')
+        self.assertEqual(len(self.pipelines.calls), 1)
+        call = self.pipelines.calls[0]
+        self.assertEqual(call['run_id'], 'telemetry-push')
+        self.assertEqual(call['fan_out'], 50)
+        pushes = call['base_context']['pushes']
+        self.assertItemsEqual(pushes.keys(), ['a', 'b'])
+        self.assertEqual(pushes['a']['push']['data'], '{"v": 3}')
+        self.assertEqual(pushes['b']['push']['data'], '{"v": 2}')
+
+        # Empty batches are not processed.
+        self.process_push_batch('telemetry-push')
+        self.assertEqual(len(self.pipelines.calls), 1)
+
+        # The next push schedules a new batch.
+        self.push('a', '{"v": 4}')
+        self.assertEqual(len(self.batches.calls), 2)
+
+    @utils.override_settings(MONITOR_HTTP_PUSH_BATCH_WINDOW=None)
+    def test_without_batching(self):
+        self.push('a', '{"v": 1}')
+        self.push('a', '{"v": 2}')
+
+        self.assertEqual(self.batches.calls, [])
+        self.assertEqual([call['base_context']['push']['data'] for call in self.pipelines.calls], ['{"v": 1}', '{"v": 2}'])
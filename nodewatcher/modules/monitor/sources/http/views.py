@@ -7,7 +7,7 @@ from django.utils import decorators, timezone
 from nodewatcher.core.monitor import tasks as monitor_tasks
 from nodewatcher.utils import datastructures
 
-from . import signals
+from . import push as monitor_push, signals, tasks as http_tasks
 
 
 class HttpPushEndpoint(generic.View):
@@ -46,10 +46,20 @@ class HttpPushEndpoint(generic.View):
 
             datastructures.merge_dict(context, extracted_context)
 
-        # Schedule a new push task.
-        monitor_tasks.run_pipeline.delay(
-            run_id=settings.MONITOR_HTTP_PUSH_RUN,
-            base_context=context,
-        )
+        window = getattr(settings, 'MONITOR_HTTP_PUSH_BATCH_WINDOW', None)
+        if window:
+            # Queue the push and schedule a batch unless one is already pending.
+            queue = monitor_push.PushQueue(settings.MONITOR_HTTP_PUSH_RUN, window)
+            if queue.add(uuid, context):
+                http_tasks.process_push_batch.apply_async(
+                    kwargs={'run_id': settings.MONITOR_HTTP_PUSH_RUN},
+                    countdown=window,
+                )
+        else:
+            # Schedule a new push task.
+            monitor_tasks.run_pipeline.delay(
+                run_id=settings.MONITOR_HTTP_PUSH_RUN,
+                base_context=context,
+            )
 
         return http.JsonResponse({'status': 'ok'})
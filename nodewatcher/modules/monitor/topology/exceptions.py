@@ -12,3 +12,7 @@ class TopologyAttributeAlreadyRegistered(TopologyAttributeException):
 
 class TopologyAttributeNotRegistered(TopologyAttributeException):
     pass
+
+
+class TopologyNotAvailable(Exception):
+    pass
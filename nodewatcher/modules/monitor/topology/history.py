@@ -0,0 +1,154 @@
+import calendar
+import datetime
+
+from django_datastream import datastream
+
+from . import exceptions
+
+
+def get_edge_key(edge):
+    """
+    Returns a key that identifies an edge in the topology graph.
+
+    :param edge: Edge dictionary
+    """
+
+    return (edge['f'], edge['t'], edge.get('proto', None))
+
+
+def diff(previous, current):
+    """
+    Computes changes between two topology graphs.
+
+    :param previous: Previous topology graph
+    :param current: Current topology graph
+    :return: A delta dictionary or None when the graphs are the same
+    """
+
+    previous_vertices = dict([(vertex['i'], vertex) for vertex in previous['v']])
+    current_vertices = dict([(vertex['i'], vertex) for vertex in current['v']])
+    previous_edges = dict([(get_edge_key(edge), edge) for edge in previous['e']])
+    current_edges = dict([(get_edge_key(edge), edge) for edge in current['e']])
+
+    delta = {
+        # Added or modified vertices.
+        'v+': [vertex for key, vertex in current_vertices.iteritems() if previous_vertices.get(key) != vertex],
+        # Identifiers of removed vertices.
+        'v-': [key for key in previous_vertices if key not in current_vertices],
+        # Added or modified edges.
+        'e+': [edge for key, edge in current_edges.iteritems() if previous_edges.get(key) != edge],
+        # Keys of removed edges.
+        'e-': [list(key) for key in previous_edges if key not in current_edges],
+    }
+
+    if not any(delta.values()):
+        return None
+
+    return delta
+
+
+def apply_delta(graph, delta):
+    """
+    Applies changes to a topology graph.
+
+    :param graph: Topology graph
+    :param delta: Delta dictionary as returned by `diff`
+    :return: Updated topology graph
+    """
+
+    vertices = dict([(vertex['i'], vertex) for vertex in graph['v']])
+    edges = dict([(get_edge_key(edge), edge) for edge in graph['e']])
+
+    for key in delta.get('v-', []):
+        vertices.pop(key, None)
+    for vertex in delta.get('v+', []):
+        vertices[vertex['i']] = vertex
+    for key in delta.get('e-', []):
+        edges.pop(tuple(key), None)
+    for edge in delta.get('e+', []):
+        edges[get_edge_key(edge)] = edge
+
+    return {
+        'v': vertices.values(),
+        'e': edges.values(),
+    }
+
+
+def _find_stream(name):
+    """
+    Returns the topology stream with the given name.
+
+    :param name: Stream (field) name
+    """
+
+    streams = datastream.find_streams({'module': 'topology', 'name': name})
+    if not streams:
+        return None
+
+    return streams[0]
+
+
+def get_latest_timestamp():
+    """
+    Returns the UNIX timestamp of the latest stored snapshot or delta or None
+    when nothing has been stored yet.
+    """
+
+    timestamps = []
+    for name in ('topology', 'topology_delta'):
+        stream = _find_stream(name)
+        if stream is not None and stream['latest_datapoint'] is not None:
+            timestamps.append(calendar.timegm(stream['latest_datapoint'].utctimetuple()))
+
+    if not timestamps:
+        return None
+
+    return max(timestamps)
+
+
+def get_topology(at=None):
+    """
+    Rebuilds the network topology graph at the specified time from the latest
+    full snapshot before that time and all deltas stored after the snapshot.
+
+    :param at: Optional datetime object, defaults to now
+    :return: A tuple (graph, timestamp), where timestamp is the time of the
+      latest change that has been applied
+    """
+
+    if at is None:
+        at = datetime.datetime.utcnow()
+
+    snapshot_stream = _find_stream('topology')
+    if snapshot_stream is None or snapshot_stream['earliest_datapoint'] is None:
+        raise exceptions.TopologyNotAvailable("No topology has been stored yet.")
+
+    try:
+        snapshot = datastream.get_data(
+            stream_id=snapshot_stream['stream_id'],
+            granularity=snapshot_stream['highest_granularity'],
+            start=snapshot_stream['earliest_datapoint'],
+            end=at,
+            reverse=True,
+        )[0]
+    except IndexError:
+        raise exceptions.TopologyNotAvailable("No topology has been stored before '%s'." % at)
+
+    graph = snapshot['v']
+    timestamp = snapshot['t']
+
+    delta_stream = _find_stream('topology_delta')
+    if delta_stream is None:
+        return graph, timestamp
+
+    deltas = datastream.get_data(
+        stream_id=delta_stream['stream_id'],
+        granularity=delta_stream['highest_granularity'],
+        start_exclusive=snapshot['t'],
+        end=at,
+    )
+    for delta in deltas:
+        graph = apply_delta(graph, delta['v'])
+        timestamp = delta['t']
+
+    return graph, timestamp
@@ -1,3 +1,8 @@
+import calendar
+import datetime
+import time
+
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_noop as _
 
@@ -8,18 +13,30 @@ from nodewatcher.core.monitor import processors as monitor_processors, models as
 from nodewatcher.modules.monitor.datastream import base as ds_base, fields as ds_fields
 from nodewatcher.modules.monitor.datastream.pool import pool as ds_pool
 
-from . import base as tp_base
+from . import base as tp_base, history
 from .pool import pool as tp_pool
 
+# A tuple (graph, snapshot time, write timestamp) of the topology graph that has
+# been most recently stored by this process, the time of the last full snapshot and
+# the UNIX timestamp of the last stored datapoint
+_previous_topology = None
+
 
 class TopologyStreams(ds_base.StreamsBase):
     topology = ds_fields.GraphField(tags={
         'title': _("Network topology"),
         'description': _("Network topology."),
+        # Distinguishes full graphs from changes, as both streams share the module tag.
+        'kind': 'snapshot',
         'visualization': {
             'type': 'graph'
         }
     })
+    topology_delta = ds_fields.NominalField(tags={
+        'title': _("Network topology changes"),
+        'description': _("Changes of network topology since the previous datapoint."),
+        'kind': 'delta',
+    })
 
     def get_stream_query_tags(self):
         return {'module': 'topology'}
@@ -32,11 +49,10 @@ class TopologyStreams(ds_base.StreamsBase):
 
 
 class TopologyStreamsData(object):
-    def __init__(self, vertices, edges):
-        self.topology = {
-            'v': [dict(i=uuid, **attrs) for uuid, attrs in vertices.iteritems()],
-            'e': edges,
-        }
+    def __init__(self, topology=None, topology_delta=None, datastream_timestamp=None):
+        self.topology = topology
+        self.topology_delta = topology_delta
+        self.datastream_timestamp = datastream_timestamp
 
 ds_pool.register(TopologyStreamsData, TopologyStreams)
 
@@ -45,8 +61,14 @@ class Topology(monitor_processors.NetworkProcessor):
     """
     Processor that stores the current overall network topology as a graph
     into datastream.
+
+    When `MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL` is set, a full graph is only stored
+    once per interval and just the changes are stored in between. Use
+    `history.get_topology` to rebuild the graph at a given time.
     """
 
+    run_once = True
+
     def process(self, context, nodes):
         """
         Performs network-wide processing and selects the nodes that will be processed
@@ -104,7 +126,45 @@ class Topology(monitor_processors.NetworkProcessor):
 
             vertices[node.pk] = data
 
+        graph = {
+            'v': [dict(i=uuid, **attrs) for uuid, attrs in vertices.iteritems()],
+            'e': edges,
+        }
+
         # Prepare graph for datastream processor
-        context.datastream.topology = TopologyStreamsData(vertices, edges)
+        context.datastream.topology = self.get_streams_data(graph)
 
         return context, nodes
+
+    def get_streams_data(self, graph):
+        """
+        Returns either a full snapshot or changes since the previously stored graph.
+        Changes are only stored when the latest stored datapoint is the one that has
+        been written by this process, otherwise another process may have stored a
+        different graph in the meantime (for example while this instance was not
+        the leader of its shard).
+
+        :param graph: Current topology graph
+        :return: Topology streams data
+        """
+
+        global _previous_topology
+
+        snapshot_interval = getattr(settings, 'MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL', None)
+        now = time.time()
+        # Datastream timestamps are only stored with limited precision.
+        timestamp = datetime.datetime.utcnow().replace(microsecond=0)
+        write_timestamp = calendar.timegm(timestamp.utctimetuple())
+
+        if snapshot_interval is not None and _previous_topology is not None and \
+                now - _previous_topology[1] < snapshot_interval and \
+                history.get_latest_timestamp() == _previous_topology[2]:
+            delta = history.diff(_previous_topology[0], graph)
+            if delta is None:
+                # Nothing is stored when there are no changes.
+                write_timestamp = _previous_topology[2]
+            _previous_topology = (graph, _previous_topology[1], write_timestamp)
+            return TopologyStreamsData(topology_delta=delta, datastream_timestamp=timestamp)
+
+        _previous_topology = (graph, now, write_timestamp)
+        return TopologyStreamsData(topology=graph, datastream_timestamp=timestamp)
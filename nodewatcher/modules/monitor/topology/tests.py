@@ -0,0 +1,178 @@
+import datetime
+import unittest
+
+from django.test import utils
+
+from . import exceptions, history, processors
+
+
+class TestDatastream(object):
+    """
+    A stand-in for the datastream API that keeps datapoints of topology
+    streams in memory.
+    """
+
+    def __init__(self):
+        self.streams = {}
+
+    def append(self, name, value, timestamp):
+        self.streams.setdefault(name, []).append({'t': timestamp, 'v': value})
+
+    def find_streams(self, query_tags):
+        datapoints = self.streams.get(query_tags['name'], None)
+        if not datapoints:
+            return []
+
+        return [{
+            'stream_id': query_tags['name'],
+            'highest_granularity': None,
+            'earliest_datapoint': datapoints[0]['t'],
+            'latest_datapoint': datapoints[-1]['t'],
+        }]
+
+    def get_data(self, stream_id, granularity, start=None, start_exclusive=None, end=None, reverse=False):
+        datapoints = [
+            datapoint for datapoint in self.streams[stream_id]
+            if (start is None or datapoint['t'] >= start) and
+            (start_exclusive is None or datapoint['t'] > start_exclusive) and
+            (end is None or datapoint['t'] <= end)
+        ]
+
+        if reverse:
+            datapoints.reverse()
+
+        return datapoints
+
+
+def graph(vertices, edges):
+    return {
+        'v': [{'i': vertex} for vertex in vertices],
+        'e': [{'f': source, 't': target, 'proto': 'olsr'} for source, target in edges],
+    }
+
+
+def normalize(graph):
+    return (
+        sorted([vertex['i'] for vertex in graph['v']]),
+        sorted([(edge['f'], edge['t']) for edge in graph['e']]),
+    )
+
+
+class HistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datastream = TestDatastream()
+        self._datastream = history.datastream
+        history.datastream = self.datastream
+
+    def tearDown(self):
+        history.datastream = self._datastream
+
+    def test_diff(self):
+        previous = graph(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')])
+        current = graph(['a', 'b', 'd'], [('a', 'b'), ('b', 'd')])
+        current['v'][0]['name'] = 'renamed'
+
+        self.assertIsNone(history.diff(previous, previous))
+
+        delta = history.diff(previous, current)
+        self.assertItemsEqual([vertex['i'] for vertex in delta['v+']], ['a', 'd'])
+        self.assertEqual(delta['v-'], ['c'])
+        self.assertEqual(delta['e+'], [{'f': 'b', 't': 'd', 'proto': 'olsr'}])
+        self.assertEqual(delta['e-'], [['b', 'c', 'olsr']])
+
+        updated = history.apply_delta(previous, delta)
+        self.assertEqual(normalize(updated), normalize(current))
+        self.assertIn({'i': 'a', 'name': 'renamed'}, updated['v'])
+
+    def test_diff_protocols(self):
+        # Edges between the same vertices are distinguished by protocol.
+        previous = graph(['a', 'b'], [('a', 'b')])
+        current = graph(['a', 'b'], [('a', 'b')])
+        current['e'].append({'f': 'a', 't': 'b', 'proto': 'babel'})
+
+        delta = history.diff(previous, current)
+        self.assertEqual(delta['e+'], [{'f': 'a', 't': 'b', 'proto': 'babel'}])
+        self.assertEqual(len(history.apply_delta(previous, delta)['e']), 2)
+
+    def test_get_topology(self):
+        self.assertRaises(exceptions.TopologyNotAvailable, history.get_topology)
+
+        start = datetime.datetime(2016, 1, 1)
+        graphs = [
+            graph(['a', 'b'], [('a', 'b')]),
+            graph(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')]),
+            graph(['a', 'c'], []),
+            graph(['a', 'c', 'd'], [('c', 'd')]),
+        ]
+
+        self.datastream.append('topology', graphs[0], start)
+        for minute, (previous, current) in enumerate(zip(graphs, graphs[1:]), 1):
+            self.datastream.append('topology_delta', history.diff(previous, current), start + datetime.timedelta(minutes=minute))
+
+        for minute, expected in enumerate(graphs):
+            at = start + datetime.timedelta(minutes=minute, seconds=30)
+            topology, timestamp = history.get_topology(at)
+            self.assertEqual(normalize(topology), normalize(expected))
+            self.assertEqual(timestamp, start + datetime.timedelta(minutes=minute))
+
+        self.assertEqual(normalize(history.get_topology()[0]), normalize(graphs[-1]))
+        self.assertRaises(exceptions.TopologyNotAvailable, history.get_topology, start - datetime.timedelta(minutes=1))
+
+        # Deltas before the latest snapshot are ignored.
+        self.datastream.append('topology', graphs[0], start + datetime.timedelta(minutes=10))
+        self.assertEqual(normalize(history.get_topology()[0]), normalize(graphs[0]))
+
+
+class TopologyProcessorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.datastream = TestDatastream()
+        self._datastream = history.datastream
+        history.datastream = self.datastream
+        processors._previous_topology = None
+
+    def tearDown(self):
+        history.datastream = self._datastream
+        processors._previous_topology = None
+
+    def store(self, graph):
+        data = processors.Topology().get_streams_data(graph)
+        for name in ('topology', 'topology_delta'):
+            if getattr(data, name) is not None:
+                self.datastream.append(name, getattr(data, name), data.datastream_timestamp)
+
+        return data
+
+    @utils.override_settings(MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL=None)
+    def test_without_interval(self):
+        for current in (graph(['a'], []), graph(['a', 'b'], [])):
+            data = self.store(current)
+            self.assertEqual(data.topology, current)
+            self.assertIsNone(data.topology_delta)
+
+    @utils.override_settings(MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL=3600)
+    def test_delta(self):
+        first = graph(['a', 'b'], [('a', 'b')])
+        second = graph(['a', 'b', 'c'], [('a', 'b'), ('a', 'c')])
+
+        self.assertEqual(self.store(first).topology, first)
+        data = self.store(second)
+        self.assertIsNone(data.topology)
+        self.assertEqual(data.topology_delta, history.diff(first, second))
+        # Nothing is stored when there are no changes.
+        data = self.store(second)
+        self.assertIsNone(data.topology)
+        self.assertIsNone(data.topology_delta)
+
+    @utils.override_settings(MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL=3600)
+    def test_stale_previous_topology(self):
+        first = graph(['a', 'b'], [('a', 'b')])
+        self.store(first)
+
+        # Another instance stores a different graph in the meantime.
+        other = graph(['a', 'c'], [('a', 'c')])
+        self.datastream.append('topology', other, datetime.datetime.utcnow() + datetime.timedelta(seconds=10))
+
+        second = graph(['a', 'b', 'c'], [('a', 'b'), ('a', 'c')])
+        data = self.store(second)
+        self.assertEqual(data.topology, second)
+        self.assertIsNone(data.topology_delta)
@@ -2,6 +2,7 @@ import uuid
 
 from nodewatcher.core import models as core_models
 from nodewatcher.core.monitor import processors as monitor_processors
+from nodewatcher.modules.monitor.sources.http import push as monitor_push
 
 from . import models
 
@@ -21,19 +22,22 @@ class DiscoverUnknownNodes(monitor_processors.NetworkProcessor):
         :return: A (possibly) modified context and a (possibly) modified set of nodes
         """
 
-        if not context.push.source:
+        pushes = monitor_push.get_pushes(context)
+        if not pushes:
             return context, nodes
 
-        try:
-            core_models.Node.objects.get(uuid=context.push.source)
-        except core_models.Node.DoesNotExist:
+        known = set(core_models.Node.objects.filter(uuid__in=pushes.keys()).values_list('uuid', flat=True))
+        for source, push in pushes.iteritems():
+            if source in known:
+                continue
+
             # If there is currently no such node, add an unknown node record.
             try:
                 models.UnknownNode.objects.update_or_create(
-                    uuid=str(uuid.UUID(context.push.source)),
+                    uuid=str(uuid.UUID(source)),
                     defaults={
-                        'ip_address': context.identity.ip_address or None,
-                        'certificate': dict(context.identity.certificate or {}) or None,
+                        'ip_address': push.identity.ip_address or None,
+                        'certificate': dict(push.identity.certificate or {}) or None,
                         'origin': models.UnknownNode.PUSH,
                     },
                 )
@@ -9,6 +9,8 @@ class InterfaceValidator(monitor_processors.NodeProcessor):
     Stores interface monitoring data.
     """
 
+    thread_safe = True
+
     def cleanup(self, context, node):
         """
         Called for every processed node.
@@ -8,6 +8,8 @@ class RebootValidator(monitor_processors.NodeProcessor):
     Stores interface monitoring data.
     """
 
+    thread_safe = True
+
     def get_uptime(self, node):
         """
         Helper function for returning the current uptime.
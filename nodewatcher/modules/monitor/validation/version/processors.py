@@ -8,6 +8,8 @@ class VersionValidator(monitor_processors.NodeProcessor):
     Detects firmware version changes.
     """
 
+    thread_safe = True
+
     def get_firmware_version(self, node):
         """
         Helper function for returning the current firmware version.
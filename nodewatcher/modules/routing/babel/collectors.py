@@ -0,0 +1,69 @@
+import socket
+import time
+
+from django.conf import settings
+
+from nodewatcher.core.monitor import feeds
+
+from . import parser as babel_parser
+
+# Minimum number of seconds between two published snapshots
+PUBLISH_INTERVAL = 1
+# Number of seconds to wait for the initial dump
+CONNECT_TIMEOUT = 15
+
+
+class BabelFeedCollector(feeds.FeedCollector):
+    """
+    Keeps a connection to the babeld local interface open and applies its
+    incremental updates to an in-memory table, which is published whenever
+    it changes.
+    """
+
+    def collect(self):
+        """
+        Collects updates until the connection to babeld is lost.
+        """
+
+        babel = babel_parser.BabelParser(
+            host=getattr(settings, 'BABELD_MONITOR_HOST', '::1'),
+            port=getattr(settings, 'BABELD_MONITOR_PORT', 33123),
+        )
+
+        connection = socket.create_connection((babel.host, babel.port), CONNECT_TIMEOUT)
+        connection.settimeout(PUBLISH_INTERVAL)
+        try:
+            table = babel_parser.BabelTable()
+            buffer = ''
+            # Snapshots are only published once the initial dump has been received.
+            complete = False
+            changed = False
+            last_publish = 0
+
+            while True:
+                try:
+                    data = connection.recv(65536)
+                    if not data:
+                        self.logger.warning("Connection to babeld has been closed.")
+                        return
+                except socket.timeout:
+                    data = ''
+
+                buffer += data
+                lines = buffer.split('\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if line.strip() == 'done':
+                        complete = True
+                    elif table.update(line):
+                        changed = True
+
+                now = time.time()
+                if complete and (changed or now - last_publish >= feeds.get_max_age() / 2) and \
+                        now - last_publish >= PUBLISH_INTERVAL:
+                    # Snapshots are also refreshed when nothing changes, so that they do not become stale.
+                    self.publish('babel', babel.key, table.get_state())
+                    changed = False
+                    last_publish = now
+        finally:
+            connection.close()
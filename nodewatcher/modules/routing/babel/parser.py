@@ -1,12 +1,128 @@
+import collections
 import radix
 import socket
 import telnetlib
 
+from nodewatcher.core.monitor import feeds, replay
+
 
 class BabelParseFailed(Exception):
     pass
 
 
+def parse_update(line):
+    """
+    Parses a single update line of the babeld local interface.
+
+    :param line: Update line
+    :return: A tuple (command, update_type, identifier, arguments) or None if
+      the line is not an update
+    """
+
+    parts = line.strip().split(' ', 3)
+    if len(parts) < 3:
+        return None
+
+    command, update_type, identifier = parts[:3]
+    raw_arguments = parts[3] if len(parts) > 3 else ''
+    raw_arguments = raw_arguments.split(' ') if raw_arguments else []
+    arguments = {}
+    while len(raw_arguments) >= 2:
+        key, value = raw_arguments.pop(0), raw_arguments.pop(0)
+        arguments[key] = value
+
+    return command, update_type, identifier, arguments
+
+
+class BabelTable(object):
+    """
+    State of the babeld daemon, built from the initial dump and updated
+    incrementally as babeld announces changes.
+    """
+
+    def __init__(self, state=None):
+        """
+        Class constructor.
+
+        :param state: Optional state as returned by `get_state`
+        """
+
+        state = state or {}
+        self.node_info = state.get('node_info', {})
+        self.neighbours = state.get('neighbours', collections.OrderedDict())
+        self.xroutes = state.get('xroutes', collections.OrderedDict())
+        self.routes = state.get('routes', collections.OrderedDict())
+
+    def update(self, line):
+        """
+        Applies an update line to the table.
+
+        :param line: Update line
+        :return: True if the line was an update
+        """
+
+        update = parse_update(line)
+        if update is None:
+            return False
+
+        command, update_type, identifier, arguments = update
+        if update_type == 'self':
+            # Node itself.
+            if command in ('add', 'change'):
+                self.node_info = {
+                    'hostname': identifier,
+                    'router_id': arguments.get('id', None),
+                }
+            return True
+
+        table = {
+            'neighbour': self.neighbours,
+            'xroute': self.xroutes,
+            'route': self.routes,
+        }.get(update_type, None)
+        if table is None:
+            return False
+
+        if command in ('add', 'change'):
+            table[identifier] = arguments
+        elif command == 'flush':
+            table.pop(identifier, None)
+        else:
+            return False
+
+        return True
+
+    def get_state(self):
+        """
+        Returns a picklable state of the table.
+        """
+
+        return {
+            'node_info': self.node_info,
+            'neighbours': self.neighbours,
+            'xroutes': self.xroutes,
+            'routes': self.routes,
+        }
+
+    def get_data(self):
+        """
+        Returns parsed data with a radix tree of all routes.
+        """
+
+        data = {
+            'node_info': self.node_info,
+            'neighbours': self.neighbours.values(),
+            'exported_routes': self.xroutes.values(),
+            'routes': radix.Radix(),
+        }
+
+        for arguments in self.xroutes.values() + self.routes.values():
+            node = data['routes'].add(arguments['prefix'])
+            node.data.update(arguments)
+
+        return data
+
+
 class BabelParser(object):
     """
     Parser for babeld data feed.
@@ -24,60 +140,36 @@ class BabelParser(object):
         self.port = port
         self._data = None
 
+    @property
+    def key(self):
+        return '%s:%s' % (self.host, self.port)
+
     def _get_data(self):
         if self._data is not None:
             return self._data
 
-        # Read the data from the remote Babel daemon.
-        try:
+        def fetch():
+            state = feeds.get_snapshot('babel', self.key)
+            if state is not None:
+                return state
+
             connection = telnetlib.Telnet(self.host, self.port)
             raw = connection.read_until('\ndone\n', 15)
             connection.close()
-        except (socket.error, EOFError):
-            raise BabelParseFailed
-
-        # Parse data.
-        data = {
-            'node_info': {},
-            'neighbours': [],
-            'exported_routes': [],
-            'routes': radix.Radix(),
-        }
-
-        for line in raw.split('\n'):
-            try:
-                command, update_type, identifier, raw_arguments = line.split(' ', 3)
-                raw_arguments = raw_arguments.split(' ')
-            except ValueError:
-                continue
 
-            if command != 'add':
-                continue
+            table = BabelTable()
+            for line in raw.split('\n'):
+                table.update(line)
 
-            arguments = {}
-            while raw_arguments:
-                key, value = raw_arguments.pop(0), raw_arguments.pop(0)
-                arguments[key] = value
+            return table.get_state()
 
-            if update_type == 'self':
-                # Node itself.
-                data['node_info'] = {
-                    'hostname': identifier,
-                    'router_id': arguments['id'],
-                }
-            elif update_type == 'neighbour':
-                # Neighbour nodes.
-                data['neighbours'].append(arguments)
-            elif update_type == 'xroute':
-                # Exported routes.
-                data['exported_routes'].append(arguments)
-                node = data['routes'].add(arguments['prefix'])
-                node.data.update(arguments)
-            elif update_type == 'route':
-                # Imported routes.
-                node = data['routes'].add(arguments['prefix'])
-                node.data.update(arguments)
+        # Read the data from the remote Babel daemon.
+        try:
+            state = replay.capture('babel', self.key, fetch)
+        except (socket.error, EOFError, replay.FeedNotRecorded):
+            raise BabelParseFailed
 
+        data = BabelTable(state).get_data()
         if not data['node_info']:
             raise BabelParseFailed
 
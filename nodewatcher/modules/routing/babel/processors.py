@@ -2,7 +2,7 @@ from django.conf import settings
 from django.utils import timezone
 
 from nodewatcher.core import models as core_models
-from nodewatcher.core.monitor import processors as monitor_processors, events as monitor_events
+from nodewatcher.core.monitor import processors as monitor_processors, events as monitor_events, routerid
 from nodewatcher.modules.monitor.sources.http import processors as http_processors
 from nodewatcher.utils import ipaddr
 
@@ -38,21 +38,22 @@ class IncludeRoutableNodes(monitor_processors.NetworkProcessor):
             return context, nodes
 
         # Determine which nodes are available.
-        for node in core_models.Node.objects.regpoint('config').registry_fields(
-            router_id='core.routerid__router_id'
-        ).registry_filter(
-            core_routerid__rid_family__in=['ipv4', 'ipv6'],
-        ):
-            for router_id in node.router_id.all():
+        index = routerid.get_index(context)
+        available_nodes = set()
+        for node_pk in index.get_nodes():
+            for router_id in index.get_router_ids(node_pk, families=['ipv4', 'ipv6']):
                 # Try to find the most specific route for this router.
                 route = routes.search_best(router_id)
-                if route.prefixlen > 20:
-                    nodes.add(node)
-
-                    # A specific enough route exists for this node, count it as available.
-                    context.for_node[node.pk].node_available = True
+                if route is not None and route.prefixlen > 20:
+                    available_nodes.add(node_pk)
                     break
 
+        for node in core_models.Node.objects.filter(pk__in=available_nodes):
+            nodes.add(node)
+
+            # A specific enough route exists for this node, count it as available.
+            context.for_node[node.pk].node_available = True
+
         return context, nodes
 
 
@@ -62,6 +63,8 @@ class BabelTopology(monitor_processors.NodeProcessor):
     module has previously fetched data.
     """
 
+    thread_safe = True
+
     @monitor_processors.depends_on_context('http', http_processors.HTTPTelemetryContext)
     def process(self, context, node):
         """
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+
+from nodewatcher.core.monitor import feeds
+
+from . import parser as olsr_parser
+
+
+class OlsrFeedCollector(feeds.FeedCollector):
+    """
+    Polls olsrd at a configurable rate and publishes the parsed tables.
+    """
+
+    def collect(self):
+        """
+        Polls olsrd until the process is stopped.
+        """
+
+        olsr_info = olsr_parser.OlsrParser(
+            host=getattr(settings, 'OLSRD_MONITOR_HOST', '127.0.0.1'),
+            port=getattr(settings, 'OLSRD_MONITOR_PORT', 2006),
+        )
+        interval = getattr(settings, 'OLSRD_MONITOR_POLL_INTERVAL', 10)
+
+        while True:
+            start = time.time()
+            try:
+                self.publish('olsr', olsr_info.url, olsr_parser.fetch_tables(olsr_info.url))
+            except olsr_parser.OlsrParseFailed:
+                self.logger.warning("Failed to parse olsrd feeds!")
+
+            time.sleep(max(0, interval - (time.time() - start)))
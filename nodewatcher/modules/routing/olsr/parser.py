@@ -1,5 +1,6 @@
 import urllib
 
+from nodewatcher.core.monitor import feeds, replay
 from nodewatcher.utils import ipaddr
 
 
@@ -7,6 +8,30 @@ class OlsrParseFailed(Exception):
     pass
 
 
+def fetch_tables(url):
+    """
+    Fetches and parses all tables from olsrd via HTTP.
+
+    :param url: olsrd-mod-txtinfo URL
+    :return: A dictionary mapping table names to lists of rows
+    """
+
+    try:
+        data = urllib.urlopen(url).read()
+    except:
+        raise OlsrParseFailed
+
+    try:
+        tables = {}
+        for table in data.split('Table: ')[1:]:
+            table = table.strip().split('\n')
+            tables[table[0].strip().lower()] = [tuple(x.strip().split('\t')) for x in table[2:]]
+    except (ValueError, IndexError):
+        raise OlsrParseFailed
+
+    return tables
+
+
 class OlsrParser(object):
     """
     A simple class for obtaining OLSR routing information from olsrd via
@@ -25,25 +50,28 @@ class OlsrParser(object):
         self.port = port
         self._tables = None
 
+    @property
+    def url(self):
+        return 'http://{host}:{port}/'.format(host=self.host, port=self.port)
+
     def _fetch_data(self):
         """
-        Fetches and parses data from the daemon via HTTP.
+        Obtains tables from the snapshot published by the feed collector or
+        fetches them from the daemon when there is no up-to-date snapshot.
         """
 
-        try:
-            data = urllib.urlopen(
-                'http://{host}:{port}/'.format(host=self.host, port=self.port)
-            ).read()
-        except:
-            raise OlsrParseFailed
+        url = self.url
+
+        def fetch():
+            tables = feeds.get_snapshot('olsr', url)
+            if tables is None:
+                tables = fetch_tables(url)
+
+            return tables
 
         try:
-            tables = data.split('Table: ')[1:]
-            self._tables = {}
-            for table in tables:
-                table = table.strip().split('\n')
-                self._tables[table[0].strip().lower()] = [tuple(x.strip().split('\t')) for x in table[2:]]
-        except (ValueError, IndexError):
+            self._tables = replay.capture('olsr', url, fetch)
+        except replay.FeedNotRecorded:
             raise OlsrParseFailed
 
     def get_topology(self):
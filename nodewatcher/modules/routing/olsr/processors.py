@@ -1,15 +1,28 @@
 import uuid
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from nodewatcher.core import models as core_models
-from nodewatcher.core.monitor import models as monitor_models, processors as monitor_processors, events as monitor_events
+from nodewatcher.core.monitor import models as monitor_models, persistence, processors as monitor_processors, events as monitor_events, routerid, sharding
 from nodewatcher.utils import ipaddr
 
 from . import models as olsr_models, parser as olsr_parser
 
 
+def get_address_key(address, host=True):
+    """
+    Returns a key under which the given address is compared with stored addresses.
+
+    :param address: Address or network
+    :param host: True to only consider the host address
+    """
+
+    network = ipaddr.IPNetwork(str(address))
+    return str(network.ip) if host else str(network)
+
+
 class GlobalTopology(monitor_processors.NetworkProcessor):
     """
     Processor that handles monitoring of olsrd routing daemon.
@@ -41,19 +54,17 @@ class GlobalTopology(monitor_processors.NetworkProcessor):
 
         # Create a mapping from router ids to nodes.
         self.logger.info("Mapping router IDs to node instances...")
+        index = routerid.get_index(context)
         visible_routers = set(topology.keys())
-        registered_routers = set()
         router_id_map = {}
-        for node in core_models.Node.objects.regpoint('config').registry_fields(
-            router_id='core.routerid__router_id'
-        ).registry_filter(
-            core_routerid__rid_family='ipv4',
-            core_routerid__router_id__in=visible_routers,
-        ):
+        for router_id in visible_routers:
+            node_pk = index.get_node(router_id)
+            if node_pk is not None:
+                router_id_map[router_id] = node_pk
+
+        for node in core_models.Node.objects.filter(pk__in=set(router_id_map.values())):
             # In case there are multiple router IDs, select the one which is advertised by OLSR.
-            first_router_id = node.router_id.filter(router_id__in=visible_routers)[0]
-            router_id_map[first_router_id] = node.pk
-            registered_routers.add(first_router_id)
+            first_router_id = [x for x in index.get_router_ids(node.pk) if x in visible_routers][0]
             nodes.add(node)
 
             # Store per-node routing data.
@@ -64,45 +75,82 @@ class GlobalTopology(monitor_processors.NetworkProcessor):
             olsr_data.aliases = aliases.get(first_router_id, [])
 
         self.logger.info("Creating unknown node instances...")
-        for router_id in visible_routers.difference(registered_routers):
-            # Create an invalid node for each unknown router id seen by olsrd.
-            node, created = core_models.Node.objects.get_or_create(
-                uuid=str(uuid.uuid5(olsr_models.OLSR_UUID_NAMESPACE, router_id))
-            )
+        unknown_routers = visible_routers.difference(router_id_map)
+        if not sharding.is_leader(context):
+            # Unknown nodes are only created by the leader, other instances process them once they exist.
+            unknown_routers = set()
+
+        # Create an invalid node for each unknown router id seen by olsrd.
+        unknown_uuids = dict([
+            (str(uuid.uuid5(olsr_models.OLSR_UUID_NAMESPACE, router_id)), router_id)
+            for router_id in unknown_routers
+        ])
+        unknown_nodes = core_models.Node.objects.in_bulk(unknown_uuids.keys())
+        created_nodes = [core_models.Node(uuid=node_uuid) for node_uuid in unknown_uuids if node_uuid not in unknown_nodes]
+        if created_nodes:
+            try:
+                # Other runs may create the same nodes concurrently, so the insert uses a savepoint.
+                with transaction.atomic():
+                    core_models.Node.objects.bulk_create(created_nodes)
+            except IntegrityError:
+                # Fall back to creating nodes one at a time, skipping those created by other runs.
+                pending_nodes = created_nodes
+                created_nodes = []
+                for node in pending_nodes:
+                    node, created = core_models.Node.objects.get_or_create(uuid=node.pk)
+                    if created:
+                        created_nodes.append(node)
+                    else:
+                        unknown_nodes[node.pk] = node
+
+            with transaction.atomic():
+                # Registry items use multi-table inheritance, so they can only be created one at a time.
+                for node in created_nodes:
+                    router_id = unknown_uuids[node.pk]
+
+                    general_cfg = node.config.core.general(create=core_models.GeneralConfig)
+                    # Name the nodes using their IP address by default.
+                    general_cfg.name = str(router_id)
+                    general_cfg.save()
+
+                    node.config.core.routerid(
+                        create=core_models.StaticIpRouterIdConfig,
+                        address='%s/32' % router_id,
+                    ).save()
+                    index.add(node.pk, 'ipv4', router_id)
+                    unknown_nodes[node.pk] = node
+
+        for node in unknown_nodes.values():
+            router_id = unknown_uuids[node.pk]
             nodes.add(node)
             router_id_map[router_id] = node.pk
 
             # Store per-node routing data.
             olsr_data = context.for_node[node.pk].routing.olsr
-            olsr_data.router_id = first_router_id
-            olsr_data.neighbours = topology.get(first_router_id, [])
-            olsr_data.announces = announces.get(first_router_id, [])
-            olsr_data.aliases = aliases.get(first_router_id, [])
-
-            if created:
-                general_cfg = node.config.core.general(create=core_models.GeneralConfig)
-                # Name the nodes using their IP address by default.
-                general_cfg.name = str(router_id)
-                general_cfg.save()
-
-                node.config.core.routerid(
-                    create=core_models.StaticIpRouterIdConfig,
-                    address='%s/32' % router_id,
-                ).save()
+            olsr_data.router_id = router_id
+            olsr_data.neighbours = topology.get(router_id, [])
+            olsr_data.announces = announces.get(router_id, [])
+            olsr_data.aliases = aliases.get(router_id, [])
 
         # Prepare smaller router ID maps for each node.
         for router_id, neighbours in topology.iteritems():
+            if router_id not in router_id_map:
+                continue
+
             node_id = router_id_map[router_id]
             olsr_data = context.for_node[node_id].routing.olsr
 
             for neighbour in neighbours:
                 address = str(neighbour['address'])
-                olsr_data.router_id_map[address] = router_id_map[address]
+                if address in router_id_map:
+                    olsr_data.router_id_map[address] = router_id_map[address]
 
         return context, nodes
 
 
 class NodeTopology(monitor_processors.NodeProcessor):
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
@@ -167,9 +215,22 @@ class NodeTopology(monitor_processors.NodeProcessor):
                 announces = context.http.core.routing.olsr.exported_routes
                 aliases = context.http.core.routing.olsr.link_local
 
-        visible_lladdr = []
-        visible_links = []
-        visible_announces = []
+        # Fetch all existing items at once, so that only changes need to be written.
+        uow = persistence.UnitOfWork()
+        existing_lladdr = {}
+        for lladdr in rtm.link_local.all():
+            existing_lladdr[get_address_key(lladdr.address)] = uow.track(lladdr)
+        existing_links = {}
+        for link in olsr_models.OlsrTopologyLink.objects.filter(monitor=rtm):
+            existing_links[link.peer_id] = uow.track(link)
+        existing_announces = {}
+        for announce in node.monitoring.network.routing.announces(onlyclass=olsr_models.OlsrRoutingAnnounceMonitor):
+            existing_announces[get_address_key(announce.network, host=False)] = uow.track(announce)
+
+        visible_lladdr = {}
+        visible_links = {}
+        visible_announces = {}
+        established_links = []
 
         if version >= 1:
             # A list of link-local addresses of OLSR interfaces. This is required in order to be
@@ -185,79 +246,99 @@ class NodeTopology(monitor_processors.NodeProcessor):
 
                     address = ipaddr.IPv4Address(address)
 
-                lladdr, created = rtm.link_local.get_or_create(address=address)
+                key = get_address_key(address)
+                lladdr = visible_lladdr.get(key, None) or existing_lladdr.get(key, None)
+                if lladdr is None:
+                    lladdr = olsr_models.LinkLocalAddress(router=rtm, address=address)
                 lladdr.interface = interface
-                lladdr.save()
-                visible_lladdr.append(lladdr)
+                uow.save(lladdr)
+                visible_lladdr[key] = lladdr
+
+            # Resolve all neighbours at once.
+            if not push:
+                router_id_map = context.routing.olsr.router_id_map
+                peers = core_models.Node.objects.in_bulk([
+                    router_id_map[str(neighbour['address'])]
+                    for neighbour in neighbours
+                    if str(neighbour['address']) in router_id_map
+                ])
+                peers = dict([(address, peers[node_pk]) for address, node_pk in router_id_map.items() if node_pk in peers])
+            else:
+                peers = {}
+                for lladdr in olsr_models.LinkLocalAddress.objects.filter(
+                    address__in=[str(neighbour['address']) for neighbour in neighbours],
+                ).select_related('router__root'):
+                    peers.setdefault(get_address_key(lladdr.address), lladdr.router.root)
 
             # Neighbours.
+            now = timezone.now()
             for neighbour in neighbours:
                 if not push:
-                    try:
-                        dst_node = core_models.Node.objects.get(
-                            pk=context.routing.olsr.router_id_map.get(str(neighbour['address']), None)
-                        )
-                    except core_models.Node.DoesNotExist:
+                    dst_node = peers.get(str(neighbour['address']), None)
+                    if dst_node is None:
                         # Skip unknown neighbour.
                         self.logger.warning("Inconsistency in topology table for router ID %s!" % neighbour['address'])
                         continue
                 else:
                     # Attempt to resolve destination node.
-                    try:
-                        lladdr = olsr_models.LinkLocalAddress.objects.get(address=neighbour['address'])
-                    except olsr_models.LinkLocalAddress.DoesNotExist:
+                    dst_node = peers.get(get_address_key(neighbour['address']), None)
+                    if dst_node is None:
                         # Skip unknown neighbour.
                         continue
 
-                    dst_node = lladdr.router.root
-
-                elink, created = olsr_models.OlsrTopologyLink.objects.get_or_create(monitor=rtm, peer=dst_node)
+                elink = visible_links.get(dst_node.pk, None) or existing_links.get(dst_node.pk, None)
+                if elink is None:
+                    elink = olsr_models.OlsrTopologyLink(monitor=rtm)
+                    established_links.append(elink)
+                elink.peer = dst_node
                 elink.lq = neighbour['lq']
                 elink.ilq = neighbour['ilq']
                 elink.etx = neighbour['cost']
                 if push:
                     # In push mode, link cost is reported as an integer.
                     elink.etx = float(elink.etx) / 1024
-                elink.last_seen = timezone.now()
-                elink.save()
-                visible_links.append(elink)
-
-                if created:
-                    # TODO: This will still create one event for each end of the link.
-                    monitor_events.TopologyLinkEstablished(node, dst_node, olsr_models.OLSR_PROTOCOL_NAME).post()
+                elink.last_seen = now
+                uow.save(elink)
+                visible_links[dst_node.pk] = elink
 
             # Compute average values.
             if visible_links:
-                rtm.average_lq = float(sum([link.lq for link in visible_links])) / len(visible_links)
-                rtm.average_ilq = float(sum([link.ilq for link in visible_links])) / len(visible_links)
-                rtm.average_etx = float(sum([link.etx for link in visible_links])) / len(visible_links)
+                rtm.average_lq = float(sum([link.lq for link in visible_links.values()])) / len(visible_links)
+                rtm.average_ilq = float(sum([link.ilq for link in visible_links.values()])) / len(visible_links)
+                rtm.average_etx = float(sum([link.etx for link in visible_links.values()])) / len(visible_links)
 
             rtm.link_count = len(visible_links)
-            rtm.save()
 
             # Create streams for all links.
-            context.datastream.olsr_links = visible_links
+            context.datastream.olsr_links = visible_links.values()
 
             # Setup networks in announce tables.
             for announce in announces:
-                eannounce, created = olsr_models.OlsrRoutingAnnounceMonitor.objects.get_or_create(
-                    root=node,
-                    network=announce['dst_prefix'],
-                )
+                key = get_address_key(announce['dst_prefix'], host=False)
+                eannounce = visible_announces.get(key, None) or existing_announces.get(key, None)
+                if eannounce is None:
+                    eannounce = olsr_models.OlsrRoutingAnnounceMonitor(root=node, network=announce['dst_prefix'])
                 eannounce.status = 'ok'
-                eannounce.last_seen = timezone.now()
-                eannounce.save()
-                visible_announces.append(eannounce)
-
-        # Remove all link-local addresses that do not exist anymore.
-        rtm.link_local.exclude(pk__in=[x.pk for x in visible_lladdr]).delete()
-        # Remove all links that do not exist anymore.
-        rtm.links.exclude(pk__in=[x.pk for x in visible_links]).delete()
-        # Remove all announces that do not exist anymore.
-        node.monitoring.network.routing.announces(
-            onlyclass=olsr_models.OlsrRoutingAnnounceMonitor, queryset=True
-        ).exclude(pk__in=[x.pk for x in visible_announces]).delete()
-
-        rtm.save()
+                eannounce.last_seen = now
+                uow.save(eannounce)
+                visible_announces[key] = eannounce
+
+        # Remove all link-local addresses, links and announces that do not exist anymore.
+        for key, lladdr in existing_lladdr.items():
+            if key not in visible_lladdr:
+                uow.delete(lladdr)
+        for key, link in existing_links.items():
+            if key not in visible_links:
+                uow.delete(link)
+        for key, announce in existing_announces.items():
+            if key not in visible_announces:
+                uow.delete(announce)
+
+        uow.save(rtm)
+        uow.flush()
+
+        for elink in established_links:
+            # TODO: This will still create one event for each end of the link.
+            monitor_events.TopologyLinkEstablished(node, elink.peer, olsr_models.OLSR_PROTOCOL_NAME).post()
 
         return context
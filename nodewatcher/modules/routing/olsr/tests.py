@@ -0,0 +1,156 @@
+from nodewatcher.core.monitor import events as monitor_events, test
+from nodewatcher.modules.monitor.sources.http import processors as http_processors
+
+from . import models as olsr_models, processors as olsr_processors
+
+
+class NodeTopologyTestCase(test.ProcessorTestCase):
+    def setUp(self):
+        self.node = self.create_node()
+        self.peers = [self.create_node() for index in xrange(3)]
+        self.router_id_map = dict([('10.0.0.%d' % (index + 2), peer.pk) for index, peer in enumerate(self.peers)])
+
+        # Record posted events instead of storing them.
+        self.events = []
+        events = self.events
+
+        class TopologyLinkEstablished(object):
+            def __init__(self, node_a, node_b, routing_protocol):
+                self.link = (node_a.pk, node_b.pk, routing_protocol)
+
+            def post(self):
+                events.append(self.link)
+
+        self._event = monitor_events.TopologyLinkEstablished
+        monitor_events.TopologyLinkEstablished = TopologyLinkEstablished
+
+    def tearDown(self):
+        monitor_events.TopologyLinkEstablished = self._event
+
+    def pull(self, neighbours, aliases, announces):
+        self.events[:] = []
+        self.run_processor(olsr_processors.NodeTopology, self.node, {
+            'routing': {
+                'olsr': {
+                    'router_id': '10.0.0.1',
+                    'neighbours': [
+                        {'address': address, 'lq': lq, 'ilq': 1.0, 'cost': 1.0 / lq}
+                        for address, lq in neighbours
+                    ],
+                    'announces': [{'dst_prefix': prefix} for prefix in announces],
+                    'aliases': list(aliases),
+                    'router_id_map': self.router_id_map,
+                },
+            },
+        })
+
+    def push(self, neighbours, aliases, announces):
+        self.events[:] = []
+        self.run_processor(olsr_processors.NodeTopology, self.node, {
+            'push': {'source': 'http'},
+            'http': http_processors.HTTPTelemetryContext({
+                'successfully_parsed': True,
+                '_meta': {'version': 3},
+                'core': {
+                    'routing': {
+                        'olsr': {
+                            '_meta': {'version': 1},
+                            'router_id': '10.0.0.1',
+                            'neighbours': [
+                                {'address': address, 'lq': 1.0, 'ilq': 1.0, 'cost': cost}
+                                for address, cost in neighbours
+                            ],
+                            'exported_routes': [{'dst_prefix': prefix} for prefix in announces],
+                            'link_local': list(aliases),
+                        },
+                    },
+                },
+            }),
+        })
+
+    def get_topology(self):
+        rtm = self.node.monitoring.network.routing.topology(onlyclass=olsr_models.OlsrRoutingTopologyMonitor)[0]
+        links = dict([(link.peer_id, link) for link in olsr_models.OlsrTopologyLink.objects.filter(monitor=rtm)])
+        lladdrs = dict([(str(lladdr.address.ip), lladdr.interface) for lladdr in rtm.link_local.all()])
+        announces = set([
+            str(announce.network)
+            for announce in self.node.monitoring.network.routing.announces(onlyclass=olsr_models.OlsrRoutingAnnounceMonitor)
+        ])
+
+        return rtm, links, lladdrs, announces
+
+    def test_pull(self):
+        self.pull(
+            [('10.0.0.2', 0.5), ('10.0.0.3', 1.0), ('10.0.0.99', 1.0)],
+            ['10.1.0.1%eth0'],
+            ['10.10.0.0/24'],
+        )
+
+        rtm, links, lladdrs, announces = self.get_topology()
+        # Unknown neighbours are skipped.
+        self.assertItemsEqual(links.keys(), [self.peers[0].pk, self.peers[1].pk])
+        self.assertEqual(links[self.peers[0].pk].lq, 0.5)
+        self.assertEqual(links[self.peers[0].pk].etx, 2.0)
+        self.assertEqual(lladdrs, {'10.1.0.1': 'eth0', '10.0.0.1': None})
+        self.assertEqual(announces, set(['10.10.0.0/24']))
+        self.assertEqual(rtm.router_id, '10.0.0.1')
+        self.assertEqual(rtm.link_count, 2)
+        self.assertEqual(rtm.average_lq, 0.75)
+        self.assertItemsEqual(self.events, [
+            (self.node.pk, self.peers[0].pk, olsr_models.OLSR_PROTOCOL_NAME),
+            (self.node.pk, self.peers[1].pk, olsr_models.OLSR_PROTOCOL_NAME),
+        ])
+
+        link_pk = links[self.peers[1].pk].pk
+        self.pull(
+            [('10.0.0.3', 0.25), ('10.0.0.4', 1.0)],
+            ['10.1.0.2'],
+            ['10.20.0.0/24'],
+        )
+
+        rtm, links, lladdrs, announces = self.get_topology()
+        # Existing links are updated, stale ones are removed.
+        self.assertItemsEqual(links.keys(), [self.peers[1].pk, self.peers[2].pk])
+        self.assertEqual(links[self.peers[1].pk].pk, link_pk)
+        self.assertEqual(links[self.peers[1].pk].lq, 0.25)
+        self.assertEqual(lladdrs, {'10.1.0.2': None, '10.0.0.1': None})
+        self.assertEqual(announces, set(['10.20.0.0/24']))
+        self.assertEqual(rtm.link_count, 2)
+        # Events are only posted for new links.
+        self.assertEqual(self.events, [(self.node.pk, self.peers[2].pk, olsr_models.OLSR_PROTOCOL_NAME)])
+
+    def test_pull_unavailable(self):
+        self.pull([('10.0.0.2', 1.0)], ['10.1.0.1'], ['10.10.0.0/24'])
+        self.pull([], [], [])
+
+        rtm, links, lladdrs, announces = self.get_topology()
+        self.assertEqual((links, lladdrs, announces), ({}, {}, set()))
+        self.assertIsNone(rtm.router_id)
+        self.assertEqual(rtm.link_count, 0)
+        self.assertEqual(self.events, [])
+
+    def test_push(self):
+        # Peers are resolved by link-local addresses of their OLSR interfaces.
+        for index, peer in enumerate(self.peers[:2]):
+            peer_rtm = peer.monitoring.network.routing.topology(
+                create=olsr_models.OlsrRoutingTopologyMonitor,
+                protocol=olsr_models.OLSR_PROTOCOL_NAME,
+            )
+            peer_rtm.save()
+            olsr_models.LinkLocalAddress.objects.create(router=peer_rtm, address='10.2.0.%d' % (index + 1))
+
+        self.push([('10.2.0.1', 2048), ('10.2.0.99', 1024)], ['10.1.0.1'], [])
+
+        rtm, links, lladdrs, announces = self.get_topology()
+        self.assertEqual(links.keys(), [self.peers[0].pk])
+        # Link cost is reported as an integer.
+        self.assertEqual(links[self.peers[0].pk].etx, 2.0)
+        self.assertEqual(lladdrs, {'10.1.0.1': None})
+        self.assertEqual(self.events, [(self.node.pk, self.peers[0].pk, olsr_models.OLSR_PROTOCOL_NAME)])
+
+        self.push([('10.2.0.1', 1024), ('10.2.0.2', 1024)], ['10.1.0.1'], [])
+
+        rtm, links, lladdrs, announces = self.get_topology()
+        self.assertItemsEqual(links.keys(), [self.peers[0].pk, self.peers[1].pk])
+        self.assertEqual(links[self.peers[0].pk].etx, 1.0)
+        self.assertEqual(self.events, [(self.node.pk, self.peers[1].pk, olsr_models.OLSR_PROTOCOL_NAME)])
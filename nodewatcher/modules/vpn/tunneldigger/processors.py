@@ -77,6 +77,8 @@ class Tunneldigger(monitor_processors.NodeProcessor):
     Performs tunneldigger-related monitoring functions.
     """
 
+    thread_safe = True
+
     def process(self, context, node):
         """
         Called for every processed node.
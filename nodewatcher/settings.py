@@ -452,6 +452,12 @@ CELERY_ROUTES = {
     'nodewatcher.core.monitor.tasks.run_pipeline': {
         'queue': 'monitor',
     },
+    'nodewatcher.core.monitor.tasks.continue_pipeline': {
+        'queue': 'monitor',
+    },
+    'nodewatcher.modules.monitor.sources.http.tasks.process_push_batch': {
+        'queue': 'monitor',
+    },
 }
 
 # Monitoring runs and processors configuration; this defines the order in which monitoring processors
@@ -460,6 +466,45 @@ CELERY_ROUTES = {
 # processors that are specified here will be called.
 #
 # Multiple runs are executed in parallel, each with its own worker pool and on a preconfigured interval.
+#
+# By default ('worker_pool': 'cycle') each cycle is executed in a freshly forked process with a new
+# worker pool. With 'worker_pool': 'persistent' the run keeps a warm worker pool (and its database
+# connections) across cycles. Workers are then recycled after 'max_tasks_per_child' tasks and the
+# whole pool is recreated when a worker exceeds 'max_worker_memory' megabytes. The run process itself
+# is only restarted once it exceeds 'max_run_memory' megabytes, in which case object types that have
+# grown the most since the first cycle are logged to help locate the leak.
+#
+# Nodes are dispatched to workers in chunks of 'chunk_size' nodes and results are streamed back as
+# soon as they are available. When 'node_timeout' is set, processing of a node that takes longer than
+# the given number of seconds is abandoned without affecting other nodes in the same stage.
+#
+# With 'threads' set, each worker process processes the given number of nodes concurrently in
+# threads with separate database connections, so 'workers' x 'threads' nodes are in flight at once.
+# Threads are only used for stages where all node processors are declared thread-safe and node
+# deadlines are not enforced in threaded stages.
+#
+# With 'max_workers' set, the number of workers is adapted between cycles within 'min_workers'
+# (default 1) and 'max_workers', starting with 'workers'. Workers are added when a cycle takes
+# more than 'target_utilization' (default 0.7) of the period and removed when cycles finish early
+# or when database latency measured by workers rises well above its baseline. The chosen number
+# of workers is exported as a gauge to sinks configured in MONITOR_INSTRUMENTATION_SINKS.
+#
+# With 'registry_cache' enabled, registry items of a node are cached in memory while its node
+# processors are running, so that repeated lookups do not query the database.
+#
+# With 'instrumentation' enabled, wall time, database queries and emitted datapoints are measured
+# for every processor invocation and per-processor statistics of each cycle are exported to sinks
+# configured in MONITOR_INSTRUMENTATION_SINKS.
+#
+# With 'spread' set, each interval is split into the given number of cycles and the ScheduleNodes
+# processor spreads the selected nodes evenly across them. Nodes that have been down for more than
+# 'backoff_after' seconds (default 1800) are polled less often, their interval is doubled each time
+# their downtime doubles, up to 'max_interval' seconds.
+#
+# When monitord is started with --shard, multiple instances share the nodes of each run. Instances
+# hold leases in the database that they renew on every cycle and that expire after 'shard_lease'
+# seconds (default three cycles). Nodes of instances with expired leases are taken over by the
+# remaining ones. Network processors that must run once per cycle only run on the elected leader.
 
 TELEMETRY_PROCESSOR_PIPELINE = (
     # Validators should start here in order to obtain previous state.
@@ -482,6 +527,8 @@ TELEMETRY_PROCESSOR_PIPELINE = (
     'nodewatcher.modules.vpn.tunneldigger.processors.DatastreamTunneldigger',
     'nodewatcher.modules.administration.status.processors.NodeStatus',
     'nodewatcher.modules.monitor.datastream.processors.NodeDatastream',
+    # Must be the last processor, so the feed cache and module hashes are only updated after all processors succeed.
+    'nodewatcher.modules.monitor.sources.http.processors.StoreModuleHashes',
 )
 
 MONITOR_RUNS = {
@@ -492,10 +539,12 @@ MONITOR_RUNS = {
             'nodewatcher.modules.routing.olsr.processors.GlobalTopology',
             'nodewatcher.modules.routing.babel.processors.IncludeRoutableNodes',
             'nodewatcher.modules.monitor.measurements.rtt.processors.RttMeasurement',
+            'nodewatcher.modules.monitor.datastream.processors.StartDatastreamWriter',
             'nodewatcher.modules.monitor.datastream.processors.TrackRegistryModels',
             'nodewatcher.modules.monitor.measurements.rtt.processors.StoreNode',
             'nodewatcher.modules.administration.status.processors.NodeStatus',
             'nodewatcher.modules.monitor.datastream.processors.NodeDatastream',
+            'nodewatcher.modules.monitor.datastream.processors.StopDatastreamWriter',
         ),
     },
 
@@ -507,9 +556,13 @@ MONITOR_RUNS = {
             'nodewatcher.core.monitor.processors.GetAllNodes',
             'nodewatcher.modules.routing.olsr.processors.GlobalTopology',
             'nodewatcher.modules.routing.babel.processors.IncludeRoutableNodes',
+            'nodewatcher.modules.administration.status.processors.ScheduleNodes',
+            'nodewatcher.modules.monitor.sources.http.processors.HTTPTelemetryPrefetch',
+            'nodewatcher.modules.monitor.datastream.processors.StartDatastreamWriter',
             'nodewatcher.modules.monitor.datastream.processors.TrackRegistryModels',
             'nodewatcher.modules.routing.olsr.processors.NodeTopology',
             TELEMETRY_PROCESSOR_PIPELINE,
+            'nodewatcher.modules.monitor.datastream.processors.StopDatastreamWriter',
             'nodewatcher.modules.monitor.datastream.processors.MaintenanceBackprocess',
             'nodewatcher.modules.administration.status.processors.PushNodeStatus',
         ),
@@ -552,10 +605,40 @@ MONITOR_RUNS = {
 MONITOR_HTTP_PUSH_RUN = 'telemetry-push'
 # Base host that should be used for HTTP push. Must be reachable from nodes.
 MONITOR_HTTP_PUSH_HOST = '127.0.0.1'
+# Number of seconds that HTTP pushes are collected for before they are processed in a single batch.
+# Repeated pushes of a node within the same batch are coalesced, only the newest one is processed.
+# When not set, each push is processed by its own task.
+MONITOR_HTTP_PUSH_BATCH_WINDOW = 5
+# Maximum number of nodes processed by a single task; larger batches are processed in parallel.
+MONITOR_HTTP_PUSH_BATCH_CHUNK_SIZE = 50
+# Redis database used to collect pushes. When not set, BROKER_URL is used.
+MONITOR_HTTP_PUSH_BATCH_REDIS = None
 # Timeout when establishing a connection during HTTP polling.
 MONITOR_HTTP_POLL_CONNECT_TIMEOUT = 2
 # Timeout when reading data over an established connection during HTTP polling.
 MONITOR_HTTP_POLL_READ_TIMEOUT = 15
+# Maximum number of concurrent connections when prefetching telemetry via HTTP polling.
+MONITOR_HTTP_POLL_CONCURRENCY = 1000
+# Cache alias (from CACHES) used to store the most recently polled telemetry feed of each node, so
+# that nodes are only asked to send the feed when it has been modified. When not set, the feed is
+# always fetched. The cache is also used to store hashes of processed telemetry modules, so that
+# processors can skip modules that have not changed since the last run.
+MONITOR_HTTP_POLL_CACHE = None
+# Number of seconds between two full topology snapshots. In between, only topology changes
+# are stored. When not set, a full snapshot is stored on every run. Changes can only be
+# tracked when the topology run uses a persistent worker pool. A full snapshot is also stored
+# whenever the latest stored topology has not been written by the same instance.
+MONITOR_TOPOLOGY_SNAPSHOT_INTERVAL = None
+# Sinks that receive per-processor statistics of instrumented monitoring runs. Available sinks are
+# nodewatcher.core.monitor.instrumentation.LogSink and StatsdSink and
+# nodewatcher.modules.monitor.datastream.instrumentation.DatastreamSink.
+MONITOR_INSTRUMENTATION_SINKS = (
+    'nodewatcher.core.monitor.instrumentation.LogSink',
+)
+# Address of the statsd server used by StatsdSink and the prefix of its metrics.
+MONITOR_INSTRUMENTATION_STATSD_HOST = '127.0.0.1'
+MONITOR_INSTRUMENTATION_STATSD_PORT = 8125
+MONITOR_INSTRUMENTATION_STATSD_PREFIX = 'nodewatcher.monitor'
 
 # Backend for the monitoring data archive.
 DATASTREAM_BACKEND = 'datastream.backends.influxdb.Backend'
@@ -575,12 +658,47 @@ DATASTREAM_BACKEND_SETTINGS = {
     },
 }
 
+# Cache alias (from CACHES) used to share datastream stream identifiers between monitoring
+# worker processes. When not set, stream identifiers are only cached within each process.
+DATASTREAM_STREAM_CACHE = None
+# Maximum number of datapoints inserted at once by the datastream write-behind buffer. The buffer
+# runs in its own process and its statistics are exported as gauges to MONITOR_INSTRUMENTATION_SINKS.
+DATASTREAM_WRITER_BATCH_SIZE = 5000
+# Maximum number of seconds datapoints may wait in the write-behind buffer.
+DATASTREAM_WRITER_FLUSH_INTERVAL = 5
+# Maximum number of datapoints in the write-behind buffer, further datapoints are dropped.
+DATASTREAM_WRITER_MAX_PENDING = 500000
+
+# Cache alias (from CACHES) used to share snapshots of routing daemon feeds between monitoring
+# runs. When set, monitord starts the collectors listed in MONITOR_FEED_COLLECTORS, which keep
+# the snapshots up to date, and runs read the snapshots instead of each fetching the feeds. The
+# cache must support values of the size of the whole routing table. When not set, each run
+# fetches the feeds on its own.
+MONITOR_FEED_CACHE = None
+# Collectors that are started when MONITOR_FEED_CACHE is set.
+MONITOR_FEED_COLLECTORS = (
+    'nodewatcher.modules.routing.olsr.collectors.OlsrFeedCollector',
+    'nodewatcher.modules.routing.babel.collectors.BabelFeedCollector',
+)
+# Number of seconds after which a snapshot is considered stale and runs fetch feeds on their own.
+MONITOR_FEED_MAX_AGE = 60
+
 OLSRD_MONITOR_HOST = '127.0.0.1'
 OLSRD_MONITOR_PORT = 2006
+# Number of seconds between two polls of olsrd by the feed collector.
+OLSRD_MONITOR_POLL_INTERVAL = 10
 
 # UUID of the node that is performing measurements (usually the node where the nodewatcher
 # monitor is running on).
 MEASUREMENT_SOURCE_NODE = ''
+# Method used for RTT measurements, either 'fping' to run the fping binary or 'native' to send ICMP
+# ECHO requests from the monitoring process itself. The native prober uses unprivileged ICMP sockets
+# when allowed by net.ipv4.ping_group_range and raw sockets, which require privileges, otherwise.
+MEASUREMENT_RTT_PROBER = 'fping'
+# Maximum number of ICMP ECHO requests per second sent by the native prober.
+MEASUREMENT_RTT_RATE = 2000
+# Number of seconds the native prober waits for each reply.
+MEASUREMENT_RTT_TIMEOUT = 1
 
 # Storage for generated firmware images.
 GENERATOR_STORAGE = 'django.core.files.storage.FileSystemStorage'